@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from typing import Dict, Sequence
+
+
+__all__ = ("percentile", "summarize")
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    if len(sorted_values) == 0:
+        return 0.0
+
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies: Sequence[float], *, elapsed: float) -> Dict[str, float]:
+    """Summarize request latencies (in seconds) as throughput and millisecond percentiles"""
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "throughput": len(values) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": 1000 * percentile(values, 50),
+        "p95_ms": 1000 * percentile(values, 95),
+        "p99_ms": 1000 * percentile(values, 99),
+        "max_ms": 1000 * values[-1] if len(values) > 0 else 0.0,
+    }
@@ -0,0 +1,151 @@
+"""Measure the device analytics pipeline on a synthetic dataset.
+
+    python -m benchmarks.analytics --rows 10000000 --days 365
+
+Builds a PostgreSQL binary COPY stream of `--rows` events (as produced by `ANALYTICS_QUERY`), then
+times its decoding into NumPy arrays and the computation of the statistics. For comparison, the
+same statistics are computed row by row from pydantic models over `--baseline-rows` events, and
+that rate is extrapolated to the full dataset.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import statistics
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from server.analytics import compute_analytics, parse_binary_copy
+from server.models import EventReading
+
+
+_FLOATS = ("accel_x", "accel_y", "accel_z", "heart_rate_bpm", "spo2", "neo6m_altitude_meter", "bmp280_altitude_meter")
+
+
+def _columns(rng: np.random.Generator, rows: int, days: float) -> Dict[str, np.ndarray]:
+    milliseconds = np.sort(rng.integers(0, int(days * 86_400_000), size=rows))
+    falling = rng.random(rows) < 0.001
+    columns = {
+        "id": (milliseconds << 12) | (rng.integers(0, 4096, size=rows)),
+        "category": falling.astype(np.int16),
+        "accel_x": rng.normal(0.0, 0.05, rows).astype(np.float32),
+        "accel_y": rng.normal(0.0, 0.05, rows).astype(np.float32),
+        "accel_z": np.where(falling, rng.uniform(-2.0, -1.0, rows), rng.normal(1.0, 0.05, rows)).astype(np.float32),
+        "heart_rate_bpm": rng.integers(55, 120, size=rows).astype(np.float32),
+        "spo2": rng.integers(90, 101, size=rows).astype(np.float32),
+        "neo6m_altitude_meter": rng.normal(12.0, 3.0, rows).astype(np.float32),
+        # The barometer drifts by 5 cm per day
+        "bmp280_altitude_meter": (rng.normal(12.0, 1.0, rows) + 0.05 * milliseconds / 86_400_000).astype(np.float32),
+    }
+
+    # Sensors without a reading
+    for name in ("heart_rate_bpm", "spo2", "neo6m_altitude_meter"):
+        columns[name][rng.random(rows) < 0.1] = np.nan
+
+    return columns
+
+
+def _binary_copy(columns: Dict[str, np.ndarray]) -> bytes:
+    names = list(columns)
+    fields: List[Any] = [("fields", ">i2")]
+    for name in names:
+        fields.append((f"{name}_length", ">i4"))
+        fields.append((name, columns[name].dtype.newbyteorder(">")))
+
+    rows = np.empty(len(columns["id"]), dtype=np.dtype(fields))
+    rows["fields"] = len(names)
+    for name in names:
+        rows[f"{name}_length"] = columns[name].dtype.itemsize
+        rows[name] = columns[name]
+
+    return b"PGCOPY\n\xff\r\n\x00" + bytes(8) + rows.tobytes() + b"\xff\xff"
+
+
+def _baseline(columns: Dict[str, np.ndarray], rows: int) -> None:
+    # NaN stands for NULL in the float columns only, so the ID and the category are never None
+    records: List[Dict[str, Any]] = [
+        {name: None if isinstance(value, float) and math.isnan(value) else value for name, value in zip(columns, values)}
+        for values in zip(*(column[:rows].tolist() for column in columns.values()))
+    ]
+
+    readings = [EventReading(**{name: value for name, value in record.items() if name != "id"}) for record in records]
+    heart_rates = [reading.heart_rate_bpm for reading in readings if reading.heart_rate_bpm is not None]
+    spo2 = [reading.spo2 for reading in readings if reading.spo2 is not None]
+    magnitudes = [
+        math.sqrt(reading.accel_x ** 2 + reading.accel_y ** 2 + reading.accel_z ** 2)
+        for reading in readings
+        if reading.accel_x is not None and reading.accel_y is not None and reading.accel_z is not None
+    ]
+    drifts = [
+        reading.bmp280_altitude_meter - reading.neo6m_altitude_meter
+        for reading in readings
+        if reading.bmp280_altitude_meter is not None and reading.neo6m_altitude_meter is not None
+    ]
+    falls: Dict[int, int] = {}
+    for record in records:
+        if record["category"] == 1:
+            day = (record["id"] >> 12) // 86_400_000
+            falls[day] = falls.get(day, 0) + 1
+
+    for values in (heart_rates, spo2, magnitudes, drifts):
+        statistics.quantiles(values, n=20)
+        statistics.fmean(values)
+
+
+def main(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(args.seed)
+    columns = _columns(rng, args.rows, args.days)
+    data = _binary_copy(columns)
+
+    start = time.perf_counter()
+    parsed = parse_binary_copy(data)
+    parse_seconds = time.perf_counter() - start
+
+    for name in _FLOATS:
+        if not np.array_equal(parsed[name], columns[name], equal_nan=True):
+            raise RuntimeError(f"Column {name} was not decoded correctly")
+
+    start = time.perf_counter()
+    result = compute_analytics(parsed)
+    compute_seconds = time.perf_counter() - start
+
+    baseline_rows = min(args.baseline_rows, args.rows)
+    start = time.perf_counter()
+    _baseline(columns, baseline_rows)
+    baseline_seconds = time.perf_counter() - start
+
+    vectorized = parse_seconds + compute_seconds
+    projected = baseline_seconds / baseline_rows * args.rows
+    print(
+        json.dumps(
+            {
+                "rows": args.rows,
+                "copy_bytes": len(data),
+                "parse_seconds": parse_seconds,
+                "compute_seconds": compute_seconds,
+                "rows_per_second": args.rows / vectorized,
+                "baseline_rows": baseline_rows,
+                "baseline_seconds": baseline_seconds,
+                "baseline_projected_seconds": projected,
+                "speedup": projected / vectorized,
+                "days_with_events": len(result["daily"]),
+                "falls": sum(day["fall_count"] for day in result["daily"]),
+                "altitude_drift_meters_per_day": result["altitude_drift"]["slope_meters_per_day"],
+            },
+            indent=4,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000, help="the number of synthetic events")
+    parser.add_argument("--days", type=float, default=365.0, help="the time span of the events in days")
+    parser.add_argument("--baseline-rows", type=int, default=100_000, help="the number of events processed by the row-by-row baseline")
+    parser.add_argument("--seed", type=int, default=0, help="the random seed")
+
+    main(parser.parse_args())
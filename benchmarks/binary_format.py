@@ -0,0 +1,62 @@
+"""Compare the per-request parse cost of the JSON and binary event upload formats.
+
+    python -m benchmarks.binary_format --iterations 200000
+
+Both paths turn the request body into the keyword arguments of `Event.create`: JSON through the
+pydantic `_PostBody` model, binary through `BINARY_EVENT_LAYOUT.unpack_from`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import timeit
+
+from server.routes.events import BINARY_EVENT_LAYOUT, _PostBody
+
+
+def main(args: argparse.Namespace) -> None:
+    token = "0123456789abcdef0123456789abcdef"
+    reading = {
+        "category": 0,
+        "accel_x": 0.02,
+        "accel_y": -0.03,
+        "accel_z": 0.98,
+        "gyro_x": 0.01,
+        "gyro_y": 0.00,
+        "gyro_z": -0.01,
+        "heart_rate_bpm": 72,
+        "spo2": 98,
+        "latitude": 21.0285,
+        "longitude": 105.8542,
+        "neo6m_altitude_meter": 12.5,
+        "pressure_pa": 101325.0,
+        "bmp280_altitude_meter": 11.8,
+    }
+    json_body = json.dumps({**reading, "device_id": 42, "device_token": token}).encode("utf-8")
+    binary_body = BINARY_EVENT_LAYOUT.pack(42, 0, 0x1FFF, *list(reading.values())[1:], len(token)) + token.encode("utf-8")
+    size = BINARY_EVENT_LAYOUT.size
+
+    def parse_json() -> None:
+        body = _PostBody.model_validate_json(json_body)
+        dict(category=body.category, accel_x=body.accel_x, accel_y=body.accel_y, accel_z=body.accel_z, gyro_x=body.gyro_x, gyro_y=body.gyro_y, gyro_z=body.gyro_z, heart_rate_bpm=body.heart_rate_bpm, spo2=body.spo2, latitude=body.latitude, longitude=body.longitude, neo6m_altitude_meter=body.neo6m_altitude_meter, pressure_pa=body.pressure_pa, bmp280_altitude_meter=body.bmp280_altitude_meter, device_id=body.device_id, device_token=body.device_token)
+
+    def parse_binary() -> None:
+        device_id, category, present, ax, ay, az, gx, gy, gz, hr, spo2, lat, lon, alt, pa, balt, token_length = BINARY_EVENT_LAYOUT.unpack_from(binary_body)
+        dict(category=category, accel_x=ax if present & 0x0001 else None, accel_y=ay if present & 0x0002 else None, accel_z=az if present & 0x0004 else None, gyro_x=gx if present & 0x0008 else None, gyro_y=gy if present & 0x0010 else None, gyro_z=gz if present & 0x0020 else None, heart_rate_bpm=hr if present & 0x0040 else None, spo2=spo2 if present & 0x0080 else None, latitude=lat if present & 0x0100 else None, longitude=lon if present & 0x0200 else None, neo6m_altitude_meter=alt if present & 0x0400 else None, pressure_pa=pa if present & 0x0800 else None, bmp280_altitude_meter=balt if present & 0x1000 else None, device_id=device_id, device_token=binary_body[size:size + token_length].decode("utf-8"))
+
+    results = {}
+    for name, func, body in (("json", parse_json, json_body), ("binary", parse_binary, binary_body)):
+        best = min(timeit.repeat(func, number=args.iterations, repeat=args.repeat))
+        results[name] = {"body_bytes": len(body), "parse_us": 1e6 * best / args.iterations}
+
+    results["speedup"] = results["json"]["parse_us"] / results["binary"]["parse_us"]
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100000, help="the number of parses per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="the number of measurements, the best one is reported")
+
+    main(parser.parse_args())
@@ -0,0 +1,86 @@
+"""Measure the throughput of the server-side fall detection engine on a single core.
+
+    python -m benchmarks.detection --devices 500 --rate 20 --seconds 30
+
+Simulates every device streaming IMU samples at `rate` Hz (resting at z = 1 g with noise) while a few
+devices perform a fall, and evaluates the engine at its production tick interval.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from server.detection import FallDetectionEngine, TwoPhaseFallDetector
+
+from ._stats import summarize
+
+
+def main(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(args.seed)
+    engine = FallDetectionEngine(
+        detectors=[TwoPhaseFallDetector(free_fall=0.1, impact=-1.0, window=2.0)],
+        window_size=args.window_size,
+        interval=args.interval,
+    )
+
+    steps = int(args.seconds * args.rate)
+    samples = rng.normal(0.0, 0.05, size=(steps, args.devices, 6)).astype(np.float32)
+    samples[:, :, 2] += 1.0
+
+    # Free fall followed by an impact half a second later
+    fallers = rng.choice(args.devices, size=args.falls, replace=False)
+    at = rng.integers(0, steps - args.rate, size=args.falls)
+    samples[at, fallers, 2] = 0.0
+    samples[at + args.rate // 2, fallers, 2] = -1.5
+
+    rows = samples.tolist()
+    ticks_per_evaluation = max(1, round(args.interval * args.rate))
+    evaluations = []
+    detected = 0
+
+    start = time.perf_counter()
+    for step in range(steps):
+        now = step / args.rate
+        row = rows[step]
+        for device in range(args.devices):
+            engine.push(device, now, row[device])
+
+        if step % ticks_per_evaluation == 0:
+            evaluation_start = time.perf_counter()
+            detected += len(engine.evaluate())
+            evaluations.append(time.perf_counter() - evaluation_start)
+
+    elapsed = time.perf_counter() - start
+    total = steps * args.devices
+    print(
+        json.dumps(
+            {
+                "devices": args.devices,
+                "rate_hz": args.rate,
+                "samples": total,
+                "samples_per_second": total / elapsed,
+                "realtime_factor": args.seconds / elapsed,
+                "falls_injected": args.falls,
+                "falls_detected": detected,
+                "evaluate": summarize(evaluations, elapsed=elapsed),
+            },
+            indent=4,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=500, help="the number of simulated devices")
+    parser.add_argument("--rate", type=int, default=20, help="the sample rate of each device in Hz")
+    parser.add_argument("--seconds", type=float, default=30.0, help="the simulated duration in seconds")
+    parser.add_argument("--falls", type=int, default=10, help="the number of injected falls")
+    parser.add_argument("--window-size", type=int, default=64, help="the ring buffer size per device")
+    parser.add_argument("--interval", type=float, default=0.1, help="the evaluation interval in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="the random seed")
+
+    main(parser.parse_args())
@@ -0,0 +1,245 @@
+"""Simulate a fleet of devices and dashboard readers against an in-process server.
+
+Requires a local Postgres (configured through the usual `POSTGRES_*` variables, `POSTGRES_HOST`
+defaults to localhost here). The Discord API is replaced by a local aiohttp stub, so no bot token
+is needed:
+
+    python -m benchmarks.fleet --devices 200 --rate 5 --readers 20 --duration 30 --output fleet.json
+
+Every virtual device posts `REGULAR_UPDATE` events with the same JSON fields as esp32/src/main.cpp
+at `--rate` Hz, and a `FALL_DETECTED` event with probability `--fall-ratio`. Readers poll the
+device list and event pages of random devices. The output contains throughput and latency
+percentiles per endpoint, together with the run parameters and the current git commit.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import secrets
+import subprocess
+import time
+from typing import Any, Dict, List, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from ._stats import summarize
+
+
+class _Recorder:
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def request(self, session: aiohttp.ClientSession, endpoint: str, method: str, url: str, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                data = await response.json()
+                ok = response.status < 400
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            data = None
+            ok = False
+
+        if ok:
+            self.latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+        else:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+        return data
+
+
+async def _start_discord_stub(port: int) -> Tuple[web.AppRunner, Dict[str, int]]:
+    counters = {"dm_channels": 0, "messages": 0}
+    channel_ids = itertools.count(1)
+
+    async def me(_: web.Request) -> web.Response:
+        return web.json_response({"id": "1", "avatar": None})
+
+    async def dm_channel(_: web.Request) -> web.Response:
+        counters["dm_channels"] += 1
+        return web.json_response({"id": str(next(channel_ids))})
+
+    async def message(_: web.Request) -> web.Response:
+        counters["messages"] += 1
+        return web.json_response({"id": "1"}, headers={"X-RateLimit-Remaining": "5", "X-RateLimit-Reset-After": "1"})
+
+    stub = web.Application()
+    stub.router.add_get("/users/@me", me)
+    stub.router.add_post("/users/@me/channels", dm_channel)
+    stub.router.add_post("/channels/{channel_id}/messages", message)
+
+    runner = web.AppRunner(stub)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, counters
+
+
+def _reading(category: int) -> Dict[str, Any]:
+    falling = category == 1
+    return {
+        "category": category,
+        "accel_x": round(random.gauss(0, 0.05), 2),
+        "accel_y": round(random.gauss(0, 0.05), 2),
+        "accel_z": round(random.uniform(-2.0, -1.0) if falling else random.gauss(1, 0.05), 2),
+        "gyro_x": round(random.gauss(0, 0.1), 2),
+        "gyro_y": round(random.gauss(0, 0.1), 2),
+        "gyro_z": round(random.gauss(0, 0.1), 2),
+        "heart_rate_bpm": random.randint(60, 100),
+        "spo2": random.randint(94, 100),
+        "latitude": round(21.0285 + random.gauss(0, 0.01), 2),
+        "longitude": round(105.8542 + random.gauss(0, 0.01), 2),
+        "neo6m_altitude_meter": round(random.uniform(5, 20), 2),
+        "pressure_pa": round(random.gauss(101325, 50), 2),
+        "bmp280_altitude_meter": round(random.uniform(5, 20), 2),
+    }
+
+
+async def _device(
+    recorder: _Recorder,
+    session: aiohttp.ClientSession,
+    url: str,
+    device_id: int,
+    token: str,
+    rate: float,
+    fall_ratio: float,
+    deadline: float,
+) -> None:
+    # Spread the first uploads so that devices do not all post in lockstep
+    await asyncio.sleep(random.uniform(0, 1 / rate))
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        category = 1 if random.random() < fall_ratio else 0
+        payload = {**_reading(category), "device_id": device_id, "device_token": token}
+        await recorder.request(session, "POST /api/events/", "POST", f"{url}/api/events/", json=payload)
+        await asyncio.sleep(max(0.0, 1 / rate - (time.perf_counter() - started)))
+
+
+async def _reader(
+    recorder: _Recorder,
+    session: aiohttp.ClientSession,
+    url: str,
+    headers: Dict[str, str],
+    device_ids: List[int],
+    interval: float,
+    deadline: float,
+) -> None:
+    while time.perf_counter() < deadline:
+        await recorder.request(session, "GET /api/devices/", "GET", f"{url}/api/devices/", headers=headers)
+        device_id = random.choice(device_ids)
+        await recorder.request(
+            session,
+            "GET /api/devices/{id}/events",
+            "GET",
+            f"{url}/api/devices/{device_id}/events",
+            params={"limit": "50"},
+            headers=headers,
+        )
+        await asyncio.sleep(interval)
+
+
+async def _setup_fleet(session: aiohttp.ClientSession, url: str, devices: int) -> Tuple[Dict[str, str], List[Tuple[int, str]]]:
+    username = f"fleet-{secrets.token_hex(4)}"
+    password = secrets.token_hex(8)
+    async with session.post(f"{url}/api/users/", json={"username": username, "discord_user_id": "1", "password": password}) as response:
+        created = await response.json()
+        if created["data"] is None:
+            raise RuntimeError(f"Cannot create the benchmark user: {created}")
+
+    async with session.post(f"{url}/api/login", data={"username": username, "password": password}) as response:
+        headers = {"Authorization": f"Bearer {(await response.json())['access_token']}"}
+
+    async def create_device(index: int) -> Tuple[int, str]:
+        token = secrets.token_hex(16)
+        async with session.post(f"{url}/api/devices/", json={"name": f"device-{index}", "token": token}, headers=headers) as response:
+            return (await response.json())["data"]["id"], token
+
+    fleet = await asyncio.gather(*[create_device(index) for index in range(devices)])
+    return headers, list(fleet)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def main(args: argparse.Namespace) -> None:
+    # The server reads its configuration at import time
+    os.environ["DISCORD_API_URL"] = f"http://127.0.0.1:{args.discord_port}"
+    os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+    os.environ.setdefault("POSTGRES_HOST", "localhost")
+
+    import uvicorn
+    from server.app import app
+
+    stub, discord_counters = await _start_discord_stub(args.discord_port)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            await serving
+            raise RuntimeError("The server exited during startup")
+
+        await asyncio.sleep(0.05)
+
+    url = f"http://127.0.0.1:{args.port}"
+    recorder = _Recorder()
+    try:
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            headers, fleet = await _setup_fleet(session, url, args.devices)
+            device_ids = [device_id for device_id, _ in fleet]
+
+            start = time.perf_counter()
+            deadline = start + args.duration
+            await asyncio.gather(
+                *[_device(recorder, session, url, device_id, token, args.rate, args.fall_ratio, deadline) for device_id, token in fleet],
+                *[_reader(recorder, session, url, headers, device_ids, args.read_interval, deadline) for _ in range(args.readers)],
+            )
+            elapsed = time.perf_counter() - start
+
+    finally:
+        server.should_exit = True
+        await serving
+        await stub.cleanup()
+
+    results = {
+        "commit": _git_commit(),
+        "parameters": vars(args),
+        "elapsed_seconds": elapsed,
+        "endpoints": {
+            endpoint: {**summarize(latencies, elapsed=elapsed), "errors": recorder.errors.get(endpoint, 0)}
+            for endpoint, latencies in sorted(recorder.latencies.items())
+        },
+        "errors": recorder.errors,
+        "discord": discord_counters,
+    }
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=100, help="the number of simulated devices")
+    parser.add_argument("--rate", type=float, default=5.0, help="the upload rate of each device in events per second")
+    parser.add_argument("--fall-ratio", type=float, default=0.001, help="the probability that an upload is a FALL_DETECTED event")
+    parser.add_argument("--readers", type=int, default=10, help="the number of concurrent dashboard readers")
+    parser.add_argument("--read-interval", type=float, default=0.5, help="the delay between two dashboard refreshes in seconds")
+    parser.add_argument("--duration", type=float, default=30.0, help="the benchmark duration in seconds")
+    parser.add_argument("--port", type=int, default=12110, help="the port of the in-process server")
+    parser.add_argument("--discord-port", type=int, default=12111, help="the port of the Discord API stub")
+    parser.add_argument("--output", default=None, help="also write the JSON results to this file")
+
+    asyncio.run(main(parser.parse_args()))
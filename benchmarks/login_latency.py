@@ -0,0 +1,69 @@
+"""Measure the latency of the health check endpoint while the server is handling concurrent logins.
+
+Run against a live server with an existing account:
+
+    python -m benchmarks.login_latency --url http://localhost:12110 --username alice --password secret
+
+With hashing on the event loop, every Argon2 verification stalls `GET /api/` and its p99 latency
+climbs to roughly the hash time multiplied by the login concurrency.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+import aiohttp
+
+from ._stats import summarize
+
+
+async def _login_worker(session: aiohttp.ClientSession, url: str, username: str, password: str, deadline: float, latencies: List[float]) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        async with session.post(f"{url}/api/login", data={"username": username, "password": password}) as response:
+            await response.read()
+
+        latencies.append(time.perf_counter() - start)
+
+
+async def _probe_worker(session: aiohttp.ClientSession, url: str, interval: float, deadline: float, latencies: List[float]) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        async with session.get(f"{url}/api/") as response:
+            await response.read()
+
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+
+async def main(args: argparse.Namespace) -> None:
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        logins: List[float] = []
+        probes: List[float] = []
+
+        await asyncio.gather(
+            _probe_worker(session, args.url, args.interval, deadline, probes),
+            *[_login_worker(session, args.url, args.username, args.password, deadline, logins) for _ in range(args.concurrency)],
+        )
+        elapsed = time.perf_counter() - start
+
+    print(json.dumps({"GET /api/": summarize(probes, elapsed=elapsed), "POST /api/login": summarize(logins, elapsed=elapsed)}, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:12110", help="the server base URL")
+    parser.add_argument("--username", required=True, help="the username to log in with")
+    parser.add_argument("--password", required=True, help="the password to log in with")
+    parser.add_argument("--concurrency", type=int, default=32, help="the number of concurrent login loops")
+    parser.add_argument("--duration", type=float, default=10.0, help="the benchmark duration in seconds")
+    parser.add_argument("--interval", type=float, default=0.01, help="the delay between health check probes in seconds")
+
+    asyncio.run(main(parser.parse_args()))
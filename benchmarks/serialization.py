@@ -0,0 +1,107 @@
+"""Compare the validated and the validation-free response paths of the event list endpoints.
+
+    python -m benchmarks.serialization --events 10000 --iterations 20
+
+Mounts two routes on an in-process FastAPI app, fed with the same synthetic rows: the previous path,
+which validates an `Event` per row and lets FastAPI validate and serialize `Result[List[Event]]`
+again, and the current one, which builds the events with `model_construct` and returns
+`Result.to_response()`. Both responses are checked to be identical before timing.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+from server.models import Device, Event, Result, User
+
+from ._stats import summarize
+
+
+def _rows(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": (1 << 40) + index,
+            "category": 0,
+            "accel_x": random.gauss(0, 0.05),
+            "accel_y": random.gauss(0, 0.05),
+            "accel_z": random.gauss(1, 0.05),
+            "gyro_x": random.gauss(0, 0.1),
+            "gyro_y": random.gauss(0, 0.1),
+            "gyro_z": random.gauss(0, 0.1),
+            "heart_rate_bpm": random.randint(60, 100),
+            "spo2": random.randint(94, 100),
+            "latitude": 21.0285,
+            "longitude": 105.8542,
+            "neo6m_altitude_meter": None,
+            "pressure_pa": random.gauss(101325, 50),
+            "bmp280_altitude_meter": random.uniform(5, 20),
+        }
+        for index in range(count)
+    ]
+
+
+def _app(rows: List[Dict[str, Any]]) -> FastAPI:
+    user = User(id=1, username="benchmark", discord_channel_id=1, hashed_password="hash")
+    device = Device(id=2, name="device", hashed_token="hash", user=user)
+    app = FastAPI()
+
+    @app.get("/validated")
+    async def validated() -> Result[List[Event]]:
+        return Result(data=[Event(**row, device=device) for row in rows])
+
+    @app.get("/fast", response_model=Result[List[Event]])
+    async def fast() -> Response:
+        result = Result(data=[Event.model_construct(**row, device=device) for row in rows])
+        return result.to_response()
+
+    return app
+
+
+async def _measure(client: httpx.AsyncClient, path: str, iterations: int) -> Dict[str, float]:
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        request_start = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - request_start)
+
+    return summarize(latencies, elapsed=time.perf_counter() - start)
+
+
+async def main(args: argparse.Namespace) -> None:
+    random.seed(args.seed)
+    app = _app(_rows(args.events))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        validated = await client.get("/validated")
+        fast = await client.get("/fast")
+        if validated.json() != fast.json():
+            raise RuntimeError("The two paths return different responses")
+
+        results = {
+            "events": args.events,
+            "response_bytes": len(fast.content),
+            "validated": await _measure(client, "/validated", args.iterations),
+            "fast": await _measure(client, "/fast", args.iterations),
+        }
+
+    results["speedup_p50"] = results["validated"]["p50_ms"] / results["fast"]["p50_ms"]
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10_000, help="the number of events per response")
+    parser.add_argument("--iterations", type=int, default=20, help="the number of requests per path")
+    parser.add_argument("--seed", type=int, default=0, help="the random seed")
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,533 @@
+-- Baseline schema: the former tables.sql, functions.sql and views.sql. Every statement is
+-- idempotent so that databases created by those scripts can be brought under version control.
+
+CREATE SEQUENCE IF NOT EXISTS snowflake_id_tail
+    AS BIGINT
+    START WITH 0
+    INCREMENT BY 1
+    MINVALUE 0
+    MAXVALUE 4095 -- 12 bits tail
+    CYCLE;
+
+CREATE TABLE IF NOT EXISTS Users (
+    id BIGINT PRIMARY KEY,
+    username VARCHAR(255) UNIQUE NOT NULL,
+    discord_channel_id BIGINT NOT NULL,
+    hashed_password VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Devices (
+    id BIGINT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    hashed_token VARCHAR(255) NOT NULL,
+    user_id BIGINT REFERENCES Users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS Events (
+    id BIGINT PRIMARY KEY,
+    category SMALLINT NOT NULL,
+    accel_x REAL,
+    accel_y REAL,
+    accel_z REAL,
+    gyro_x REAL,
+    gyro_y REAL,
+    gyro_z REAL,
+    heart_rate_bpm SMALLINT,
+    spo2 SMALLINT,
+    latitude REAL,
+    longitude REAL,
+    neo6m_altitude_meter REAL,
+    pressure_pa REAL,
+    bmp280_altitude_meter REAL,
+    device_id BIGINT REFERENCES Devices(id) ON DELETE CASCADE
+) PARTITION BY RANGE (id);
+
+-- Monthly partitions are created ahead of time by ensure_events_partitions(), this one only
+-- catches rows whose partition does not exist yet. Databases created before partitioning keep
+-- their plain Events table, the partition functions below do nothing on it.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'events'::REGCLASS) THEN
+        CREATE TABLE IF NOT EXISTS Events_default PARTITION OF Events DEFAULT;
+    ELSE
+        RAISE NOTICE 'Events is not partitioned, skipping the partition setup';
+    END IF;
+END;
+$$;
+
+-- Per-device aggregates of Events over fixed time buckets, maintained by rollup_events()
+CREATE TABLE IF NOT EXISTS EventRollups (
+    device_id BIGINT REFERENCES Devices(id) ON DELETE CASCADE,
+    bucket_seconds INTEGER NOT NULL,
+    bucket_start TIMESTAMPTZ NOT NULL,
+    event_count INTEGER NOT NULL,
+    heart_rate_bpm_count INTEGER NOT NULL,
+    heart_rate_bpm_sum DOUBLE PRECISION NOT NULL,
+    heart_rate_bpm_min SMALLINT,
+    heart_rate_bpm_max SMALLINT,
+    spo2_count INTEGER NOT NULL,
+    spo2_sum DOUBLE PRECISION NOT NULL,
+    spo2_min SMALLINT,
+    spo2_max SMALLINT,
+    pressure_pa_count INTEGER NOT NULL,
+    pressure_pa_sum DOUBLE PRECISION NOT NULL,
+    pressure_pa_min REAL,
+    pressure_pa_max REAL,
+    accel_magnitude_count INTEGER NOT NULL,
+    accel_magnitude_sum DOUBLE PRECISION NOT NULL,
+    accel_magnitude_min REAL,
+    accel_magnitude_max REAL,
+    PRIMARY KEY (device_id, bucket_seconds, bucket_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_devices_user_id ON Devices(user_id);
+-- Serves both device lookups and keyset pagination over a device's events
+CREATE INDEX IF NOT EXISTS idx_events_device_id_id ON Events(device_id, id DESC);
+DROP INDEX IF EXISTS idx_events_device_id;
+
+CREATE OR REPLACE FUNCTION generate_id()
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_epoch_ms BIGINT;
+    v_tail BIGINT;
+    v_id BIGINT;
+BEGIN
+    -- milliseconds since 2020-01-01 00:00:00 UTC
+    v_epoch_ms :=
+        FLOOR(
+            (
+                EXTRACT(EPOCH FROM clock_timestamp())
+                - EXTRACT(EPOCH FROM TIMESTAMP '2020-01-01 00:00:00 UTC')
+            ) * 1000
+        );
+
+    -- next 8-bit sequence value, the 4-bit worker field is 0 for the database (see server/ids.py)
+    v_tail := nextval('snowflake_id_tail') % 256;
+
+    -- construct snowflake id: upper 52 bits | lower 12 bits
+    v_id := (v_epoch_ms << 12) | v_tail;
+
+    RETURN v_id;
+END;
+$$;
+
+-- The smallest snowflake ID that generate_id() can return at the given time
+CREATE OR REPLACE FUNCTION snowflake_at(p_time TIMESTAMPTZ)
+RETURNS BIGINT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT GREATEST(
+        FLOOR(
+            (
+                EXTRACT(EPOCH FROM p_time)
+                - EXTRACT(EPOCH FROM TIMESTAMPTZ '2020-01-01 00:00:00 UTC')
+            ) * 1000
+        )::BIGINT,
+        0
+    ) << 12;
+$$;
+
+-- Create the partition of Events holding the snowflake IDs generated during the given month
+CREATE OR REPLACE FUNCTION create_events_partition(p_month DATE)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_month TIMESTAMP := date_trunc('month', p_month::TIMESTAMP);
+    v_name TEXT := 'events_' || to_char(v_month, '"y"YYYY"m"MM');
+BEGIN
+    -- serialize concurrent workers creating the same partition
+    PERFORM pg_advisory_xact_lock(hashtext('create_events_partition'));
+
+    IF to_regclass(v_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF Events FOR VALUES FROM (%s) TO (%s)',
+            v_name,
+            snowflake_at(v_month AT TIME ZONE 'UTC'),
+            snowflake_at((v_month + INTERVAL '1 month') AT TIME ZONE 'UTC')
+        );
+    END IF;
+END;
+$$;
+
+-- Make sure the partitions for the current month and the next p_months_ahead months exist
+CREATE OR REPLACE FUNCTION ensure_events_partitions(p_months_ahead INTEGER)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_month DATE := date_trunc('month', clock_timestamp() AT TIME ZONE 'UTC')::DATE;
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        PERFORM create_events_partition((v_month + make_interval(months => i))::DATE);
+    END LOOP;
+END;
+$$;
+
+-- Drop (or only detach) every monthly partition of Events that ends before the given time,
+-- returning the names of the affected partitions
+CREATE OR REPLACE FUNCTION drop_events_partitions(p_before TIMESTAMPTZ, p_detach BOOLEAN)
+RETURNS SETOF TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_name TEXT;
+BEGIN
+    FOR v_name IN
+        SELECT c.relname::TEXT
+        FROM pg_inherits i
+        INNER JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'events'::REGCLASS AND c.relname ~ '^events_y[0-9]{4}m[0-9]{2}$'
+        ORDER BY c.relname
+    LOOP
+        IF (to_date(substring(v_name FROM 8), '"y"YYYY"m"MM') + INTERVAL '1 month') AT TIME ZONE 'UTC' <= p_before THEN
+            IF p_detach THEN
+                EXECUTE format('ALTER TABLE Events DETACH PARTITION %I', v_name);
+            ELSE
+                EXECUTE format('DROP TABLE %I', v_name);
+            END IF;
+
+            RETURN NEXT v_name;
+        END IF;
+    END LOOP;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION create_user(
+    p_username VARCHAR,
+    p_discord_channel_id BIGINT,
+    p_hashed_password VARCHAR
+)
+RETURNS TABLE (
+    user_id BIGINT,
+    user_username VARCHAR,
+    user_discord_channel_id BIGINT,
+    user_hashed_password VARCHAR
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    INSERT INTO Users (id, username, discord_channel_id, hashed_password)
+    VALUES (generate_id(), p_username, p_discord_channel_id, p_hashed_password)
+    RETURNING
+        id AS user_id,
+        username AS user_username,
+        discord_channel_id AS user_discord_channel_id,
+        hashed_password AS user_hashed_password;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION create_device(
+    p_name VARCHAR,
+    p_hashed_token VARCHAR,
+    p_user_id BIGINT
+)
+RETURNS TABLE (
+    device_id BIGINT,
+    device_name VARCHAR,
+    device_hashed_token VARCHAR,
+    user_id BIGINT,
+    user_username VARCHAR,
+    user_discord_channel_id BIGINT,
+    user_hashed_password VARCHAR
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    WITH inserted AS (
+        INSERT INTO Devices (id, name, hashed_token, user_id)
+        VALUES (generate_id(), p_name, p_hashed_token, p_user_id)
+        RETURNING *
+    )
+    SELECT 
+        i.id AS device_id,
+        i.name AS device_name,
+        i.hashed_token AS device_hashed_token,
+        u.user_id,
+        u.user_username,
+        u.user_discord_channel_id,
+        u.user_hashed_password
+    FROM inserted i
+    JOIN view_users u ON u.user_id = i.user_id;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION create_event(
+    p_category SMALLINT,
+    p_accel_x REAL,
+    p_accel_y REAL,
+    p_accel_z REAL,
+    p_gyro_x REAL,
+    p_gyro_y REAL,
+    p_gyro_z REAL,
+    p_heart_rate_bpm SMALLINT,
+    p_spo2 SMALLINT,
+    p_latitude REAL,
+    p_longitude REAL,
+    p_neo6m_altitude_meter REAL,
+    p_pressure_pa REAL,
+    p_bmp280_altitude_meter REAL,
+    p_device_id BIGINT
+)
+RETURNS TABLE (
+    event_id BIGINT,
+    event_category SMALLINT,
+    event_accel_x REAL,
+    event_accel_y REAL,
+    event_accel_z REAL,
+    event_gyro_x REAL,
+    event_gyro_y REAL,
+    event_gyro_z REAL,
+    event_heart_rate_bpm SMALLINT,
+    event_spo2 SMALLINT,
+    event_latitude REAL,
+    event_longitude REAL,
+    event_neo6m_altitude_meter REAL,
+    event_pressure_pa REAL,
+    event_bmp280_altitude_meter REAL,
+    device_id BIGINT,
+    device_name VARCHAR,
+    device_hashed_token VARCHAR,
+    user_id BIGINT,
+    user_username VARCHAR,
+    user_discord_channel_id BIGINT,
+    user_hashed_password VARCHAR
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    WITH inserted AS (
+        INSERT INTO Events (
+            id,
+            category,
+            accel_x,
+            accel_y,
+            accel_z,
+            gyro_x,
+            gyro_y,
+            gyro_z,
+            heart_rate_bpm,
+            spo2,
+            latitude,
+            longitude,
+            neo6m_altitude_meter,
+            pressure_pa,
+            bmp280_altitude_meter,
+            device_id
+        )
+        VALUES (
+            generate_id(),
+            p_category,
+            p_accel_x,
+            p_accel_y,
+            p_accel_z,
+            p_gyro_x,
+            p_gyro_y,
+            p_gyro_z,
+            p_heart_rate_bpm,
+            p_spo2,
+            p_latitude,
+            p_longitude,
+            p_neo6m_altitude_meter,
+            p_pressure_pa,
+            p_bmp280_altitude_meter,
+            p_device_id
+        )
+        RETURNING *
+    )
+    SELECT 
+        i.id AS event_id,
+        i.category AS event_category,
+        i.accel_x AS event_accel_x,
+        i.accel_y AS event_accel_y,
+        i.accel_z AS event_accel_z,
+        i.gyro_x AS event_gyro_x,
+        i.gyro_y AS event_gyro_y,
+        i.gyro_z AS event_gyro_z,
+        i.heart_rate_bpm AS event_heart_rate_bpm,
+        i.spo2 AS event_spo2,
+        i.latitude AS event_latitude,
+        i.longitude AS event_longitude,
+        i.neo6m_altitude_meter AS event_neo6m_altitude_meter,
+        i.pressure_pa AS event_pressure_pa,
+        i.bmp280_altitude_meter AS event_bmp280_altitude_meter,
+        d.device_id,
+        d.device_name,
+        d.device_hashed_token,
+        d.user_id,
+        d.user_username,
+        d.user_discord_channel_id,
+        d.user_hashed_password
+    FROM inserted i
+    JOIN view_devices d ON d.device_id = i.device_id;
+END;
+$$;
+
+-- Fold the rows inserted into Events by a statement into the 1 minute, 1 hour and 1 day
+-- buckets of EventRollups
+CREATE OR REPLACE FUNCTION rollup_events()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO EventRollups
+    SELECT
+        i.device_id,
+        b.seconds,
+        to_timestamp(FLOOR((1577836800 + (i.id >> 12) / 1000.0) / b.seconds) * b.seconds),
+        COUNT(*),
+        COUNT(i.heart_rate_bpm),
+        COALESCE(SUM(i.heart_rate_bpm), 0),
+        MIN(i.heart_rate_bpm),
+        MAX(i.heart_rate_bpm),
+        COUNT(i.spo2),
+        COALESCE(SUM(i.spo2), 0),
+        MIN(i.spo2),
+        MAX(i.spo2),
+        COUNT(i.pressure_pa),
+        COALESCE(SUM(i.pressure_pa), 0),
+        MIN(i.pressure_pa),
+        MAX(i.pressure_pa),
+        COUNT(m.magnitude),
+        COALESCE(SUM(m.magnitude), 0),
+        MIN(m.magnitude),
+        MAX(m.magnitude)
+    FROM inserted i
+    CROSS JOIN (VALUES (60), (3600), (86400)) AS b(seconds)
+    CROSS JOIN LATERAL (
+        SELECT SQRT(i.accel_x * i.accel_x + i.accel_y * i.accel_y + i.accel_z * i.accel_z)::REAL AS magnitude
+    ) m
+    WHERE i.device_id IS NOT NULL
+    GROUP BY 1, 2, 3
+    -- a consistent lock order keeps concurrent statements from deadlocking
+    ORDER BY 1, 2, 3
+    ON CONFLICT (device_id, bucket_seconds, bucket_start) DO UPDATE SET
+        event_count = EventRollups.event_count + EXCLUDED.event_count,
+        heart_rate_bpm_count = EventRollups.heart_rate_bpm_count + EXCLUDED.heart_rate_bpm_count,
+        heart_rate_bpm_sum = EventRollups.heart_rate_bpm_sum + EXCLUDED.heart_rate_bpm_sum,
+        heart_rate_bpm_min = LEAST(EventRollups.heart_rate_bpm_min, EXCLUDED.heart_rate_bpm_min),
+        heart_rate_bpm_max = GREATEST(EventRollups.heart_rate_bpm_max, EXCLUDED.heart_rate_bpm_max),
+        spo2_count = EventRollups.spo2_count + EXCLUDED.spo2_count,
+        spo2_sum = EventRollups.spo2_sum + EXCLUDED.spo2_sum,
+        spo2_min = LEAST(EventRollups.spo2_min, EXCLUDED.spo2_min),
+        spo2_max = GREATEST(EventRollups.spo2_max, EXCLUDED.spo2_max),
+        pressure_pa_count = EventRollups.pressure_pa_count + EXCLUDED.pressure_pa_count,
+        pressure_pa_sum = EventRollups.pressure_pa_sum + EXCLUDED.pressure_pa_sum,
+        pressure_pa_min = LEAST(EventRollups.pressure_pa_min, EXCLUDED.pressure_pa_min),
+        pressure_pa_max = GREATEST(EventRollups.pressure_pa_max, EXCLUDED.pressure_pa_max),
+        accel_magnitude_count = EventRollups.accel_magnitude_count + EXCLUDED.accel_magnitude_count,
+        accel_magnitude_sum = EventRollups.accel_magnitude_sum + EXCLUDED.accel_magnitude_sum,
+        accel_magnitude_min = LEAST(EventRollups.accel_magnitude_min, EXCLUDED.accel_magnitude_min),
+        accel_magnitude_max = GREATEST(EventRollups.accel_magnitude_max, EXCLUDED.accel_magnitude_max);
+
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER trg_events_rollup
+AFTER INSERT ON Events
+REFERENCING NEW TABLE AS inserted
+FOR EACH STATEMENT
+EXECUTE FUNCTION rollup_events();
+
+-- Announce the rows inserted into Events on the `events` channel, for live subscribers
+CREATE OR REPLACE FUNCTION notify_events()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('events', (to_jsonb(i) || jsonb_build_object('user_id', d.user_id))::TEXT)
+    FROM inserted i
+    INNER JOIN Devices d ON d.id = i.device_id
+    ORDER BY i.id;
+
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER trg_events_notify
+AFTER INSERT ON Events
+REFERENCING NEW TABLE AS inserted
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_events();
+
+-- Tell every server process to drop its cached copy of an updated or deleted row
+CREATE OR REPLACE FUNCTION notify_invalidation()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('invalidate', lower(TG_TABLE_NAME) || ':' || OLD.id);
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER trg_users_invalidate
+AFTER UPDATE OR DELETE ON Users
+FOR EACH ROW
+EXECUTE FUNCTION notify_invalidation();
+
+CREATE OR REPLACE TRIGGER trg_devices_invalidate
+AFTER UPDATE OR DELETE ON Devices
+FOR EACH ROW
+EXECUTE FUNCTION notify_invalidation();
+
+CREATE OR REPLACE VIEW view_users AS
+SELECT
+    id AS user_id,
+    username AS user_username,
+    discord_channel_id AS user_discord_channel_id,
+    hashed_password AS user_hashed_password
+FROM Users;
+
+CREATE OR REPLACE VIEW view_devices AS
+SELECT
+    d.id AS device_id,
+    d.name AS device_name,
+    d.hashed_token as device_hashed_token,
+    u.user_id,
+    u.user_username,
+    u.user_discord_channel_id,
+    u.user_hashed_password
+FROM Devices d
+INNER JOIN view_users u ON d.user_id = u.user_id;
+
+CREATE OR REPLACE VIEW view_events AS
+SELECT
+    e.id AS event_id,
+    e.category AS event_category,
+    e.accel_x AS event_accel_x,
+    e.accel_y AS event_accel_y,
+    e.accel_z AS event_accel_z,
+    e.gyro_x AS event_gyro_x,
+    e.gyro_y AS event_gyro_y,
+    e.gyro_z AS event_gyro_z,
+    e.heart_rate_bpm AS event_heart_rate_bpm,
+    e.spo2 AS event_spo2,
+    e.latitude AS event_latitude,
+    e.longitude AS event_longitude,
+    e.neo6m_altitude_meter AS event_neo6m_altitude_meter,
+    e.pressure_pa AS event_pressure_pa,
+    e.bmp280_altitude_meter AS event_bmp280_altitude_meter,
+    d.device_id,
+    d.device_name,
+    d.device_hashed_token,
+    d.user_id,
+    d.user_username,
+    d.user_discord_channel_id,
+    d.user_hashed_password
+FROM Events e
+INNER JOIN view_devices d ON e.device_id = d.device_id;
+
+CREATE OR REPLACE VIEW view_event_rollups AS
+SELECT
+    r.*,
+    d.user_id
+FROM EventRollups r
+INNER JOIN Devices d ON r.device_id = d.id;
@@ -0,0 +1,125 @@
+-- Grid cell of a coordinate on a 0.01 degree grid (about 1.1 km of latitude), numbered row by row:
+-- latitude row * 36000 + longitude column
+CREATE OR REPLACE FUNCTION geo_cell(p_latitude DOUBLE PRECISION, p_longitude DOUBLE PRECISION)
+RETURNS BIGINT
+LANGUAGE sql
+IMMUTABLE
+STRICT
+PARALLEL SAFE
+AS $$
+    SELECT
+        LEAST(GREATEST(FLOOR((p_latitude + 90) * 100), 0), 17999)::BIGINT * 36000
+        + LEAST(GREATEST(FLOOR((p_longitude + 180) * 100), 0), 35999)::BIGINT;
+$$;
+
+-- The cells covering a bounding box, as one contiguous range of cell numbers per latitude row
+CREATE OR REPLACE FUNCTION geo_cells_in_box(
+    p_min_latitude DOUBLE PRECISION,
+    p_min_longitude DOUBLE PRECISION,
+    p_max_latitude DOUBLE PRECISION,
+    p_max_longitude DOUBLE PRECISION
+)
+RETURNS TABLE (cell_from BIGINT, cell_to BIGINT)
+LANGUAGE sql
+IMMUTABLE
+STRICT
+PARALLEL SAFE
+AS $$
+    SELECT
+        geo_cell(p_min_latitude, p_min_longitude) + row_offset * 36000,
+        geo_cell(p_min_latitude, p_max_longitude) + row_offset * 36000
+    FROM generate_series(
+        0::BIGINT,
+        (geo_cell(p_max_latitude, p_min_longitude) - geo_cell(p_min_latitude, p_min_longitude)) / 36000
+    ) AS row_offset;
+$$;
+
+-- Great-circle distance in meters (haversine formula on a spherical Earth)
+CREATE OR REPLACE FUNCTION geo_distance_meters(
+    p_latitude_1 DOUBLE PRECISION,
+    p_longitude_1 DOUBLE PRECISION,
+    p_latitude_2 DOUBLE PRECISION,
+    p_longitude_2 DOUBLE PRECISION
+)
+RETURNS DOUBLE PRECISION
+LANGUAGE sql
+IMMUTABLE
+STRICT
+PARALLEL SAFE
+AS $$
+    SELECT 2 * 6371008.8 * asin(sqrt(
+        sin(radians(p_latitude_2 - p_latitude_1) / 2) ^ 2
+        + cos(radians(p_latitude_1)) * cos(radians(p_latitude_2)) * sin(radians(p_longitude_2 - p_longitude_1) / 2) ^ 2
+    ));
+$$;
+
+-- NULL without a GPS fix. Adding a nullable column without a default only touches the catalog, the
+-- lock timeout keeps the brief ACCESS EXCLUSIVE lock from queueing every query behind a long one.
+-- Existing rows are filled in later, in batches, by `python -m server.migrations geo-cells`.
+SET LOCAL lock_timeout = '5s';
+ALTER TABLE Events ADD COLUMN IF NOT EXISTS geo_cell BIGINT;
+
+-- Maintained on every insert path (create_event(), COPY, ...)
+CREATE OR REPLACE FUNCTION set_events_geo_cell()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.geo_cell := geo_cell(NEW.latitude, NEW.longitude);
+    RETURN NEW;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER trg_events_geo_cell
+BEFORE INSERT OR UPDATE OF latitude, longitude ON Events
+FOR EACH ROW
+EXECUTE FUNCTION set_events_geo_cell();
+
+-- Fill in geo_cell for the rows with id in (p_after, next p_batch_size ids], returning the last id
+-- of the batch, or NULL past the end of the table
+CREATE OR REPLACE FUNCTION backfill_events_geo_cells(p_after BIGINT, p_batch_size INTEGER)
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_last BIGINT;
+BEGIN
+    SELECT MAX(id) INTO v_last
+    FROM (SELECT id FROM Events WHERE id > p_after ORDER BY id LIMIT p_batch_size) batch;
+
+    IF v_last IS NOT NULL THEN
+        UPDATE Events
+        SET geo_cell = geo_cell(latitude, longitude)
+        WHERE id > p_after AND id <= v_last
+            AND geo_cell IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL;
+    END IF;
+
+    RETURN v_last;
+END;
+$$;
+
+-- Cell ranges first, then snowflake IDs for the time window. On a partitioned Events this only
+-- creates the (invalid) parent index, which new partitions inherit: the indexes of the existing
+-- partitions are built concurrently and attached by `python -m server.migrations geo-cells`.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'events'::REGCLASS) THEN
+        CREATE INDEX IF NOT EXISTS idx_events_geo_cell_id ON ONLY Events(geo_cell, id) WHERE geo_cell IS NOT NULL;
+    END IF;
+END;
+$$;
+
+-- geo_cell is an implementation detail of the nearby lookup, keep it out of the live event payloads
+CREATE OR REPLACE FUNCTION notify_events()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('events', ((to_jsonb(i) - 'geo_cell') || jsonb_build_object('user_id', d.user_id))::TEXT)
+    FROM inserted i
+    INNER JOIN Devices d ON d.id = i.device_id
+    ORDER BY i.id;
+
+    RETURN NULL;
+END;
+$$;
@@ -0,0 +1,96 @@
+-- Partition maintenance that copes with the rows of the default partition and with databases whose
+-- Events table predates partitioning
+
+CREATE OR REPLACE FUNCTION events_is_partitioned()
+RETURNS BOOLEAN
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'events'::REGCLASS);
+$$;
+
+-- Create the partition of Events holding the snowflake IDs generated during the given month.
+-- Rows of that month already caught by Events_default (e.g. the maintenance job was down for longer
+-- than its lookahead) are moved into the new partition, which is attached afterwards: creating it
+-- with PARTITION OF would fail while the default partition holds rows in its range.
+CREATE OR REPLACE FUNCTION create_events_partition(p_month DATE)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_month TIMESTAMP := date_trunc('month', p_month::TIMESTAMP);
+    v_name TEXT := 'events_' || to_char(v_month, '"y"YYYY"m"MM');
+    v_from BIGINT := snowflake_at(v_month AT TIME ZONE 'UTC');
+    v_to BIGINT := snowflake_at((v_month + INTERVAL '1 month') AT TIME ZONE 'UTC');
+    v_stranded BOOLEAN := FALSE;
+    v_columns TEXT;
+BEGIN
+    IF NOT events_is_partitioned() THEN
+        RETURN;
+    END IF;
+
+    -- serialize concurrent workers creating the same partition
+    PERFORM pg_advisory_xact_lock(hashtext('create_events_partition'));
+
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    IF to_regclass('events_default') IS NOT NULL THEN
+        EXECUTE 'SELECT EXISTS (SELECT 1 FROM Events_default WHERE id >= $1 AND id < $2)'
+        INTO v_stranded
+        USING v_from, v_to;
+    END IF;
+
+    IF NOT v_stranded THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF Events FOR VALUES FROM (%s) TO (%s)',
+            v_name,
+            v_from,
+            v_to
+        );
+        RETURN;
+    END IF;
+
+    -- Generated columns are recomputed on insert and cannot be copied
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum)
+    INTO v_columns
+    FROM pg_attribute
+    WHERE attrelid = 'events'::REGCLASS AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+
+    EXECUTE format('CREATE TABLE %I (LIKE Events INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)', v_name);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM Events_default WHERE id >= %s AND id < %s RETURNING %s) INSERT INTO %I (%s) SELECT %s FROM moved',
+        v_from,
+        v_to,
+        v_columns,
+        v_name,
+        v_columns,
+        v_columns
+    );
+    EXECUTE format(
+        'ALTER TABLE Events ATTACH PARTITION %I FOR VALUES FROM (%s) TO (%s)',
+        v_name,
+        v_from,
+        v_to
+    );
+END;
+$$;
+
+-- Make sure the partitions for the current month and the next p_months_ahead months exist
+CREATE OR REPLACE FUNCTION ensure_events_partitions(p_months_ahead INTEGER)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_month DATE := date_trunc('month', clock_timestamp() AT TIME ZONE 'UTC')::DATE;
+BEGIN
+    IF NOT events_is_partitioned() THEN
+        RETURN;
+    END IF;
+
+    FOR i IN 0..p_months_ahead LOOP
+        PERFORM create_events_partition((v_month + make_interval(months => i))::DATE);
+    END LOOP;
+END;
+$$;
@@ -1,32 +1,19 @@
-CREATE OR REPLACE FUNCTION generate_id()
-RETURNS BIGINT
-LANGUAGE plpgsql
-AS $$
-DECLARE
-    v_epoch_ms BIGINT;
-    v_tail BIGINT;
-    v_id BIGINT;
-BEGIN
-    -- milliseconds since 2020-01-01 00:00:00 UTC
-    v_epoch_ms :=
-        FLOOR(
-            (
-                EXTRACT(EPOCH FROM clock_timestamp())
-                - EXTRACT(EPOCH FROM TIMESTAMP '2020-01-01 00:00:00 UTC')
-            ) * 1000
-        );
+-- IDs are now generated by the server processes (SnowflakeGenerator in server/ids.py), each with a
+-- leased worker ID and 256 IDs per millisecond. The insert functions take the ID as their first
+-- argument, the former overloads are dropped so that no insert falls back to generate_id().
 
-    -- next 12-bit tail value
-    v_tail := nextval('snowflake_id_tail');
+COMMENT ON FUNCTION generate_id() IS
+    'Snowflake ID of worker 0, limited to 256 IDs per millisecond (further IDs in the same millisecond '
+    'collide). Only meant for manual SQL, the server generates its own IDs.';
 
-    -- construct snowflake id: upper 52 bits | lower 12 bits
-    v_id := (v_epoch_ms << 12) | v_tail;
-
-    RETURN v_id;
-END;
-$$;
+DROP FUNCTION IF EXISTS create_user(VARCHAR, BIGINT, VARCHAR);
+DROP FUNCTION IF EXISTS create_device(VARCHAR, VARCHAR, BIGINT);
+DROP FUNCTION IF EXISTS create_event(
+    SMALLINT, REAL, REAL, REAL, REAL, REAL, REAL, SMALLINT, SMALLINT, REAL, REAL, REAL, REAL, REAL, BIGINT
+);
 
-CREATE OR REPLACE FUNCTION create_user(
+CREATE FUNCTION create_user(
+    p_id BIGINT,
     p_username VARCHAR,
     p_discord_channel_id BIGINT,
     p_hashed_password VARCHAR
@@ -42,7 +29,7 @@ AS $$
 BEGIN
     RETURN QUERY
     INSERT INTO Users (id, username, discord_channel_id, hashed_password)
-    VALUES (generate_id(), p_username, p_discord_channel_id, p_hashed_password)
+    VALUES (p_id, p_username, p_discord_channel_id, p_hashed_password)
     RETURNING
         id AS user_id,
         username AS user_username,
@@ -51,7 +38,8 @@ BEGIN
 END;
 $$;
 
-CREATE OR REPLACE FUNCTION create_device(
+CREATE FUNCTION create_device(
+    p_id BIGINT,
     p_name VARCHAR,
     p_hashed_token VARCHAR,
     p_user_id BIGINT
@@ -71,7 +59,7 @@ BEGIN
     RETURN QUERY
     WITH inserted AS (
         INSERT INTO Devices (id, name, hashed_token, user_id)
-        VALUES (generate_id(), p_name, p_hashed_token, p_user_id)
+        VALUES (p_id, p_name, p_hashed_token, p_user_id)
         RETURNING *
     )
     SELECT 
@@ -87,7 +75,8 @@ BEGIN
 END;
 $$;
 
-CREATE OR REPLACE FUNCTION create_event(
+CREATE FUNCTION create_event(
+    p_id BIGINT,
     p_category SMALLINT,
     p_accel_x REAL,
     p_accel_y REAL,
@@ -152,7 +141,7 @@ BEGIN
             device_id
         )
         VALUES (
-            generate_id(),
+            p_id,
             p_category,
             p_accel_x,
             p_accel_y,
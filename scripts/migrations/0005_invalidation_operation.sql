@@ -0,0 +1,11 @@
+-- Tell every server process to drop its cached copy of an updated or deleted row, as
+-- `<table>:<id>:<update|delete>`
+CREATE OR REPLACE FUNCTION notify_invalidation()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('invalidate', lower(TG_TABLE_NAME) || ':' || OLD.id || ':' || lower(TG_OP));
+    RETURN NULL;
+END;
+$$;
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Sequence, TYPE_CHECKING
+
+import numpy as np
+import numpy.typing as npt
+
+from .archive import INT_NULL
+from .category import FALL_DETECTED
+from .config import SNOWFLAKE_EPOCH
+
+
+__all__ = ("ANALYTICS_QUERY", "BinaryCopyDecoder", "parse_binary_copy", "from_archive", "concatenate", "compute_analytics")
+# (column, SQL expression) fetched for analytics. NULLs are replaced with NaN so that every row of the
+# binary COPY output has the same width and can be decoded with a single structured dtype.
+_COLUMNS = (
+    ("id", "id"),
+    ("category", "category"),
+    ("accel_x", "COALESCE(accel_x, 'NaN')"),
+    ("accel_y", "COALESCE(accel_y, 'NaN')"),
+    ("accel_z", "COALESCE(accel_z, 'NaN')"),
+    ("heart_rate_bpm", "COALESCE(heart_rate_bpm::REAL, 'NaN')"),
+    ("spo2", "COALESCE(spo2::REAL, 'NaN')"),
+    ("neo6m_altitude_meter", "COALESCE(neo6m_altitude_meter, 'NaN')"),
+    ("bmp280_altitude_meter", "COALESCE(bmp280_altitude_meter, 'NaN')"),
+)
+ANALYTICS_QUERY = (
+    "SELECT " + ", ".join(expression for _, expression in _COLUMNS) + " FROM Events "
+    "WHERE device_id = $1 AND id > $2 AND id < $3"
+)
+# Each row of PostgreSQL's binary COPY format: a field count, then a length and a big-endian value per field
+_ROW_DTYPE = np.dtype(
+    [("fields", ">i2")]
+    + [
+        field
+        for name, _ in _COLUMNS
+        for field in ((f"{name}_length", ">i4"), (name, ">i8" if name == "id" else ">i2" if name == "category" else ">f4"))
+    ]
+)
+_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+# The signature, then 4 bytes of flags and the 4-byte length of the header extension that follows
+_HEADER_LENGTH = len(_SIGNATURE) + 8
+# A field count of -1
+_TRAILER = b"\xff\xff"
+# Undecoded bytes accumulated before they are decoded into column arrays
+_DECODE_BYTES = 1 << 20
+_DAY_MILLISECONDS = 86_400_000
+# Bin edges of the acceleration magnitude histogram, in g
+ACCEL_MAGNITUDE_EDGES = np.linspace(0.0, 4.0, 41)
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class BinaryCopyDecoder:
+    """Decodes the output of `COPY (ANALYTICS_QUERY) TO STDOUT (FORMAT binary)` into native column arrays as it arrives
+
+    Pass `write` as the `output` of `copy_from_query`: at most about 1 MiB of the stream is held
+    undecoded at a time. `write` raises `OverflowError`, which aborts the COPY, once more than
+    `max_rows` rows were received.
+    """
+
+    __slots__ = (
+        "_header",
+        "_parts",
+        "_pending",
+        "_pending_bytes",
+        "max_rows",
+        "rows",
+    )
+    if TYPE_CHECKING:
+        _header: bool
+        _parts: List[Dict[str, npt.NDArray[Any]]]
+        _pending: List[bytes]
+        _pending_bytes: int
+        max_rows: Optional[int]
+        rows: int
+
+    def __init__(self, *, max_rows: Optional[int] = None) -> None:
+        self._header = False
+        self._parts = []
+        self._pending = []
+        self._pending_bytes = 0
+        self.max_rows = max_rows
+        self.rows = 0
+
+    def _decode(self) -> None:
+        data = b"".join(self._pending)
+        if not self._header:
+            if len(data) < _HEADER_LENGTH:
+                self._pending = [data]
+                return
+
+            if not data.startswith(_SIGNATURE):
+                raise ValueError("Not a PostgreSQL binary COPY stream")
+
+            end = _HEADER_LENGTH + int.from_bytes(data[_HEADER_LENGTH - 4:_HEADER_LENGTH], "big")
+            if len(data) < end:
+                self._pending = [data]
+                return
+
+            data = data[end:]
+            self._header = True
+
+        # Every value has a fixed width (NULLs are NaN), so whole rows can be decoded in bulk
+        count = len(data) // _ROW_DTYPE.itemsize
+        rows = np.frombuffer(data, dtype=_ROW_DTYPE, count=count)
+        self._parts.append({name: rows[name].astype(rows[name].dtype.newbyteorder("=")) for name, _ in _COLUMNS})
+        self.rows += count
+
+        rest = data[count * _ROW_DTYPE.itemsize:]
+        self._pending = [rest]
+        self._pending_bytes = len(rest)
+
+    def feed(self, data: bytes) -> None:
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        if self._pending_bytes >= _DECODE_BYTES:
+            self._decode()
+
+        if self.max_rows is not None and self.rows + self._pending_bytes // _ROW_DTYPE.itemsize > self.max_rows:
+            raise OverflowError(f"More than {self.max_rows} rows")
+
+    async def write(self, data: bytes) -> None:
+        self.feed(data)
+
+    def finish(self) -> Dict[str, npt.NDArray[Any]]:
+        """The decoded columns, once the whole stream was fed"""
+        self._decode()
+        if not self._header or self._pending != [_TRAILER]:
+            raise ValueError("Truncated PostgreSQL binary COPY stream")
+
+        return concatenate(self._parts)
+
+
+def parse_binary_copy(data: bytes) -> Dict[str, npt.NDArray[Any]]:
+    """Decode the output of `COPY (ANALYTICS_QUERY) TO STDOUT (FORMAT binary)` into native column arrays"""
+    decoder = BinaryCopyDecoder()
+    decoder.feed(data)
+    return decoder.finish()
+
+
+def from_archive(columns: Dict[str, npt.NDArray[Any]]) -> Dict[str, npt.NDArray[Any]]:
+    """Convert a slice of `EventArchive` columns to the layout of `parse_binary_copy`"""
+    converted: Dict[str, npt.NDArray[Any]] = {}
+    for name, _ in _COLUMNS:
+        column = columns[name]
+        if name == "heart_rate_bpm" or name == "spo2":
+            column = np.where(column == INT_NULL, np.float32(np.nan), column.astype(np.float32))
+
+        converted[name] = np.asarray(column)
+
+    return converted
+
+
+def concatenate(parts: Sequence[Dict[str, npt.NDArray[Any]]]) -> Dict[str, npt.NDArray[Any]]:
+    if len(parts) == 1:
+        return parts[0]
+
+    return {name: np.concatenate([part[name] for part in parts]) for name, _ in _COLUMNS}
+
+
+def _distribution(values: npt.NDArray[Any]) -> Dict[str, Any]:
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {"count": 0, "mean": None, "min": None, "max": None, **{f"p{q}": None for q in PERCENTILES}}
+
+    percentiles = np.percentile(values, PERCENTILES)
+    return {
+        "count": len(values),
+        "mean": float(values.mean(dtype=np.float64)),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        **{f"p{q}": float(value) for q, value in zip(PERCENTILES, percentiles)},
+    }
+
+
+def _daily(milliseconds: npt.NDArray[np.int64], falls: npt.NDArray[np.bool_]) -> List[Dict[str, Any]]:
+    if len(milliseconds) == 0:
+        return []
+
+    # The snowflake epoch is a UTC midnight, so days are UTC days
+    days = milliseconds // _DAY_MILLISECONDS
+    first = int(days.min())
+    offsets = days - first
+    events = np.bincount(offsets)
+    fall_counts = np.bincount(offsets, weights=falls, minlength=len(events)).astype(np.int64)
+    return [
+        {
+            "day": (SNOWFLAKE_EPOCH + timedelta(days=first + offset)).date(),
+            "event_count": int(events[offset]),
+            "fall_count": int(fall_counts[offset]),
+        }
+        for offset in np.flatnonzero(events).tolist()
+    ]
+
+
+def _altitude_drift(milliseconds: npt.NDArray[np.int64], barometric: npt.NDArray[Any], gps: npt.NDArray[Any]) -> Dict[str, Any]:
+    valid = ~(np.isnan(barometric) | np.isnan(gps))
+    difference = (barometric[valid] - gps[valid]).astype(np.float64)
+    result = _distribution(difference)
+
+    # Least-squares slope of the difference over time: how fast the barometer drifts away from the GPS
+    slope: Optional[float] = None
+    if len(difference) > 1:
+        days = (milliseconds[valid] - milliseconds[valid].min()) / _DAY_MILLISECONDS
+        days -= days.mean()
+        variance = float(np.dot(days, days))
+        if variance > 0:
+            slope = float(np.dot(days, difference - difference.mean()) / variance)
+
+    result["slope_meters_per_day"] = slope
+    return result
+
+
+def compute_analytics(columns: Dict[str, npt.NDArray[Any]]) -> Dict[str, Any]:
+    """Compute the statistics of `DeviceAnalytics` from column arrays, releasing the GIL in NumPy for most of the work"""
+    milliseconds = columns["id"] >> 12
+    magnitude = np.sqrt(
+        np.square(columns["accel_x"], dtype=np.float32)
+        + np.square(columns["accel_y"], dtype=np.float32)
+        + np.square(columns["accel_z"], dtype=np.float32)
+    )
+    finite = magnitude[~np.isnan(magnitude)]
+    counts, _ = np.histogram(np.minimum(finite, ACCEL_MAGNITUDE_EDGES[-1]), bins=ACCEL_MAGNITUDE_EDGES)
+
+    return {
+        "event_count": len(milliseconds),
+        "daily": _daily(milliseconds, columns["category"] == FALL_DETECTED),
+        "heart_rate_bpm": _distribution(columns["heart_rate_bpm"]),
+        "spo2": _distribution(columns["spo2"]),
+        "accel_magnitude": _distribution(magnitude),
+        "accel_magnitude_histogram": {
+            "edges": ACCEL_MAGNITUDE_EDGES.tolist(),
+            "counts": counts.tolist(),
+        },
+        "altitude_drift": _altitude_drift(milliseconds, columns["bmp280_altitude_meter"], columns["neo6m_altitude_meter"]),
+    }
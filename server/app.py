@@ -6,6 +6,7 @@ from typing import AsyncIterator
 from fastapi import FastAPI
 
 from .config import ROOT
+from .metrics import MetricsMiddleware
 from .routes import devices_router, events_router, root_router, users_router
 from .state import STATE
 
@@ -29,6 +30,7 @@ app = FastAPI(
     version="0.0.1",
     lifespan=_lifespan,
 )
+app.add_middleware(MetricsMiddleware)
 app.include_router(devices_router)
 app.include_router(events_router)
 app.include_router(root_router)
@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import shutil
+import traceback
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+import numpy.typing as npt
+
+from .cache import LRUCache
+from .config import SNOWFLAKE_EPOCH
+from .database import DatabaseConnector
+
+
+__all__ = ("EventArchive", "EventArchiver")
+# Column layout of the archive files, in the order of the Events table
+COLUMN_DTYPES: Dict[str, npt.DTypeLike] = {
+    "id": np.int64,
+    "category": np.int16,
+    "accel_x": np.float32,
+    "accel_y": np.float32,
+    "accel_z": np.float32,
+    "gyro_x": np.float32,
+    "gyro_y": np.float32,
+    "gyro_z": np.float32,
+    "heart_rate_bpm": np.int16,
+    "spo2": np.int16,
+    "latitude": np.float32,
+    "longitude": np.float32,
+    "neo6m_altitude_meter": np.float32,
+    "pressure_pa": np.float32,
+    "bmp280_altitude_meter": np.float32,
+}
+# NULL is stored as NaN in float columns and as this value in integer columns
+INT_NULL = np.iinfo(np.int16).min
+# Arbitrary key of the advisory lock held by the archiver that is running
+_LOCK_KEY = 0x61726368697665
+# The columns of an archived month ordered by device, NULLs already replaced as stored in the archive
+_ARCHIVE_QUERY = (
+    "SELECT device_id, "
+    + ", ".join(
+        name if name == "id" or name == "category"
+        else f"COALESCE({name}, 'NaN')" if np.issubdtype(dtype, np.floating)
+        else f"COALESCE({name}, {INT_NULL})"
+        for name, dtype in COLUMN_DTYPES.items()
+    )
+    + " FROM Events WHERE id >= $1 AND id < $2 AND device_id IS NOT NULL ORDER BY device_id, id"
+)
+_ARCHIVE_BATCH_ROWS = 10000
+
+
+def _month_id(month: datetime) -> int:
+    """The smallest snowflake ID generated in the given month"""
+    return (month - SNOWFLAKE_EPOCH) // timedelta(milliseconds=1) << 12
+
+
+def _next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def _month_of(id: int) -> datetime:
+    time = SNOWFLAKE_EPOCH + timedelta(milliseconds=id >> 12)
+    return datetime(time.year, time.month, 1, tzinfo=timezone.utc)
+
+
+def _to_rows(columns: Dict[str, npt.NDArray[Any]], start: int, end: int) -> List[Dict[str, Any]]:
+    values: List[List[Any]] = []
+    for name, dtype in COLUMN_DTYPES.items():
+        column = columns[name][start:end]
+        if np.issubdtype(dtype, np.floating):
+            null = np.isnan(column)
+        elif name == "id" or name == "category":
+            null = None
+        else:
+            null = column == INT_NULL
+
+        items = column.tolist()
+        if null is not None and null.any():
+            for index in np.flatnonzero(null).tolist():
+                items[index] = None
+
+        values.append(items)
+
+    names = list(COLUMN_DTYPES)
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+class EventArchive:
+    """Columnar archive of old events, one directory per device and month
+
+    `<directory>/<device ID>/<YYYY-MM>/<column>.npy` holds one column of the archived events of a
+    device in a month, sorted by ID. Files are opened memory-mapped and the ID column is searched
+    with a bisection, so a query only pages in the rows it returns.
+    """
+
+    __slots__ = ("_opened", "directory")
+    if TYPE_CHECKING:
+        _opened: LRUCache[Path, Dict[str, npt.NDArray[Any]]]
+        directory: Path
+
+    def __init__(self, *, directory: Path) -> None:
+        # Rewritten months are replaced with a rename, an open memory map keeps reading the old files
+        # until it expires
+        self._opened = LRUCache(capacity=256, ttl=60)
+        self.directory = directory
+
+    def _months(self, device_id: int) -> List[Tuple[Path, int, int]]:
+        """The archived months of a device as `(path, lowest ID, highest ID + 1)`, oldest first"""
+        try:
+            names = sorted(entry.name for entry in os.scandir(self.directory / str(device_id)) if entry.is_dir())
+        except FileNotFoundError:
+            return []
+
+        months: List[Tuple[Path, int, int]] = []
+        for name in names:
+            try:
+                month = datetime.strptime(name, "%Y-%m").replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue  # Directories of writes in progress
+
+            months.append((self.directory / str(device_id) / name, _month_id(month), _month_id(_next_month(month))))
+
+        return months
+
+    def _open(self, path: Path) -> Dict[str, npt.NDArray[Any]]:
+        columns = self._opened.get(path)
+        if columns is None:
+            columns = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in COLUMN_DTYPES}
+            self._opened.set(path, columns)
+
+        return columns
+
+    def watermark(self, device_id: int) -> int:
+        """An exclusive upper bound of the archived IDs of a device, 0 when nothing is archived"""
+        months = self._months(device_id)
+        return months[-1][2] if len(months) > 0 else 0
+
+    def read(self, device_id: int, *, lower: int, upper: int, limit: int, descending: bool) -> List[Dict[str, Any]]:
+        """Read at most `limit` archived events with `lower < id < upper`, from either end of the range"""
+        months = [month for month in self._months(device_id) if month[2] > lower + 1 and month[1] < upper]
+        if descending:
+            months.reverse()
+
+        rows: List[Dict[str, Any]] = []
+        for path, _, _ in months:
+            columns = self._open(path)
+            ids = columns["id"]
+            start = int(np.searchsorted(ids, lower, side="right"))
+            end = int(np.searchsorted(ids, upper, side="left"))
+            if descending:
+                chunk = _to_rows(columns, max(start, end - (limit - len(rows))), end)
+                chunk.reverse()
+            else:
+                chunk = _to_rows(columns, start, min(end, start + limit - len(rows)))
+
+            rows.extend(chunk)
+            if len(rows) >= limit:
+                break
+
+        return rows
+
+    def slices(self, device_id: int, *, lower: int, upper: int) -> Iterator[Dict[str, npt.NDArray[Any]]]:
+        """Iterate over the archived columns with `lower < id < upper`, one memory-mapped slice per month, oldest first"""
+        for path, low, high in self._months(device_id):
+            if high <= lower + 1 or low >= upper:
+                continue
+
+            columns = self._open(path)
+            ids = columns["id"]
+            start = int(np.searchsorted(ids, lower, side="right"))
+            end = int(np.searchsorted(ids, upper, side="left"))
+            if start < end:
+                yield {name: column[start:end] for name, column in columns.items()}
+
+    def iterate(self, device_id: int, *, lower: int, upper: int, chunk_rows: int) -> Iterator[List[Dict[str, Any]]]:
+        """Iterate over the archived events with `lower < id < upper`, oldest first, in chunks"""
+        for columns in self.slices(device_id, lower=lower, upper=upper):
+            for offset in range(0, len(columns["id"]), chunk_rows):
+                yield _to_rows(columns, offset, offset + chunk_rows)
+
+    def devices(self) -> List[int]:
+        """The IDs of the devices with archived events"""
+        try:
+            return [int(entry.name) for entry in os.scandir(self.directory) if entry.is_dir() and entry.name.isdigit()]
+        except FileNotFoundError:
+            return []
+
+    def remove(self, device_id: int) -> None:
+        """Delete every archived month of a device"""
+        shutil.rmtree(self.directory / str(device_id), ignore_errors=True)
+
+    def write(self, device_id: int, month: datetime, columns: Dict[str, npt.NDArray[Any]]) -> None:
+        """Atomically write (or replace) the archive of a device for a month"""
+        final = self.directory / str(device_id) / month.strftime("%Y-%m")
+        staging = final.with_name(f"{final.name}.tmp-{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        for name, dtype in COLUMN_DTYPES.items():
+            np.save(staging / f"{name}.npy", np.ascontiguousarray(columns[name], dtype=dtype))
+
+        if final.exists():
+            previous = final.with_name(f"{final.name}.old-{os.getpid()}")
+            os.replace(final, previous)
+            os.replace(staging, final)
+            shutil.rmtree(previous, ignore_errors=True)
+        else:
+            os.replace(staging, final)
+
+        self._opened.pop(final)
+
+
+class EventArchiver:
+    """Background job moving whole months of events older than `after_days` into an `EventArchive`
+
+    A month is written for every device first, then removed from `Events` (by dropping its
+    partition when it has one). Rerunning an interrupted month rewrites the same files. Every run
+    also deletes the archives of the devices that no longer exist, in case a deletion notification
+    was missed (see `ApplicationState._on_invalidation`).
+    """
+
+    __slots__ = (
+        "_task",
+        "archive",
+        "database",
+        "interval",
+        "after_days",
+    )
+    if TYPE_CHECKING:
+        _task: Optional[asyncio.Task[None]]
+        archive: EventArchive
+        database: DatabaseConnector
+        interval: float
+        after_days: int
+
+    def __init__(self, *, archive: EventArchive, database: DatabaseConnector, interval: float, after_days: int) -> None:
+        self._task = None
+        self.archive = archive
+        self.database = database
+        self.interval = interval
+        self.after_days = after_days
+
+    async def run_once(self) -> List[datetime]:
+        """Archive every month that ended more than `after_days` ago, returning the archived months"""
+        pool = await self.database.get_pool()
+        if pool is None:
+            return []
+
+        cutoff = _month_of(_month_id(datetime.now(timezone.utc) - timedelta(days=self.after_days)))
+        archived: List[datetime] = []
+        async with pool.acquire() as conn:
+            # Only one process archives at a time, the others skip this round
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", _LOCK_KEY):
+                return []
+
+            try:
+                oldest = await conn.fetchval("SELECT MIN(id) FROM Events")
+                month = None if oldest is None else _month_of(oldest)
+                while month is not None and month < cutoff:
+                    await self._archive_month(conn, month)
+                    archived.append(month)
+                    month = _next_month(month)
+
+                await self._remove_deleted_devices(conn)
+
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
+
+        return archived
+
+    async def _remove_deleted_devices(self, conn: Any) -> None:
+        archived = await asyncio.to_thread(self.archive.devices)
+        if len(archived) == 0:
+            return
+
+        rows = await conn.fetch("SELECT id FROM Devices WHERE id = ANY($1::BIGINT[])", archived)
+        existing = {row["id"] for row in rows}
+        for device_id in archived:
+            if device_id not in existing:
+                await asyncio.to_thread(self.archive.remove, device_id)
+
+    async def _archive_month(self, conn: Any, month: datetime) -> None:
+        lower, upper = _month_id(month), _month_id(_next_month(month))
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            # Same snapshot as the cursor below, so each device's columns can be allocated at their final size
+            rows = await conn.fetch(
+                "SELECT device_id, COUNT(*) AS count FROM Events "
+                "WHERE id >= $1 AND id < $2 AND device_id IS NOT NULL GROUP BY device_id",
+                lower,
+                upper,
+            )
+            counts = {row["device_id"]: row["count"] for row in rows}
+
+            device_id: Optional[int] = None
+            columns: Dict[str, npt.NDArray[Any]] = {}
+            filled = 0
+            cursor = await conn.cursor(_ARCHIVE_QUERY, lower, upper)
+            while True:
+                records = await cursor.fetch(_ARCHIVE_BATCH_ROWS)
+                if len(records) == 0:
+                    break
+
+                start = 0
+                while start < len(records):
+                    if device_id is None:
+                        device_id = records[start][0]
+                        columns = {name: np.empty(counts[device_id], dtype=dtype) for name, dtype in COLUMN_DTYPES.items()}
+                        filled = 0
+
+                    # Rows are ordered by device, the next `take` rows all belong to this one
+                    take = min(counts[device_id] - filled, len(records) - start)
+                    batch = records[start:start + take]
+                    for index, column in enumerate(columns.values(), start=1):
+                        column[filled:filled + take] = [record[index] for record in batch]
+
+                    filled += take
+                    start += take
+                    if filled == counts[device_id]:
+                        await asyncio.to_thread(self.archive.write, device_id, month, columns)
+                        device_id = None
+
+        partition = f"events_y{month.year:04d}m{month.month:02d}"
+        async with conn.transaction():
+            if await conn.fetchval("SELECT to_regclass($1)", partition) is not None:
+                await conn.execute(f"DROP TABLE {partition}")
+
+            await conn.execute("DELETE FROM Events WHERE id >= $1 AND id < $2", lower, upper)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                traceback.print_exc()
+
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
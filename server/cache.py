@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Optional, Tuple, TypeVar, TYPE_CHECKING
+
+
+__all__ = ("LRUCache",)
+_KT = TypeVar("_KT")
+_VT = TypeVar("_VT")
+
+
+class LRUCache(Generic[_KT, _VT]):
+    """A bounded least-recently-used cache whose entries also expire after a time-to-live"""
+
+    __slots__ = (
+        "_entries",
+        "capacity",
+        "ttl",
+        "hits",
+        "misses",
+    )
+    if TYPE_CHECKING:
+        _entries: OrderedDict[_KT, Tuple[float, _VT]]
+        capacity: int
+        ttl: float
+        hits: int
+        misses: int
+
+    def __init__(self, *, capacity: int, ttl: float) -> None:
+        self._entries = OrderedDict()
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: _KT) -> Optional[_VT]:
+        try:
+            expire_at, value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        if expire_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: _KT, value: _VT, *, ttl: Optional[float] = None) -> None:
+        if self.capacity <= 0:
+            return
+
+        expire_at = time.monotonic() + (self.ttl if ttl is None else min(ttl, self.ttl))
+        self._entries[key] = (expire_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: _KT) -> Optional[_VT]:
+        entry = self._entries.pop(key, None)
+        return None if entry is None else entry[1]
+
+    def discard_if(self, predicate: Callable[[_KT, _VT], bool]) -> None:
+        for key in [key for key, (_, value) in self._entries.items() if predicate(key, value)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
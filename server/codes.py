@@ -6,3 +6,6 @@ INCORRECT_CREDENTIALS = 102
 DEVICE_NOT_FOUND = 200
 INVALID_DISCORD_USER_ID = 300
 DISCORD_API_ERROR = 301
+ANALYTICS_WINDOW_TOO_LARGE = 400
+ANALYTICS_TOO_MANY_EVENTS = 401
+ANALYTICS_INVALID_WINDOW = 402
@@ -0,0 +1,20 @@
+# Columns of the Events table, in the order of `EventReading` after the ID
+EVENT_COLUMNS = (
+    "id",
+    "category",
+    "accel_x",
+    "accel_y",
+    "accel_z",
+    "gyro_x",
+    "gyro_y",
+    "gyro_z",
+    "heart_rate_bpm",
+    "spo2",
+    "latitude",
+    "longitude",
+    "neo6m_altitude_meter",
+    "pressure_pa",
+    "bmp280_altitude_meter",
+)
+# Layout of the records written to Events with COPY
+EVENT_COPY_COLUMNS = (*EVENT_COLUMNS, "device_id")
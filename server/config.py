@@ -3,6 +3,7 @@ from __future__ import annotations
 import os
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Literal
 
 from yarl import URL
 
@@ -12,12 +13,68 @@ __all__ = ()
 
 ROOT = Path(__file__).parent.parent.resolve()
 SNOWFLAKE_EPOCH = datetime(2020, 1, 1, 0, 0, 0, 0, tzinfo=timezone.utc)
+# In [1, 15] (0 is used by the database). When unset, a free worker ID is leased from PostgreSQL at startup.
+# Either way, startup fails if another running server process holds the same worker ID.
+SNOWFLAKE_WORKER_ID = int(os.environ["SNOWFLAKE_WORKER_ID"]) if "SNOWFLAKE_WORKER_ID" in os.environ else None
 JWT_SECRET_KEY = ROOT.joinpath("secrets", "jwt.pem").read_text(encoding="utf-8")
 JWT_EXPIRATION_SECONDS = 900
-DISCORD_API_URL = URL("https://discord.com/api/v10")
+# Bearer token required by `/api/statistics` and `/api/metrics`, which are disabled (404) when unset
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN") or None
+DISCORD_API_URL = URL(os.getenv("DISCORD_API_URL", "https://discord.com/api/v10"))
 
 POSTGRES_DB = os.getenv("POSTGRES_DB", "default")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "postgres")
 POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "password")
+POSTGRES_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "2"))
+POSTGRES_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "20"))
+POSTGRES_STATEMENT_CACHE_SIZE = int(os.getenv("POSTGRES_STATEMENT_CACHE_SIZE", "100"))
+# Seconds after which an idle pooled connection is closed (asyncpg's `max_inactive_connection_lifetime`).
+# This is an idle timeout only: connections in regular use are kept open indefinitely.
+POSTGRES_CONNECTION_IDLE_TIMEOUT = float(os.getenv("POSTGRES_CONNECTION_IDLE_TIMEOUT", "300"))
+# Comma-separated `host[:port]` of streaming replicas serving read-only queries
+POSTGRES_REPLICA_HOSTS = [host.strip() for host in os.getenv("POSTGRES_REPLICA_HOSTS", "").split(",") if host.strip()]
+POSTGRES_REPLICA_HEALTH_CHECK_INTERVAL = float(os.getenv("POSTGRES_REPLICA_HEALTH_CHECK_INTERVAL", "5"))
+POSTGRES_REPLICA_MAX_LAG_SECONDS = float(os.getenv("POSTGRES_REPLICA_MAX_LAG_SECONDS", "10"))
+# When disabled, migrations must be applied with `python -m server.migrations apply` before starting
+POSTGRES_MIGRATE_ON_STARTUP = os.getenv("POSTGRES_MIGRATE_ON_STARTUP", "1") == "1"
 DISCORD_BOT_TOKEN = os.environ["DISCORD_BOT_TOKEN"]
+DISCORD_NOTIFIER_WORKERS = int(os.getenv("DISCORD_NOTIFIER_WORKERS", "4"))
+DISCORD_NOTIFIER_MAX_RETRIES = int(os.getenv("DISCORD_NOTIFIER_MAX_RETRIES", "5"))
+
+EVENTS_PARTITION_MONTHS_AHEAD = int(os.getenv("EVENTS_PARTITION_MONTHS_AHEAD", "2"))
+EVENTS_PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("EVENTS_PARTITION_MAINTENANCE_INTERVAL", "3600"))
+EVENTS_RETENTION_DAYS = int(os.getenv("EVENTS_RETENTION_DAYS", "0"))  # 0 keeps events forever
+EVENTS_RETENTION_MODE: Literal["drop", "detach"] = "detach" if os.getenv("EVENTS_RETENTION_MODE", "drop") == "detach" else "drop"
+# Whole months older than this are moved out of Events into columnar files, 0 keeps every event in Postgres
+EVENTS_ARCHIVE_AFTER_DAYS = int(os.getenv("EVENTS_ARCHIVE_AFTER_DAYS", "0"))
+EVENTS_ARCHIVE_DIRECTORY = Path(os.getenv("EVENTS_ARCHIVE_DIRECTORY", str(ROOT / "archive")))
+EVENTS_ARCHIVE_INTERVAL = float(os.getenv("EVENTS_ARCHIVE_INTERVAL", "3600"))
+# Bounds of a device analytics request, larger ones are rejected. The decoded columns take 38 bytes per event.
+ANALYTICS_MAX_WINDOW_DAYS = float(os.getenv("ANALYTICS_MAX_WINDOW_DAYS", "366"))
+ANALYTICS_MAX_EVENTS = int(os.getenv("ANALYTICS_MAX_EVENTS", "5000000"))
+
+FALL_DETECTION_ENABLED = os.getenv("FALL_DETECTION_ENABLED", "0") == "1"
+FALL_DETECTION_FREE_FALL_G = float(os.getenv("FALL_DETECTION_FREE_FALL_G", "0.1"))
+FALL_DETECTION_IMPACT_G = float(os.getenv("FALL_DETECTION_IMPACT_G", "-1.0"))
+FALL_DETECTION_WINDOW_SECONDS = float(os.getenv("FALL_DETECTION_WINDOW_SECONDS", "2.0"))
+FALL_DETECTION_BUFFER_SIZE = int(os.getenv("FALL_DETECTION_BUFFER_SIZE", "64"))
+FALL_DETECTION_INTERVAL = float(os.getenv("FALL_DETECTION_INTERVAL", "0.1"))
+
+INGEST_BUFFER_ENABLED = os.getenv("INGEST_BUFFER_ENABLED", "0") == "1"
+INGEST_BUFFER_MAX_DELAY = float(os.getenv("INGEST_BUFFER_MAX_DELAY", "0.005"))
+INGEST_BUFFER_MAX_ROWS = int(os.getenv("INGEST_BUFFER_MAX_ROWS", "500"))
+
+DATABASE_LISTENER_RECONNECT_DELAY = float(os.getenv("DATABASE_LISTENER_RECONNECT_DELAY", "5"))
+LIVE_EVENTS_QUEUE_SIZE = int(os.getenv("LIVE_EVENTS_QUEUE_SIZE", "100"))
+LIVE_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("LIVE_EVENTS_HEARTBEAT_SECONDS", "15"))
+
+HASHER_EXECUTOR: Literal["thread", "process"] = "process" if os.getenv("HASHER_EXECUTOR", "thread") == "process" else "thread"
+HASHER_WORKERS = int(os.getenv("HASHER_WORKERS", str(os.cpu_count() or 1)))
+HASHER_MAX_PENDING = int(os.getenv("HASHER_MAX_PENDING", str(4 * HASHER_WORKERS)))
+
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "10000"))
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "300"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+DEVICE_TOKEN_CACHE_SIZE = int(os.getenv("DEVICE_TOKEN_CACHE_SIZE", "10000"))
+DEVICE_TOKEN_CACHE_TTL = float(os.getenv("DEVICE_TOKEN_CACHE_TTL", "300"))
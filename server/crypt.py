@@ -1,14 +1,14 @@
 from __future__ import annotations
 
 import time
-from typing import Optional
+from typing import Optional, Tuple
 
 import jwt
 
 from .config import JWT_EXPIRATION_SECONDS, JWT_SECRET_KEY
 
 
-__all__ = ("encode_jwt", "decode_jwt")
+__all__ = ("encode_jwt", "decode_jwt", "decode_jwt_claims")
 
 
 def encode_jwt(body: str) -> str:
@@ -26,3 +26,12 @@ def decode_jwt(token: str) -> Optional[str]:
         return payload["sub"]
     except jwt.PyJWTError:
         return None
+
+
+def decode_jwt_claims(token: str) -> Optional[Tuple[str, int]]:
+    """Decode a token into its subject and expiration time (seconds since the Unix epoch)"""
+    try:
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=["ES256"])
+        return payload["sub"], payload["exp"]
+    except (jwt.PyJWTError, KeyError):
+        return None
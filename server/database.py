@@ -1,44 +1,253 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import contextvars
+import time
 import traceback
-from typing import Optional, TYPE_CHECKING
+from types import TracebackType
+from typing import Any, Iterator, List, Optional, Sequence, Type, TYPE_CHECKING
 
 import asyncpg  # type: ignore  # asyncpg does not provide type stubs
 
-from .config import ROOT
+from .metrics import DATABASE_QUERY_SECONDS
+from .migrations import current_version, latest_version, migrate
 
 
-__all__ = ("DatabaseConnector",)
+__all__ = ("DatabaseConnector", "InstrumentedPool")
+# Set by `DatabaseConnector.read_your_writes()` to send read-only queries to the primary
+_PRIMARY_ONLY: contextvars.ContextVar[bool] = contextvars.ContextVar("_PRIMARY_ONLY", default=False)
+# Statement keywords used as the `operation` label of the query histogram, anything else is "other"
+_OPERATIONS = frozenset(("select", "insert", "update", "delete", "copy", "declare", "fetch", "begin", "commit", "rollback"))
+
+
+class _TimedAcquire:
+
+    __slots__ = ("_pool", "_timeout", "_connection")
+    if TYPE_CHECKING:
+        _pool: InstrumentedPool
+        _timeout: Optional[float]
+        _connection: Optional[asyncpg.Connection]
+
+    def __init__(self, pool: InstrumentedPool, timeout: Optional[float]) -> None:
+        self._pool = pool
+        self._timeout = timeout
+        self._connection = None
+
+    async def __aenter__(self) -> asyncpg.Connection:
+        started = time.perf_counter()
+        self._connection = await self._pool.pool.acquire(timeout=self._timeout)
+        wait = time.perf_counter() - started
+
+        self._pool.acquires += 1
+        self._pool.acquire_wait_seconds += wait
+        self._pool.max_acquire_wait_seconds = max(self._pool.max_acquire_wait_seconds, wait)
+        return self._connection
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        connection = self._connection
+        self._connection = None
+        if connection is not None:
+            await self._pool.pool.release(connection)
+
+
+class InstrumentedPool:
+    """Wraps an `asyncpg.Pool`, recording how long `acquire()` waits for a free connection
+
+    Everything other than `acquire()` is forwarded to the wrapped pool.
+    """
+
+    __slots__ = (
+        "pool",
+        "acquires",
+        "acquire_wait_seconds",
+        "max_acquire_wait_seconds",
+        "queries",
+    )
+    if TYPE_CHECKING:
+        pool: asyncpg.Pool
+        acquires: int
+        acquire_wait_seconds: float
+        max_acquire_wait_seconds: float
+        queries: int
+
+    def __init__(self) -> None:
+        self.acquires = 0
+        self.acquire_wait_seconds = 0.0
+        self.max_acquire_wait_seconds = 0.0
+        self.queries = 0
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "pool":
+            # Not assigned yet, do not recurse into ourselves
+            raise AttributeError(name)
+
+        return getattr(self.pool, name)
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _TimedAcquire:
+        return _TimedAcquire(self, timeout)
+
+    def _on_query(self, record: Any) -> None:
+        self.queries += 1
+        words = record.query[:16].split(None, 1)
+        keyword = words[0].lower() if words else ""
+        DATABASE_QUERY_SECONDS.observe(record.elapsed, keyword if keyword in _OPERATIONS else "other")
+
+    async def _init_connection(self, connection: asyncpg.Connection) -> None:
+        connection.add_query_logger(self._on_query)
+
+
+class _Replica:
+
+    __slots__ = ("host", "port", "pool", "healthy")
+    if TYPE_CHECKING:
+        host: str
+        port: Optional[int]
+        pool: Optional[InstrumentedPool]
+        healthy: bool
+
+    def __init__(self, address: str) -> None:
+        host, _, port = address.partition(":")
+        self.host = host
+        self.port = int(port) if port else None
+        self.pool = None
+        self.healthy = False
 
 
 class DatabaseConnector:
 
     __slots__ = (
         "_pool",
+        "_replicas",
+        "_replica_index",
+        "_health_task",
         "_lifecycle_lock",
         "_database",
         "_host",
         "_user",
         "_password",
+        "min_size",
+        "max_size",
+        "statement_cache_size",
+        "max_inactive_connection_lifetime",
+        "migrate",
+        "replica_health_check_interval",
+        "replica_max_lag_seconds",
     )
     if TYPE_CHECKING:
-        _pool: Optional[asyncpg.Pool]
+        _pool: Optional[InstrumentedPool]
+        _replicas: List[_Replica]
+        _replica_index: int
+        _health_task: Optional[asyncio.Task[None]]
         _lifecycle_lock: asyncio.Lock
         _database: str
         _host: str
         _user: str
         _password: str
+        min_size: int
+        max_size: int
+        statement_cache_size: int
+        max_inactive_connection_lifetime: float
+        migrate: bool
+        replica_health_check_interval: float
+        replica_max_lag_seconds: float
 
-    def __init__(self, *, database: str, host: str, user: str, password: str) -> None:
+    def __init__(
+        self,
+        *,
+        database: str,
+        host: str,
+        user: str,
+        password: str,
+        min_size: int = 2,
+        max_size: int = 20,
+        statement_cache_size: int = 100,
+        max_inactive_connection_lifetime: float = 300.0,
+        migrate: bool = True,
+        replica_hosts: Sequence[str] = (),
+        replica_health_check_interval: float = 5.0,
+        replica_max_lag_seconds: float = 10.0,
+    ) -> None:
         self._pool = None
+        self._replicas = [_Replica(address) for address in replica_hosts]
+        self._replica_index = 0
+        self._health_task = None
         self._lifecycle_lock = asyncio.Lock()
         self._database = database
         self._host = host
         self._user = user
         self._password = password
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.max_inactive_connection_lifetime = max_inactive_connection_lifetime
+        self.migrate = migrate
+        self.replica_health_check_interval = replica_health_check_interval
+        self.replica_max_lag_seconds = replica_max_lag_seconds
+
+    @property
+    def pool(self) -> Optional[InstrumentedPool]:
+        """The pool if it has been initialized, without trying to create it"""
+        return self._pool
+
+    async def _create_pool(self, *, host: str, port: Optional[int] = None) -> InstrumentedPool:
+        pool = InstrumentedPool()
+        pool.pool = await asyncpg.create_pool(
+            database=self._database,
+            host=host,
+            port=port,
+            user=self._user,
+            password=self._password,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=self.statement_cache_size,
+            max_inactive_connection_lifetime=self.max_inactive_connection_lifetime,
+            init=pool._init_connection,
+        )
+        return pool
+
+    @staticmethod
+    @contextlib.contextmanager
+    def read_your_writes() -> Iterator[None]:
+        """Send the read-only queries issued within this block (and the tasks it spawns) to the primary,
+        so that they observe every write committed before"""
+        token = _PRIMARY_ONLY.set(True)
+        try:
+            yield
+        finally:
+            _PRIMARY_ONLY.reset(token)
+
+    def _pick_replica(self) -> Optional[InstrumentedPool]:
+        count = len(self._replicas)
+        for offset in range(count):
+            index = (self._replica_index + offset) % count
+            replica = self._replicas[index]
+            if replica.healthy and replica.pool is not None:
+                self._replica_index = (index + 1) % count
+                return replica.pool
+
+        return None
+
+    async def get_pool(self, *, readonly: bool = False) -> Optional[InstrumentedPool]:
+        """Get the primary pool, or with `readonly`, the pool of a healthy replica if there is one
+
+        Replicas may lag behind the primary by up to `replica_max_lag_seconds`, see `read_your_writes()`.
+        """
+        if readonly and not _PRIMARY_ONLY.get():
+            replica = self._pick_replica()
+            if replica is not None:
+                return replica
+
+        # Fast path: once initialized, the pool is only replaced under the lock by close()
+        pool = self._pool
+        if pool is not None:
+            return pool
 
-    async def get_pool(self) -> Optional[asyncpg.Pool]:
         try:
             await asyncio.wait_for(self._lifecycle_lock.acquire(), timeout=3)
         except asyncio.TimeoutError:
@@ -48,30 +257,96 @@ class DatabaseConnector:
             if self._pool is not None:
                 return self._pool
 
-            self._pool = pool = await asyncpg.create_pool(
-                database=self._database,
-                host=self._host,
-                user=self._user,
-                password=self._password,
-            )
+            pool = await self._create_pool(host=self._host)
+            try:
+                async with pool.acquire() as conn:
+                    # Usually a single query, DDL only runs (under a lock) when the schema is behind
+                    version = await current_version(conn)
+                    if version < latest_version():
+                        if not self.migrate:
+                            message = f"Database schema is at version {version}, expected {latest_version()}. Run `python -m server.migrations apply`"
+                            raise RuntimeError(message)
+
+                        await migrate(conn)
 
-            async with pool.acquire() as conn:
-                script = ROOT / "scripts"
-                for file in ["tables.sql", "functions.sql", "views.sql"]:
-                    path = script / file
-                    await conn.execute(path.read_text(encoding="utf-8"))
+            except BaseException:
+                await pool.pool.close()
+                raise
 
+            # Only publish the pool to the fast path once the schema is up to date
+            self._pool = pool
             return pool
 
         except Exception:
             traceback.print_exc()
-            self._pool = None
             return None
 
         finally:
             self._lifecycle_lock.release()
 
+    async def _check_replica(self, replica: _Replica) -> bool:
+        if replica.pool is None:
+            replica.pool = await self._create_pool(host=replica.host, port=replica.port)
+
+        async with replica.pool.acquire(timeout=self.replica_health_check_interval) as conn:
+            row = await conn.fetchrow(
+                "SELECT "
+                "    pg_is_in_recovery() AS standby,"
+                "    pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() AS caught_up,"
+                "    COALESCE((SELECT status = 'streaming' FROM pg_stat_wal_receiver), FALSE) AS streaming,"
+                "    EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) AS lag",
+                timeout=self.replica_health_check_interval,
+            )
+
+        # The replay timestamp does not advance while the primary is idle, so a replica that has
+        # replayed everything it received is up to date regardless of it, as long as it is still
+        # receiving WAL: with a stopped receiver, there may be anything left to receive
+        caught_up = row["streaming"] and row["caught_up"]
+        return row["standby"] and (caught_up or (row["lag"] is not None and row["lag"] <= self.replica_max_lag_seconds))
+
+    async def _health_loop(self) -> None:
+        while True:
+            for replica in self._replicas:
+                try:
+                    healthy = await self._check_replica(replica)
+                except Exception:
+                    if replica.healthy:
+                        traceback.print_exc()
+
+                    healthy = False
+
+                if healthy != replica.healthy:
+                    print(f"Replica {replica.host} is now {'healthy' if healthy else 'unhealthy'}")
+                    replica.healthy = healthy
+
+            await asyncio.sleep(self.replica_health_check_interval)
+
+    def start(self) -> None:
+        """Start checking the health of the replicas, which receive no queries until they pass a check"""
+        if self._health_task is None and len(self._replicas) > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def connect(self) -> asyncpg.Connection:
+        """Open a standalone connection outside of the pool, e.g. for a long-lived `LISTEN`"""
+        return await asyncpg.connect(
+            database=self._database,
+            host=self._host,
+            user=self._user,
+            password=self._password,
+        )
+
     async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+
+        for replica in self._replicas:
+            pool, replica.pool = replica.pool, None
+            replica.healthy = False
+            if pool is not None:
+                await pool.close()
+
         await asyncio.wait_for(self._lifecycle_lock.acquire(), timeout=3)
         try:
             pool = self._pool
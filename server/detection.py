@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import traceback
+from typing import Awaitable, Callable, Dict, List, Optional, Protocol, Sequence, Set, Tuple, TYPE_CHECKING
+
+import numpy as np
+import numpy.typing as npt
+
+
+__all__ = ("Detector", "TwoPhaseFallDetector", "FallDetectionEngine")
+# Channel layout of a sample in the ring buffers
+ACCEL_X, ACCEL_Y, ACCEL_Z, GYRO_X, GYRO_Y, GYRO_Z = range(6)
+
+
+class Detector(Protocol):
+    """A fall detector evaluated over the sample windows of many devices at once"""
+
+    name: str
+
+    def evaluate(
+        self,
+        times: npt.NDArray[np.float64],
+        samples: npt.NDArray[np.float32],
+        fresh: npt.NDArray[np.bool_],
+    ) -> npt.NDArray[np.bool_]:
+        """Return which of the `n` windows contain a fall
+
+        `times` has shape `(n, w)` (seconds, NaN for empty slots), `samples` has shape `(n, w, 6)`
+        and `fresh` marks the samples that arrived since the previous evaluation. Slots are in ring
+        buffer order, not chronological order.
+        """
+        ...
+
+
+class TwoPhaseFallDetector:
+    """Server-side port of the firmware heuristic: a free-fall sample (`|z| < free_fall`) followed
+    by an impact sample (`z < impact`) within `window` seconds"""
+
+    __slots__ = ("name", "free_fall", "impact", "window")
+    if TYPE_CHECKING:
+        name: str
+        free_fall: float
+        impact: float
+        window: float
+
+    def __init__(self, *, free_fall: float, impact: float, window: float) -> None:
+        self.name = "two-phase"
+        self.free_fall = free_fall
+        self.impact = impact
+        self.window = window
+
+    def evaluate(
+        self,
+        times: npt.NDArray[np.float64],
+        samples: npt.NDArray[np.float32],
+        fresh: npt.NDArray[np.bool_],
+    ) -> npt.NDArray[np.bool_]:
+        z = samples[..., ACCEL_Z]
+        impact = (z < self.impact) & fresh
+        result = np.zeros(times.shape[0], dtype=np.bool_)
+
+        # The pairwise check is quadratic in the window size, only run it where an impact happened
+        candidates = np.flatnonzero(impact.any(axis=1))
+        if candidates.size == 0:
+            return result
+
+        t = times[candidates]
+        free_fall = np.abs(z[candidates]) < self.free_fall
+        delay = t[:, None, :] - t[:, :, None]  # [n, i, j] = time of sample j - time of sample i
+        pairs = free_fall[:, :, None] & impact[candidates][:, None, :] & (delay > 0) & (delay < self.window)
+        result[candidates] = pairs.any(axis=(1, 2))
+        return result
+
+
+class FallDetectionEngine:
+    """Keeps a ring buffer of the latest IMU samples of every device and periodically runs the
+    detectors over all devices that received new samples in a single vectorized batch"""
+
+    __slots__ = (
+        "_index",
+        "_device_ids",
+        "_times",
+        "_samples",
+        "_heads",
+        "_evaluated_at",
+        "_dirty",
+        "_task",
+        "detectors",
+        "window_size",
+        "interval",
+        "on_detection",
+    )
+    if TYPE_CHECKING:
+        _index: Dict[int, int]
+        _device_ids: List[int]
+        _times: npt.NDArray[np.float64]
+        _samples: npt.NDArray[np.float32]
+        _heads: npt.NDArray[np.int64]
+        _evaluated_at: npt.NDArray[np.float64]
+        _dirty: Set[int]
+        _task: Optional[asyncio.Task[None]]
+        detectors: List[Detector]
+        window_size: int
+        interval: float
+        on_detection: Optional[Callable[[int, str, npt.NDArray[np.float32]], Awaitable[None]]]
+
+    def __init__(self, *, detectors: Sequence[Detector], window_size: int, interval: float) -> None:
+        self._index = {}
+        self._device_ids = []
+        self._times = np.full((0, window_size), np.nan, dtype=np.float64)
+        self._samples = np.full((0, window_size, 6), np.nan, dtype=np.float32)
+        self._heads = np.zeros(0, dtype=np.int64)
+        self._evaluated_at = np.zeros(0, dtype=np.float64)
+        self._dirty = set()
+        self._task = None
+        self.detectors = list(detectors)
+        self.window_size = window_size
+        self.interval = interval
+        self.on_detection = None
+
+    def _slot(self, device_id: int) -> int:
+        slot = self._index.get(device_id)
+        if slot is None:
+            slot = self._index[device_id] = len(self._device_ids)
+            self._device_ids.append(device_id)
+            if slot >= self._heads.shape[0]:
+                # Grow geometrically so that registering devices stays amortized O(1)
+                grow = max(16, self._heads.shape[0])
+                self._times = np.concatenate([self._times, np.full((grow, self.window_size), np.nan)])
+                self._samples = np.concatenate([self._samples, np.full((grow, self.window_size, 6), np.nan, dtype=np.float32)])
+                self._heads = np.concatenate([self._heads, np.zeros(grow, dtype=np.int64)])
+                self._evaluated_at = np.concatenate([self._evaluated_at, np.full(grow, -np.inf)])
+
+        return slot
+
+    def push(self, device_id: int, time: float, sample: Sequence[float]) -> None:
+        """Record a sample `(accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z)` taken at `time` (seconds)"""
+        slot = self._slot(device_id)
+        head = self._heads[slot]
+        self._times[slot, head] = time
+        self._samples[slot, head] = sample
+        self._heads[slot] = (head + 1) % self.window_size
+        self._dirty.add(slot)
+
+    def evaluate(self) -> List[Tuple[int, str, npt.NDArray[np.float32]]]:
+        """Run every detector over the devices with new samples, returning `(device ID, detector name, latest sample)`
+        for each detection"""
+        if len(self._dirty) == 0:
+            return []
+
+        slots = np.fromiter(self._dirty, dtype=np.int64, count=len(self._dirty))
+        self._dirty.clear()
+
+        times = self._times[slots]
+        samples = self._samples[slots]
+        fresh = times > self._evaluated_at[slots, None]
+        self._evaluated_at[slots] = np.nanmax(times, axis=1)
+
+        fired = np.zeros(slots.size, dtype=np.bool_)
+        detections: List[Tuple[int, str, npt.NDArray[np.float32]]] = []
+        for detector in self.detectors:
+            mask = detector.evaluate(times, samples, fresh) & ~fired
+            fired |= mask
+            for i in np.flatnonzero(mask):
+                slot = slots[i]
+                latest = samples[i, (self._heads[slot] - 1) % self.window_size]
+                detections.append((self._device_ids[slot], detector.name, latest))
+
+        # Forget the window of devices that fell, so the same samples do not fire again
+        cleared = slots[fired]
+        self._times[cleared] = np.nan
+        self._samples[cleared] = np.nan
+        return detections
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                for device_id, detector, sample in self.evaluate():
+                    if self.on_detection is not None:
+                        await self.on_detection(device_id, detector, sample)
+
+            except Exception:
+                traceback.print_exc()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
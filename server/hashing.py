@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Literal, Optional, TypeVar, TYPE_CHECKING
+
+from argon2 import PasswordHasher
+
+from .metrics import HASHER_SECONDS
+
+
+__all__ = ("AsyncPasswordHasher",)
+_T = TypeVar("_T")
+
+
+# Module-level so that process pool workers can unpickle the callables below
+_HASHER = PasswordHasher()
+
+
+def _hash(password: str) -> str:
+    return _HASHER.hash(password)
+
+
+def _verify(hashed: str, password: str) -> bool:
+    return _HASHER.verify(hashed, password)
+
+
+class AsyncPasswordHasher:
+    """Argon2 hasher that runs hash and verify calls in an executor instead of on the event loop
+
+    At most `max_pending` calls are submitted to the executor at once, further callers wait
+    for a free slot so that a burst of logins cannot queue up unbounded work.
+    """
+
+    __slots__ = (
+        "_executor",
+        "_slots",
+        "kind",
+        "workers",
+        "max_pending",
+    )
+    if TYPE_CHECKING:
+        _executor: Optional[Executor]
+        _slots: asyncio.Semaphore
+        kind: Literal["thread", "process"]
+        workers: int
+        max_pending: int
+
+    def __init__(self, *, kind: Literal["thread", "process"], workers: int, max_pending: int) -> None:
+        self._executor = None
+        self._slots = asyncio.Semaphore(max_pending)
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hasher")
+
+        return self._executor
+
+    async def _run(self, operation: str, func: Callable[..., _T], *args: Any) -> _T:
+        started = time.perf_counter()
+        try:
+            async with self._slots:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+        finally:
+            HASHER_SECONDS.observe(time.perf_counter() - started, operation)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, password)
+
+    async def verify(self, hashed: str, password: str) -> bool:
+        """Verify a password against a hash, raising the same exceptions as `PasswordHasher.verify`"""
+        return await self._run("verify", _verify, hashed, password)
+
+    def check_needs_rehash(self, hashed: str) -> bool:
+        # Only parses the hash parameters, cheap enough to run inline
+        return _HASHER.check_needs_rehash(hashed)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import traceback
+from typing import List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import asyncpg  # type: ignore
+
+from .config import SNOWFLAKE_EPOCH
+from .database import DatabaseConnector
+
+
+__all__ = ("SnowflakeGenerator", "SnowflakeWorkerLease")
+# The 12-bit tail of a snowflake ID is split into a worker field and a per-millisecond sequence
+WORKER_BITS = 4
+SEQUENCE_BITS = 8
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+# Worker 0 is reserved for the IDs generated by the `generate_id()` database function
+DATABASE_WORKER_ID = 0
+# How far (in milliseconds) a generator may run ahead of the clock
+MAX_AHEAD_MS = 1000
+# A generator stops issuing IDs when its lease was last confirmed longer ago than this
+LEASE_TIMEOUT_MS = 2000
+# A holder that lost its lease (as seen by PostgreSQL) stops within LEASE_TIMEOUT_MS, having issued IDs
+# up to MAX_AHEAD_MS ahead of its clock. A new holder waits out both before issuing IDs.
+TAKEOVER_DELAY_MS = LEASE_TIMEOUT_MS + MAX_AHEAD_MS
+
+_SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+_EPOCH_MS = int(SNOWFLAKE_EPOCH.timestamp() * 1000)
+# Class of the `pg_try_advisory_lock(class, worker ID)` session locks leasing worker IDs
+_LEASE_LOCK_CLASS = 0x534E4F57
+_HEARTBEAT_SECONDS = 0.5
+
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000 - _EPOCH_MS
+
+
+class SnowflakeGenerator:
+    """Generates snowflake IDs in-process, with the same layout as `generate_id()`
+
+    An ID is `milliseconds since SNOWFLAKE_EPOCH << 12 | worker ID << 8 | sequence`, which gives
+    256 IDs per millisecond to each worker. The worker ID is assigned by `SnowflakeWorkerLease`,
+    and `next()`/`reserve()` return None while there is none or its lease has not been confirmed
+    for `LEASE_TIMEOUT_MS`. When the sequence of the current millisecond is exhausted, IDs are
+    taken from the following milliseconds instead, but never more than `MAX_AHEAD_MS` ahead of
+    the clock: beyond that, the caller waits for the clock to catch up.
+    """
+
+    __slots__ = (
+        "_lock",
+        "_last_ms",
+        "_sequence",
+        "_valid_until",
+        "worker_id",
+    )
+    if TYPE_CHECKING:
+        _lock: threading.Lock
+        _last_ms: int
+        _sequence: int
+        _valid_until: float
+        worker_id: Optional[int]
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+        self._valid_until = 0.0
+        self.worker_id = None
+
+    def assign(self, worker_id: int, *, valid_until: float) -> None:
+        """Start issuing IDs as `worker_id`, which no other process may be using, until `valid_until` (`time.monotonic()`)"""
+        if not DATABASE_WORKER_ID < worker_id <= MAX_WORKER_ID:
+            message = f"Snowflake worker ID must be between {DATABASE_WORKER_ID + 1} and {MAX_WORKER_ID}, got {worker_id}"
+            raise ValueError(message)
+
+        with self._lock:
+            self.worker_id = worker_id
+            self._valid_until = valid_until
+
+    def renew(self, *, valid_until: float) -> None:
+        with self._lock:
+            self._valid_until = valid_until
+
+    def revoke(self) -> None:
+        """Stop issuing IDs until the next `assign()`"""
+        with self._lock:
+            self.worker_id = None
+
+    def _take(self, count: int) -> Optional[Tuple[int, int, int]]:
+        """Advance the state by up to `count` IDs, as many as fit within MAX_AHEAD_MS of the clock
+
+        Returns the worker ID, the index of the first ID as `milliseconds << 8 | sequence` and the
+        number of IDs taken, or None without a valid lease.
+        """
+        with self._lock:
+            if self.worker_id is None or time.monotonic() >= self._valid_until:
+                return None
+
+            # Never move backwards, even if the system clock does
+            now = _now_ms()
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = 0
+
+            start = self._last_ms << SEQUENCE_BITS | self._sequence
+            taken = max(0, min(count, ((now + MAX_AHEAD_MS + 1) << SEQUENCE_BITS) - start))
+            end = start + taken
+            self._last_ms = end >> SEQUENCE_BITS
+            self._sequence = end & _SEQUENCE_MASK
+            return self.worker_id, start, taken
+
+    def _compose(self, worker_id: int, index: int) -> int:
+        return (index >> SEQUENCE_BITS) << 12 | worker_id << SEQUENCE_BITS | index & _SEQUENCE_MASK
+
+    async def next(self) -> Optional[int]:
+        ids = await self.reserve(1)
+        return None if ids is None else ids[0]
+
+    async def reserve(self, count: int) -> Optional[List[int]]:
+        """Reserve `count` increasing IDs, or None if the lease is lost before they are all taken"""
+        ids: List[int] = []
+        while len(ids) < count:
+            taken = self._take(count - len(ids))
+            if taken is None:
+                return None
+
+            worker_id, start, taken_count = taken
+            if taken_count == 0:
+                await asyncio.sleep(0.001)
+                continue
+
+            ids.extend(self._compose(worker_id, index) for index in range(start, start + taken_count))
+
+        return ids
+
+
+class SnowflakeWorkerLease:
+    """Leases a worker ID of a `SnowflakeGenerator` from PostgreSQL for the life of the process
+
+    The lease is a session-level advisory lock per worker ID, held by a dedicated connection that
+    confirms it every half second. With a configured `worker_id`, only that ID is tried, otherwise
+    the first free one. `start()` raises when no worker ID can be leased. If the connection is
+    lost, the generator stops issuing IDs until a worker ID is leased again.
+    """
+
+    __slots__ = (
+        "_connection",
+        "_leased",
+        "_task",
+        "database",
+        "generator",
+        "reconnect_delay",
+        "worker_id",
+    )
+    if TYPE_CHECKING:
+        _connection: Optional[asyncpg.Connection]
+        _leased: Optional[int]
+        _task: Optional[asyncio.Task[None]]
+        database: DatabaseConnector
+        generator: SnowflakeGenerator
+        reconnect_delay: float
+        worker_id: Optional[int]
+
+    def __init__(
+        self,
+        *,
+        database: DatabaseConnector,
+        generator: SnowflakeGenerator,
+        worker_id: Optional[int],
+        reconnect_delay: float,
+    ) -> None:
+        if worker_id is not None and not DATABASE_WORKER_ID < worker_id <= MAX_WORKER_ID:
+            message = f"Snowflake worker ID must be between {DATABASE_WORKER_ID + 1} and {MAX_WORKER_ID}, got {worker_id}"
+            raise ValueError(message)
+
+        self._connection = None
+        self._leased = None
+        self._task = None
+        self.database = database
+        self.generator = generator
+        self.reconnect_delay = reconnect_delay
+        self.worker_id = worker_id
+
+    async def _confirm(self, connection: asyncpg.Connection) -> float:
+        """Check that the session holding the lock is alive, returning until when the lease is valid"""
+        sent = time.monotonic()
+        await connection.execute("SELECT 1", timeout=LEASE_TIMEOUT_MS / 1000)
+        return sent + LEASE_TIMEOUT_MS / 1000
+
+    async def _lease(self, candidates: Sequence[int]) -> None:
+        connection = await self.database.connect()
+        try:
+            for worker_id in candidates:
+                if await connection.fetchval("SELECT pg_try_advisory_lock($1, $2)", _LEASE_LOCK_CLASS, worker_id):
+                    break
+
+            else:
+                raise RuntimeError(f"Snowflake worker IDs {list(candidates)} are all leased by other processes")
+
+            # The worker ID may have been used by a process that has just exited or lost its lease
+            await asyncio.sleep(TAKEOVER_DELAY_MS / 1000)
+            valid_until = await self._confirm(connection)
+
+        except BaseException:
+            await connection.close()
+            raise
+
+        self._connection = connection
+        self._leased = worker_id
+        self.generator.assign(worker_id, valid_until=valid_until)
+
+    def _candidates(self, preferred: Optional[int]) -> List[int]:
+        if self.worker_id is not None:
+            return [self.worker_id]
+
+        candidates = list(range(DATABASE_WORKER_ID + 1, MAX_WORKER_ID + 1))
+        if preferred is not None:
+            candidates.remove(preferred)
+            candidates.insert(0, preferred)
+
+        return candidates
+
+    async def _run(self) -> None:
+        while True:
+            connection = self._connection
+            if connection is not None:
+                try:
+                    while True:
+                        await asyncio.sleep(_HEARTBEAT_SECONDS)
+                        self.generator.renew(valid_until=await self._confirm(connection))
+
+                except Exception:
+                    traceback.print_exc()
+
+                # The lock may already be held by another process
+                self.generator.revoke()
+                self._connection = None
+                if not connection.is_closed():
+                    connection.terminate()
+
+            await asyncio.sleep(self.reconnect_delay)
+            try:
+                # Try the worker ID held before first
+                await self._lease(self._candidates(self._leased))
+            except Exception:
+                traceback.print_exc()
+
+    async def start(self) -> None:
+        if self._task is None:
+            await self._lease(self._candidates(None))
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        self.generator.revoke()
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
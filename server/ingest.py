@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import traceback
+from typing import Any, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from asyncpg.exceptions import ForeignKeyViolationError  # type: ignore
+
+from .columns import EVENT_COPY_COLUMNS
+from .database import DatabaseConnector
+
+
+__all__ = ("EventWriteBuffer",)
+_Record = Tuple[Any, ...]
+
+
+class _Batch:
+
+    __slots__ = ("records", "futures")
+    if TYPE_CHECKING:
+        records: List[_Record]
+        futures: List[asyncio.Future[None]]
+
+    def __init__(self) -> None:
+        self.records = []
+        self.futures = []
+
+
+class EventWriteBuffer:
+    """Group commit for `Events` inserts
+
+    Rows submitted within `max_delay` seconds of each other (or until `max_rows` are pending) are
+    written with a single COPY in one transaction, and every submitter is resumed once that
+    transaction commits. Urgent rows flush the pending batch immediately instead of waiting.
+    """
+
+    __slots__ = (
+        "_batch",
+        "_timer",
+        "_writes",
+        "database",
+        "max_delay",
+        "max_rows",
+    )
+    if TYPE_CHECKING:
+        _batch: _Batch
+        _timer: Optional[asyncio.TimerHandle]
+        _writes: Set[asyncio.Task[None]]
+        database: DatabaseConnector
+        max_delay: float
+        max_rows: int
+
+    def __init__(self, *, database: DatabaseConnector, max_delay: float, max_rows: int) -> None:
+        self._batch = _Batch()
+        self._timer = None
+        self._writes = set()
+        self.database = database
+        self.max_delay = max_delay
+        self.max_rows = max_rows
+
+    async def submit(self, record: _Record, *, urgent: bool = False) -> None:
+        """Queue an `Events` row and wait until the batch containing it is committed, raising if it was not
+
+        The record holds the values of `EVENT_COPY_COLUMNS`: the snowflake ID, the 14 reading fields and the device ID.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._batch.records.append(record)
+        self._batch.futures.append(future)
+
+        if urgent or len(self._batch.records) >= self.max_rows:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self.flush)
+
+        await future
+
+    def flush(self) -> None:
+        """Start writing the pending rows without waiting for the delay"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._batch = self._batch, _Batch()
+        if len(batch.records) > 0:
+            task = asyncio.create_task(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def stop(self) -> None:
+        self.flush()
+        await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def _copy(self, records: List[_Record]) -> None:
+        pool = await self.database.get_pool()
+        if pool is None:
+            raise ConnectionError("Database is unavailable")
+
+        async with pool.acquire() as conn, conn.transaction():
+            await conn.copy_records_to_table("events", records=records, columns=EVENT_COPY_COLUMNS)
+
+    async def _write(self, batch: _Batch) -> None:
+        try:
+            await self._copy(batch.records)
+
+        except ForeignKeyViolationError:
+            # A device was deleted while its rows were pending, do not fail the rest of the batch
+            for record, future in zip(batch.records, batch.futures):
+                try:
+                    await self._copy([record])
+                except Exception as e:
+                    _resolve(future, e)
+                else:
+                    _resolve(future, None)
+
+        except Exception as e:
+            traceback.print_exc()
+            for future in batch.futures:
+                _resolve(future, e)
+
+        else:
+            for future in batch.futures:
+                _resolve(future, None)
+
+
+def _resolve(future: asyncio.Future[None], exception: Optional[BaseException]) -> None:
+    # The submitter may have been cancelled (e.g. the client disconnected) while waiting
+    if not future.done():
+        if exception is None:
+            future.set_result(None)
+        else:
+            future.set_exception(exception)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import asyncio
+import traceback
+from typing import Callable, Dict, List, Optional, TYPE_CHECKING
+
+import asyncpg  # type: ignore
+
+from .database import DatabaseConnector
+
+
+__all__ = ("DatabaseListener",)
+
+
+class DatabaseListener:
+    """A single dedicated connection that `LISTEN`s on behalf of the whole process
+
+    Callbacks receive the payload of every notification on their channel. The connection is
+    re-established (and every channel listened to again) whenever it is lost.
+    """
+
+    __slots__ = (
+        "_callbacks",
+        "_connect_callbacks",
+        "_connection",
+        "_task",
+        "database",
+        "reconnect_delay",
+    )
+    if TYPE_CHECKING:
+        _callbacks: Dict[str, List[Callable[[str], None]]]
+        _connect_callbacks: List[Callable[[], None]]
+        _connection: Optional[asyncpg.Connection]
+        _task: Optional[asyncio.Task[None]]
+        database: DatabaseConnector
+        reconnect_delay: float
+
+    def __init__(self, *, database: DatabaseConnector, reconnect_delay: float) -> None:
+        self._callbacks = {}
+        self._connect_callbacks = []
+        self._connection = None
+        self._task = None
+        self.database = database
+        self.reconnect_delay = reconnect_delay
+
+    def _dispatch(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        for callback in self._callbacks.get(channel, []):
+            try:
+                callback(payload)
+            except Exception:
+                traceback.print_exc()
+
+    async def listen(self, channel: str, callback: Callable[[str], None]) -> None:
+        callbacks = self._callbacks.setdefault(channel, [])
+        callbacks.append(callback)
+        if len(callbacks) == 1 and self._connection is not None:
+            await self._connection.add_listener(channel, self._dispatch)
+
+    def on_connect(self, callback: Callable[[], None]) -> None:
+        """Register a callback for every (re)connection, notifications sent while disconnected are lost"""
+        self._connect_callbacks.append(callback)
+
+    async def _run(self) -> None:
+        while True:
+            terminated = asyncio.Event()
+            connection: Optional[asyncpg.Connection] = None
+            try:
+                self._connection = connection = await self.database.connect()
+                connection.add_termination_listener(lambda _: terminated.set())
+                for channel in list(self._callbacks):
+                    await connection.add_listener(channel, self._dispatch)
+
+                for callback in self._connect_callbacks:
+                    callback()
+
+                await terminated.wait()
+
+            except Exception:
+                traceback.print_exc()
+
+            finally:
+                self._connection = None
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            await asyncio.sleep(self.reconnect_delay)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
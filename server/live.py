@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Set, TYPE_CHECKING
+
+from .listener import DatabaseListener
+
+
+__all__ = ("EventBroadcaster",)
+
+
+class EventBroadcaster:
+    """Fans out the `events` notifications sent by the database to the subscribers of each user
+
+    All subscribers of the process share the connection of a single `DatabaseListener`, so an idle
+    subscriber only costs a bounded queue.
+    """
+
+    __slots__ = (
+        "_subscribers",
+        "queue_size",
+    )
+    if TYPE_CHECKING:
+        _subscribers: Dict[int, Set[asyncio.Queue[str]]]
+        queue_size: int
+
+    def __init__(self, *, queue_size: int) -> None:
+        self._subscribers = {}
+        self.queue_size = queue_size
+
+    async def attach(self, listener: DatabaseListener) -> None:
+        await listener.listen("events", self._publish)
+
+    def _publish(self, payload: str) -> None:
+        if len(self._subscribers) == 0:
+            return
+
+        user_id = json.loads(payload)["user_id"]
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                # Drop the oldest event for subscribers that do not keep up
+                queue.get_nowait()
+
+            queue.put_nowait(payload)
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int) -> AsyncIterator[asyncio.Queue[str]]:
+        """Receive the JSON payload of every event created for the devices of a user"""
+        queue: asyncio.Queue[str] = asyncio.Queue(self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        try:
+            yield queue
+
+        finally:
+            queues = self._subscribers[user_id]
+            queues.discard(queue)
+            if len(queues) == 0:
+                del self._subscribers[user_id]
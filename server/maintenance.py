@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import traceback
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Literal, Optional, TYPE_CHECKING
+
+from .database import DatabaseConnector
+
+
+__all__ = ("PartitionMaintainer",)
+# Rows deleted per statement when retention falls back to DELETE on an unpartitioned Events table
+_RETENTION_DELETE_BATCH = 10000
+
+
+class PartitionMaintainer:
+    """Background job that keeps the monthly partitions of `Events` ahead of time and enforces retention
+
+    Expired data is removed by dropping (or detaching, for archival) whole partitions instead of
+    deleting rows, so retention never bloats the table or its indexes. A database created before
+    partitioning keeps a plain `Events` table: there, "drop" retention deletes expired rows in
+    batches instead, and "detach" retention does nothing but complain.
+    """
+
+    __slots__ = (
+        "_task",
+        "_warned",
+        "database",
+        "interval",
+        "months_ahead",
+        "retention_days",
+        "retention_mode",
+    )
+    if TYPE_CHECKING:
+        _task: Optional[asyncio.Task[None]]
+        _warned: bool
+        database: DatabaseConnector
+        interval: float
+        months_ahead: int
+        retention_days: int
+        retention_mode: Literal["drop", "detach"]
+
+    def __init__(
+        self,
+        *,
+        database: DatabaseConnector,
+        interval: float,
+        months_ahead: int,
+        retention_days: int,
+        retention_mode: Literal["drop", "detach"],
+    ) -> None:
+        self._task = None
+        self._warned = False
+        self.database = database
+        self.interval = interval
+        self.months_ahead = months_ahead
+        self.retention_days = retention_days
+        self.retention_mode = retention_mode
+
+    async def run_once(self) -> List[str]:
+        """Create the upcoming partitions, then return the names of the partitions removed by retention"""
+        pool = await self.database.get_pool()
+        if pool is None:
+            return []
+
+        async with pool.acquire() as conn:
+            partitioned = await conn.fetchval("SELECT events_is_partitioned()")
+            if not partitioned and not self._warned:
+                print(
+                    "WARNING: Events is not partitioned (the database predates partitioning), no partitions are maintained "
+                    + ("and retention deletes expired rows in batches" if self.retention_mode == "drop" else "and detach retention is disabled"),
+                )
+                self._warned = True
+
+            await conn.execute("SELECT ensure_events_partitions($1)", self.months_ahead)
+            if self.retention_days <= 0:
+                return []
+
+            cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+            if not partitioned:
+                if self.retention_mode == "drop":
+                    await self._delete_expired(conn, cutoff)
+
+                return []
+
+            rows = await conn.fetch(
+                "SELECT * FROM drop_events_partitions($1, $2)",
+                cutoff,
+                self.retention_mode == "detach",
+            )
+            return [row[0] for row in rows]
+
+    async def _delete_expired(self, conn: Any, cutoff: datetime) -> None:
+        # One short transaction per batch, so that no lock is held for long and vacuum can keep up
+        while True:
+            status = await conn.execute(
+                "DELETE FROM Events WHERE id IN ("
+                "    SELECT id FROM Events WHERE id < snowflake_at($1) ORDER BY id LIMIT $2"
+                ")",
+                cutoff,
+                _RETENTION_DELETE_BATCH,
+            )
+            if int(status.split()[-1]) < _RETENTION_DELETE_BATCH:
+                return
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                traceback.print_exc()
+
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
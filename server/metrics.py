@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import bisect
+import time
+from typing import Any, Awaitable, Callable, Dict, List, MutableMapping, Sequence, Tuple, Union, TYPE_CHECKING
+
+
+__all__ = (
+    "Counter",
+    "Histogram",
+    "MetricsRegistry",
+    "MetricsMiddleware",
+    "REGISTRY",
+    "HTTP_REQUEST_SECONDS",
+    "DATABASE_QUERY_SECONDS",
+    "HASHER_SECONDS",
+    "DISCORD_REQUEST_SECONDS",
+    "DISCORD_RATE_LIMITED",
+)
+# Default latency buckets in seconds, from 0.5 ms to 10 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """A monotonically increasing counter, one series per combination of label values"""
+
+    __slots__ = ("name", "help", "labels", "_values")
+    if TYPE_CHECKING:
+        name: str
+        help: str
+        labels: Tuple[str, ...]
+        _values: Dict[Tuple[str, ...], float]
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+
+        return lines
+
+
+class _Series:
+
+    __slots__ = ("counts", "sum")
+    if TYPE_CHECKING:
+        counts: List[int]
+        sum: float
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+class Histogram:
+    """A latency histogram with fixed buckets, one series per combination of label values
+
+    Observing a sample is a dictionary lookup, a bisection and two additions; buckets are only
+    accumulated into the cumulative Prometheus representation when rendered.
+    """
+
+    __slots__ = ("name", "help", "labels", "buckets", "_series")
+    if TYPE_CHECKING:
+        name: str
+        help: str
+        labels: Tuple[str, ...]
+        buckets: Tuple[float, ...]
+        _series: Dict[Tuple[str, ...], _Series]
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            # The last slot counts the samples above every bucket (le="+Inf")
+            series = self._series[labels] = _Series(len(self.buckets) + 1)
+
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.sum += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self._series.items():
+            total = 0
+            for bound, count in zip((*self.buckets, float("inf")), series.counts):
+                total += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labels, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {total}")
+
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {series.sum}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {total}")
+
+        return lines
+
+
+class MetricsRegistry:
+
+    __slots__ = ("_metrics",)
+    if TYPE_CHECKING:
+        _metrics: List[Union[Counter, Histogram]]
+
+    def __init__(self) -> None:
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        counter = Counter(name, help, labels)
+        self._metrics.append(counter)
+        return counter
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        histogram = Histogram(name, help, labels, buckets)
+        self._metrics.append(histogram)
+        return histogram
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Time until the response headers of a request are sent",
+    ("method", "route", "status"),
+)
+DATABASE_QUERY_SECONDS = REGISTRY.histogram(
+    "database_query_duration_seconds",
+    "Execution time of the queries issued through the connection pool",
+    ("operation",),
+)
+HASHER_SECONDS = REGISTRY.histogram(
+    "hasher_duration_seconds",
+    "Time of an Argon2 call, including the wait for a free executor slot",
+    ("operation",),
+)
+DISCORD_REQUEST_SECONDS = REGISTRY.histogram(
+    "discord_request_duration_seconds",
+    "Time of a request to the Discord API",
+    ("endpoint", "status"),
+)
+DISCORD_RATE_LIMITED = REGISTRY.counter(
+    "discord_rate_limited_total",
+    "Number of Discord API requests rejected with 429 Too Many Requests",
+    ("scope",),
+)
+
+
+_Scope = MutableMapping[str, Any]
+_Message = MutableMapping[str, Any]
+_Receive = Callable[[], Awaitable[_Message]]
+_Send = Callable[[_Message], Awaitable[None]]
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording `HTTP_REQUEST_SECONDS` for every HTTP request
+
+    Requests are labelled with the path template of the matched route rather than the raw path,
+    so that IDs in URLs do not create a series each.
+    """
+
+    __slots__ = ("app",)
+    if TYPE_CHECKING:
+        app: Callable[[_Scope, _Receive, _Send], Awaitable[None]]
+
+    def __init__(self, app: Callable[[_Scope, _Receive, _Send], Awaitable[None]]) -> None:
+        self.app = app
+
+    async def __call__(self, scope: _Scope, receive: _Receive, send: _Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+
+        async def _send(message: _Message) -> None:
+            if message["type"] == "http.response.start":
+                # Streaming responses are timed until their headers, not until the stream ends
+                route = scope.get("route")
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started,
+                    scope["method"],
+                    getattr(route, "path", "<unmatched>"),
+                    str(message["status"]),
+                )
+
+            await send(message)
+
+        await self.app(scope, receive, _send)
@@ -0,0 +1,57 @@
+"""Apply or inspect the schema migrations of the configured database
+
+    python -m server.migrations status
+    python -m server.migrations apply
+    python -m server.migrations geo-cells
+
+`geo-cells` completes migration 0002 without long locks, while the server keeps running: it fills in
+`Events.geo_cell` for the existing rows in batches, then builds the nearby lookup index of every
+existing partition concurrently. Until it has run, `/api/events/nearby` misses the older events.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+
+import asyncpg  # type: ignore
+
+from . import current_version, latest_version, migrate, modified_migrations
+from .geo_cells import backfill_geo_cells, build_geo_cell_indexes
+from ..config import POSTGRES_DB, POSTGRES_HOST, POSTGRES_PASSWORD, POSTGRES_USER
+
+
+async def main(args: argparse.Namespace) -> None:
+    conn = await asyncpg.connect(
+        database=POSTGRES_DB,
+        host=POSTGRES_HOST,
+        user=POSTGRES_USER,
+        password=POSTGRES_PASSWORD,
+    )
+    try:
+        if args.command == "apply":
+            for migration in await migrate(conn):
+                print(f"Applied {migration.path.name}")
+
+        elif args.command == "geo-cells":
+            await backfill_geo_cells(conn, batch_size=args.batch_size, progress=lambda last: print(f"Backfilled up to ID {last}"))
+            await build_geo_cell_indexes(conn, progress=lambda table: print(f"Indexed {table}"))
+
+        print(f"Schema version {await current_version(conn)}, latest {latest_version()}")
+        for migration in await modified_migrations(conn):
+            print(f"WARNING: {migration.path.name} was modified after it was applied")
+
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "command",
+        choices=("status", "apply", "geo-cells"),
+        help="show the schema version, apply the pending migrations or complete migration 0002",
+    )
+    parser.add_argument("--batch-size", type=int, default=10_000, help="the number of events per geo-cells backfill transaction")
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from typing import Callable, List
+
+import asyncpg  # type: ignore
+
+
+__all__ = ("backfill_geo_cells", "build_geo_cell_indexes")
+_INDEX = "idx_events_geo_cell_id"
+
+
+async def backfill_geo_cells(conn: asyncpg.Connection, *, batch_size: int, progress: Callable[[int], None]) -> None:
+    """Fill in `Events.geo_cell` for the rows inserted before migration 0002, one short transaction per batch
+
+    `progress` receives the last ID of every batch. Safe to interrupt and run again.
+    """
+    after = -1
+    while True:
+        last = await conn.fetchval("SELECT backfill_events_geo_cells($1, $2)", after, batch_size)
+        if last is None:
+            return
+
+        progress(last)
+        after = last
+
+
+async def build_geo_cell_indexes(conn: asyncpg.Connection, *, progress: Callable[[str], None]) -> None:
+    """Build the `(geo_cell, id)` index of every existing partition without blocking writes, then attach it
+
+    Once every partition is attached, the parent index becomes valid. Must run outside of a transaction.
+    """
+    partitioned = await conn.fetchval("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'events'::REGCLASS)")
+    if not partitioned:
+        await _create_index_concurrently(conn, index=_INDEX, table="events")
+        progress("events")
+        return
+
+    partitions: List[str] = [
+        row["relname"]
+        for row in await conn.fetch(
+            "SELECT c.relname FROM pg_inherits i "
+            "INNER JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'events'::REGCLASS "
+            "AND NOT EXISTS ("
+            "    SELECT 1 FROM pg_inherits ii "
+            "    INNER JOIN pg_index x ON x.indexrelid = ii.inhrelid "
+            "    WHERE ii.inhparent = $1::REGCLASS AND x.indrelid = c.oid"
+            ") "
+            "ORDER BY c.relname",
+            _INDEX,
+        )
+    ]
+    for partition in partitions:
+        index = f"{_INDEX}_{partition}"[:63]
+        await _create_index_concurrently(conn, index=index, table=partition)
+        await conn.execute(f"ALTER INDEX {_INDEX} ATTACH PARTITION {index}")
+        progress(partition)
+
+
+async def _create_index_concurrently(conn: asyncpg.Connection, *, index: str, table: str) -> None:
+    # An interrupted concurrent build leaves an invalid index behind, which must be rebuilt
+    valid = await conn.fetchval("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)", index)
+    if valid is False:
+        await conn.execute(f"DROP INDEX CONCURRENTLY {index}")
+
+    await conn.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table}(geo_cell, id) WHERE geo_cell IS NOT NULL")
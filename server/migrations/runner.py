@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from pathlib import Path
+from typing import List, TYPE_CHECKING
+
+import asyncpg  # type: ignore
+
+from ..config import ROOT
+
+
+__all__ = ("Migration", "MIGRATIONS", "current_version", "latest_version", "migrate", "modified_migrations")
+MIGRATIONS_DIRECTORY = ROOT / "scripts" / "migrations"
+# Arbitrary key of the advisory lock serializing concurrent migrators
+_LOCK_KEY = 0x6D6967726174696F
+
+
+class Migration:
+    """A `scripts/migrations/NNNN_<name>.sql` file, migrations are applied in order of their number
+
+    Each one runs in its own transaction together with the insertion of its version and checksum
+    into `SchemaMigrations`, so a failed migration leaves no trace and is retried on the next run.
+    An applied migration must never be edited: schema changes go into a new migration instead.
+    """
+
+    __slots__ = ("version", "name", "path", "checksum")
+    if TYPE_CHECKING:
+        version: int
+        name: str
+        path: Path
+        checksum: str
+
+    def __init__(self, *, version: int, name: str, path: Path) -> None:
+        self.version = version
+        self.name = name
+        self.path = path
+        # Of the text with normalized line endings, which differ between checkouts
+        self.checksum = hashlib.sha256(path.read_text(encoding="utf-8").encode("utf-8")).hexdigest()
+
+    @classmethod
+    def discover(cls, directory: Path) -> List[Migration]:
+        migrations: List[Migration] = []
+        for path in directory.glob("*.sql"):
+            match = re.fullmatch(r"(\d{4})_(\w+)\.sql", path.name)
+            if match is None:
+                raise ValueError(f"Unexpected migration file name {path.name!r}, expected NNNN_<name>.sql")
+
+            migrations.append(cls(version=int(match.group(1)), name=match.group(2), path=path))
+
+        migrations.sort(key=lambda migration: migration.version)
+        for previous, migration in zip(migrations, migrations[1:]):
+            if previous.version == migration.version:
+                raise ValueError(f"Duplicate migration version {migration.version}")
+
+        return migrations
+
+
+MIGRATIONS = Migration.discover(MIGRATIONS_DIRECTORY)
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1].version if len(MIGRATIONS) > 0 else 0
+
+
+async def current_version(conn: asyncpg.Connection) -> int:
+    """The version of the database schema, 0 if no migration was ever applied"""
+    if await conn.fetchval("SELECT to_regclass('SchemaMigrations')") is None:
+        return 0
+
+    return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM SchemaMigrations")
+
+
+async def modified_migrations(conn: asyncpg.Connection) -> List[Migration]:
+    """The applied migrations whose file no longer matches the checksum recorded when it was applied
+
+    Migrations applied before checksums were recorded have none and are not reported.
+    """
+    if await conn.fetchval("SELECT to_regclass('SchemaMigrations')") is None:
+        return []
+
+    if not await conn.fetchval("SELECT EXISTS (SELECT FROM pg_attribute WHERE attrelid = 'SchemaMigrations'::regclass AND attname = 'checksum')"):
+        return []
+
+    rows = await conn.fetch("SELECT version, checksum FROM SchemaMigrations WHERE checksum IS NOT NULL")
+    checksums = {row["version"]: row["checksum"] for row in rows}
+    return [migration for migration in MIGRATIONS if checksums.get(migration.version, migration.checksum) != migration.checksum]
+
+
+async def migrate(conn: asyncpg.Connection) -> List[Migration]:
+    """Apply the pending migrations, returning them
+
+    Concurrent callers (e.g. several workers starting at once) wait for each other on an advisory
+    lock, after which the later ones find nothing left to apply. Raises `RuntimeError` without
+    applying anything if an applied migration file was modified since.
+    """
+    await conn.execute("SELECT pg_advisory_lock($1)", _LOCK_KEY)
+    try:
+        await conn.execute(
+            "CREATE TABLE IF NOT EXISTS SchemaMigrations ("
+            "    version INTEGER PRIMARY KEY,"
+            "    name TEXT NOT NULL,"
+            "    applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),"
+            "    checksum TEXT"
+            ")"
+        )
+        await conn.execute("ALTER TABLE SchemaMigrations ADD COLUMN IF NOT EXISTS checksum TEXT")
+
+        modified = await modified_migrations(conn)
+        if len(modified) > 0:
+            names = ", ".join(migration.path.name for migration in modified)
+            raise RuntimeError(f"Applied migrations were modified since: {names}. Add a new migration instead")
+
+        # Record the checksums of the migrations applied before checksums were recorded
+        version = await current_version(conn)
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                await conn.execute(
+                    "UPDATE SchemaMigrations SET checksum = $2 WHERE version = $1 AND checksum IS NULL",
+                    migration.version,
+                    migration.checksum,
+                )
+
+        applied: List[Migration] = []
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+
+            async with conn.transaction():
+                await conn.execute(migration.path.read_text(encoding="utf-8"))
+                await conn.execute(
+                    "INSERT INTO SchemaMigrations (version, name, checksum) VALUES ($1, $2, $3)",
+                    migration.version,
+                    migration.name,
+                    migration.checksum,
+                )
+
+            applied.append(migration)
+
+        return applied
+
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
@@ -1,6 +1,9 @@
+from .analytics import *
 from .device import *
 from .discord import *
 from .event import *
 from .result import *
+from .rollup import *
 from .snowflake import *
+from .statistics import *
 from .user import *
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import Annotated, Any, Dict, List, Optional, Self
+
+import pydantic
+
+from .device import Device
+from .result import Result
+from .snowflake import Snowflake
+from ..analytics import ANALYTICS_QUERY, BinaryCopyDecoder, compute_analytics, concatenate, from_archive
+from ..codes import ANALYTICS_INVALID_WINDOW, ANALYTICS_TOO_MANY_EVENTS, ANALYTICS_WINDOW_TOO_LARGE, DATABASE_FAILURE, DEVICE_NOT_FOUND
+from ..config import ANALYTICS_MAX_EVENTS, ANALYTICS_MAX_WINDOW_DAYS
+from ..state import STATE
+
+
+__all__ = ("MetricDistribution", "DailyEventCount", "MagnitudeHistogram", "AltitudeDrift", "DeviceAnalytics")
+# Time window analyzed when `since` is omitted
+_DEFAULT_WINDOW = timedelta(days=30)
+
+
+class MetricDistribution(pydantic.BaseModel):
+    """Represents the distribution of a sensor metric"""
+
+    count: Annotated[int, pydantic.Field(description="The number of events with a value for this metric")]
+    mean: Annotated[Optional[float], pydantic.Field(description="The average value")]
+    min: Annotated[Optional[float], pydantic.Field(description="The minimum value")]
+    max: Annotated[Optional[float], pydantic.Field(description="The maximum value")]
+    p5: Annotated[Optional[float], pydantic.Field(description="The 5th percentile")]
+    p25: Annotated[Optional[float], pydantic.Field(description="The 25th percentile")]
+    p50: Annotated[Optional[float], pydantic.Field(description="The median")]
+    p75: Annotated[Optional[float], pydantic.Field(description="The 75th percentile")]
+    p95: Annotated[Optional[float], pydantic.Field(description="The 95th percentile")]
+
+
+class DailyEventCount(pydantic.BaseModel):
+    """Represents the number of events of a device in a UTC day"""
+
+    day: Annotated[date, pydantic.Field(description="The UTC day")]
+    event_count: Annotated[int, pydantic.Field(description="The number of events")]
+    fall_count: Annotated[int, pydantic.Field(description="The number of FALL_DETECTED events")]
+
+
+class MagnitudeHistogram(pydantic.BaseModel):
+    """Represents a histogram of the acceleration magnitude, values past the last edge fall in the last bin"""
+
+    edges: Annotated[List[float], pydantic.Field(description="The bin edges in g, one more than the bins")]
+    counts: Annotated[List[int], pydantic.Field(description="The number of events in each bin")]
+
+
+class AltitudeDrift(MetricDistribution):
+    """Represents the distribution of the barometric minus the GPS altitude, in meters"""
+
+    slope_meters_per_day: Annotated[Optional[float], pydantic.Field(description="The least-squares trend of the difference")]
+
+
+class DeviceAnalytics(pydantic.BaseModel):
+    """Represents the statistics of the events of a device over a time window"""
+
+    since: Annotated[datetime, pydantic.Field(description="The start of the analyzed window (inclusive)")]
+    until: Annotated[datetime, pydantic.Field(description="The end of the analyzed window (exclusive)")]
+    event_count: Annotated[int, pydantic.Field(description="The number of events in the window")]
+    daily: Annotated[List[DailyEventCount], pydantic.Field(description="The event and fall counts of each day with events")]
+    heart_rate_bpm: Annotated[MetricDistribution, pydantic.Field(description="The heart rate in BPM")]
+    spo2: Annotated[MetricDistribution, pydantic.Field(description="The blood oxygen level (SpO2) percentage")]
+    accel_magnitude: Annotated[MetricDistribution, pydantic.Field(description="The magnitude of the acceleration vector in g")]
+    accel_magnitude_histogram: Annotated[MagnitudeHistogram, pydantic.Field(description="The histogram of the acceleration magnitude")]
+    altitude_drift: Annotated[AltitudeDrift, pydantic.Field(description="The barometric altitude minus the GPS altitude")]
+
+    @classmethod
+    async def get_for_device(
+        cls,
+        *,
+        device_id: int,
+        user_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Result[Optional[Self]]:
+        """Compute the analytics of a device, over the last 30 days unless `since` is given
+
+        The window is fetched with a binary COPY, decoded into NumPy arrays as it streams in (archived
+        months are read from their memory-mapped files), then reduced in a worker thread so that
+        the event loop is not blocked. Windows longer than `ANALYTICS_MAX_WINDOW_DAYS` or holding more
+        than `ANALYTICS_MAX_EVENTS` events are refused.
+        """
+        device = await Device.get(id=device_id)
+        if device.data is None or device.data.user.id != user_id:
+            return Result(code=DEVICE_NOT_FOUND, data=None)
+
+        pool = await STATE.database.get_pool(readonly=True)
+        if pool is None:
+            return Result(code=DATABASE_FAILURE, data=None)
+
+        # Naive times are treated as UTC, as by `Snowflake.id_at`
+        if since is not None and since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+
+        if until is not None and until.tzinfo is None:
+            until = until.replace(tzinfo=timezone.utc)
+
+        until = datetime.now(timezone.utc) if until is None else until
+        since = until - _DEFAULT_WINDOW if since is None else since
+        if since > until:
+            return Result(code=ANALYTICS_INVALID_WINDOW, data=None)
+
+        if until - since > timedelta(days=ANALYTICS_MAX_WINDOW_DAYS):
+            return Result(code=ANALYTICS_WINDOW_TOO_LARGE, data=None)
+
+        lower = Snowflake.id_at(since) - 1
+        upper = Snowflake.id_at(until)
+
+        # Rows of a month being archived are still in Events as well
+        # Listing and opening the archived months hits the filesystem
+        archived = await asyncio.to_thread(lambda: list(STATE.archive.slices(device_id, lower=lower, upper=upper)))
+        if len(archived) > 0:
+            lower = max(lower, int(archived[-1]["id"][-1]))
+
+        remaining = ANALYTICS_MAX_EVENTS - sum(len(columns["id"]) for columns in archived)
+        if remaining < 0:
+            return Result(code=ANALYTICS_TOO_MANY_EVENTS, data=None)
+
+        decoder = BinaryCopyDecoder(max_rows=remaining)
+        async with pool.acquire() as conn:
+            try:
+                await conn.copy_from_query(ANALYTICS_QUERY, device_id, lower, upper, output=decoder.write, format="binary")
+            except OverflowError:
+                return Result(code=ANALYTICS_TOO_MANY_EVENTS, data=None)
+
+        def compute() -> Dict[str, Any]:
+            parts = [from_archive(columns) for columns in archived]
+            parts.append(decoder.finish())
+            return compute_analytics(concatenate(parts))
+
+        analytics = await asyncio.to_thread(compute)
+        return Result(data=cls(since=since, until=until, **analytics))
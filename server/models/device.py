@@ -33,7 +33,11 @@ class Device(Snowflake):
 
     @classmethod
     async def get(cls, *, id: int) -> Result[Optional[Self]]:
-        pool = await STATE.database.get_pool()
+        cached = STATE.devices.get(id)
+        if isinstance(cached, cls):
+            return Result(data=cached)
+
+        pool = await STATE.database.get_pool(readonly=True)
         if pool is None:
             return Result(code=DATABASE_FAILURE, data=None)
 
@@ -42,11 +46,13 @@ class Device(Snowflake):
             if row is None:
                 return Result(code=DEVICE_NOT_FOUND, data=None)
 
-            return Result(data=cls.from_row(row))
+            device = cls.from_row(row)
+            STATE.devices.set(id, device)
+            return Result(data=device)
 
     @classmethod
     async def get_all(cls, *, user_id: int) -> Result[List[Self]]:
-        pool = await STATE.database.get_pool()
+        pool = await STATE.database.get_pool(readonly=True)
         if pool is None:
             return Result(code=DATABASE_FAILURE, data=[])
 
@@ -57,14 +63,19 @@ class Device(Snowflake):
 
     @classmethod
     async def create(cls, *, name: str, token: str, user_id: int) -> Result[Optional[Self]]:
-        hashed = STATE.hasher.hash(token)
+        hashed = await STATE.hasher.hash(token)
         pool = await STATE.database.get_pool()
         if pool is None:
             return Result(code=DATABASE_FAILURE, data=None)
 
+        id = await STATE.ids.next()
+        if id is None:
+            return Result(code=DATABASE_FAILURE, data=None)
+
         async with pool.acquire() as conn:
             row = await conn.fetchrow(
-                "SELECT * FROM create_device($1, $2, $3)",
+                "SELECT * FROM create_device($1, $2, $3, $4)",
+                id,
                 name,
                 hashed,
                 user_id,
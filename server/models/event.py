@@ -1,19 +1,53 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Annotated, List, Optional, Self
+import csv
+import hashlib
+import hmac
+import io
+import json
+from datetime import datetime
+from typing import Annotated, Any, AsyncIterator, Dict, List, Literal, Mapping, Optional, Self, Sequence, Tuple, Union
 
 import asyncpg  # type: ignore
 import pydantic
+from asyncpg.exceptions import ForeignKeyViolationError  # type: ignore
 
 from .result import Result
 from .snowflake import Snowflake
 from .device import Device
+from ..category import FALL_DETECTED
 from ..codes import DATABASE_FAILURE, DEVICE_NOT_FOUND, INCORRECT_CREDENTIALS
+from ..columns import EVENT_COLUMNS, EVENT_COPY_COLUMNS
+from ..database import InstrumentedPool
 from ..state import STATE
 
 
-__all__ = ("Event",)
+__all__ = ("Event", "EventPage", "EventReading")
+_MAX_ID = (1 << 63) - 1
+# Only the columns of the Events table, the device is loaded once per request instead of joined into every row
+_SELECT_EVENTS = "SELECT " + ", ".join(EVENT_COLUMNS) + " FROM Events WHERE device_id = $1 AND id > $2 AND id < $3 "
+# Rows serialized into a single chunk of the export stream
+_EXPORT_CHUNK_ROWS = 500
+
+
+class EventReading(pydantic.BaseModel):
+    """Represents the sensor readings of a device event"""
+
+    category: Annotated[int, pydantic.Field(description="The event category")]
+    accel_x: Annotated[Optional[float], pydantic.Field(description="The X acceleration value")] = None
+    accel_y: Annotated[Optional[float], pydantic.Field(description="The Y acceleration value")] = None
+    accel_z: Annotated[Optional[float], pydantic.Field(description="The Z acceleration value")] = None
+    gyro_x: Annotated[Optional[float], pydantic.Field(description="The X gyroscope value")] = None
+    gyro_y: Annotated[Optional[float], pydantic.Field(description="The Y gyroscope value")] = None
+    gyro_z: Annotated[Optional[float], pydantic.Field(description="The Z gyroscope value")] = None
+    heart_rate_bpm: Annotated[Optional[int], pydantic.Field(description="The heart rate in BPM")] = None
+    spo2: Annotated[Optional[int], pydantic.Field(description="The blood oxygen level (SpO2) percentage")] = None
+    latitude: Annotated[Optional[float], pydantic.Field(description="The GPS latitude")] = None
+    longitude: Annotated[Optional[float], pydantic.Field(description="The GPS longitude")] = None
+    neo6m_altitude_meter: Annotated[Optional[float], pydantic.Field(description="The GPS altitude in meters")] = None
+    pressure_pa: Annotated[Optional[float], pydantic.Field(description="The pressure in pascals")] = None
+    bmp280_altitude_meter: Annotated[Optional[float], pydantic.Field(description="The barometric altitude in meters")] = None
 
 
 class Event(Snowflake):
@@ -56,16 +90,317 @@ class Event(Snowflake):
             device=Device.from_row(row),
         )
 
+    @staticmethod
+    async def _authenticate(*, device_id: int, device_token: str) -> Result[Optional[Device]]:
+        # A replica may not have the device yet if it has just been registered
+        with STATE.database.read_your_writes():
+            device = await Device.get(id=device_id)
+
+        if device.data is None:
+            return device
+
+        hashed_token = device.data.hashed_token
+        digest = hashlib.sha256(device_token.encode("utf-8")).digest()
+        cached = STATE.device_tokens.get(device_id)
+        if cached is not None and cached[1] == hashed_token and hmac.compare_digest(cached[0], digest):
+            return device
+
+        try:
+            await STATE.hasher.verify(hashed_token, device_token)
+
+        except Exception:
+            return Result(code=INCORRECT_CREDENTIALS, data=None)
+
+        STATE.device_tokens.set(device_id, (digest, hashed_token))
+
+        async def _rehash_task() -> None:
+            if STATE.hasher.check_needs_rehash(hashed_token):
+                new_hashed = await STATE.hasher.hash(device_token)
+                pool = await STATE.database.get_pool()
+                if pool is None:
+                    return
+
+                async with pool.acquire() as conn:
+                    await conn.execute(
+                        "UPDATE Devices SET hashed_token = $1 WHERE id = $2",
+                        new_hashed,
+                        device_id,
+                    )
+
+                # Other processes are notified by the invalidation trigger on Devices
+                STATE.invalidate_device(device_id)
+
+        asyncio.create_task(_rehash_task())
+        return device
+
+    @staticmethod
+    async def _fetch_for_device(
+        *,
+        device_id: int,
+        user_id: int,
+        before: Optional[int],
+        after: Optional[int],
+        since: Optional[datetime],
+        until: Optional[datetime],
+        limit: int,
+    ) -> Result[Tuple[Optional[Device], List[Mapping[str, Any]]]]:
+        device = await Device.get(id=device_id)
+        if device.data is None or device.data.user.id != user_id:
+            return Result(code=DEVICE_NOT_FOUND, data=(None, []))
+
+        pool = await STATE.database.get_pool(readonly=True)
+        if pool is None:
+            return Result(code=DATABASE_FAILURE, data=(None, []))
+
+        lower = -1 if after is None else after
+        if since is not None:
+            lower = max(lower, Snowflake.id_at(since) - 1)
+
+        upper = _MAX_ID if before is None else before
+        if until is not None:
+            upper = min(upper, Snowflake.id_at(until))
+
+        # Paging forward from a cursor: take the events right after it, then flip them back
+        forward = after is not None and before is None
+        async with pool.acquire() as conn:
+            rows: List[Mapping[str, Any]] = await conn.fetch(
+                _SELECT_EVENTS + ("ORDER BY id ASC LIMIT $4" if forward else "ORDER BY id DESC LIMIT $4"),
+                device_id,
+                lower,
+                upper,
+                limit,
+            )
+
+        # Archived months only hold IDs below the watermark, skip them when the page is already full above it
+        watermark = await asyncio.to_thread(STATE.archive.watermark, device_id)
+        if lower + 1 < watermark and (forward or len(rows) < limit or rows[-1]["id"] < watermark):
+            archived = await asyncio.to_thread(
+                STATE.archive.read,
+                device_id,
+                lower=lower,
+                upper=min(upper, watermark),
+                limit=limit,
+                descending=not forward,
+            )
+
+            # A month being archived is briefly present in both places
+            merged: Dict[int, Mapping[str, Any]] = {row["id"]: row for row in archived}
+            merged.update((row["id"], row) for row in rows)
+            rows = sorted(merged.values(), key=lambda row: row["id"], reverse=not forward)[:limit]
+
+        if forward:
+            rows.reverse()
+
+        return Result(data=(device.data, rows))
+
     @classmethod
-    async def get_for_device(cls, *, device_id: int, user_id: int) -> Result[List[Self]]:
-        pool = await STATE.database.get_pool()
+    async def get_for_device(
+        cls,
+        *,
+        device_id: int,
+        user_id: int,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> Result[List[Self]]:
+        """Get a page of events of a device, newest first
+
+        `before` and `after` are exclusive event ID cursors, `since` (inclusive) and `until` (exclusive)
+        are converted to ID bounds so that both use the `(device_id, id DESC)` index.
+        """
+        result = await cls._fetch_for_device(
+            device_id=device_id,
+            user_id=user_id,
+            before=before,
+            after=after,
+            since=since,
+            until=until,
+            limit=limit,
+        )
+        device, rows = result.data
+        if device is None:
+            return Result(code=result.code, data=[])
+
+        # Rows come from the database (or the archive) with the declared types, skip validation.
+        # Every event shares the same Device instance.
+        events = [cls.model_construct(**row, device=device) for row in rows]
+        return Result(data=events)
+
+    @classmethod
+    async def get_page_for_device(
+        cls,
+        *,
+        device_id: int,
+        user_id: int,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> Result[Optional[EventPage]]:
+        """Same as `get_for_device`, but returns the device once and the events as flat rows"""
+        result = await cls._fetch_for_device(
+            device_id=device_id,
+            user_id=user_id,
+            before=before,
+            after=after,
+            since=since,
+            until=until,
+            limit=limit,
+        )
+        device, rows = result.data
+        if device is None:
+            return Result(code=result.code, data=None)
+
+        page = EventPage.model_construct(device=device, columns=list(EVENT_COLUMNS), rows=[list(row.values()) for row in rows])
+        return Result(data=page)
+
+    @classmethod
+    async def get_nearby(
+        cls,
+        *,
+        user_id: int,
+        min_latitude: float,
+        min_longitude: float,
+        max_latitude: float,
+        max_longitude: float,
+        center: Optional[Tuple[float, float]] = None,
+        radius_meters: Optional[float] = None,
+        category: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> Result[List[Self]]:
+        """Get the events of a user's devices inside a bounding box, newest first
+
+        The box is expanded into ranges of `geo_cell` so that the lookup uses the `(geo_cell, id)`
+        index, the time window becomes an ID range. When `center` and `radius_meters` are given,
+        events outside of that circle (which must fit in the box) are filtered out as well.
+        """
+        pool = await STATE.database.get_pool(readonly=True)
         if pool is None:
             return Result(code=DATABASE_FAILURE, data=[])
 
+        lower = -1 if since is None else Snowflake.id_at(since) - 1
+        upper = _MAX_ID if until is None else Snowflake.id_at(until)
+        latitude, longitude = (None, None) if center is None else center
         async with pool.acquire() as conn:
-            rows = await conn.fetch("SELECT * FROM view_events WHERE device_id = $1 AND user_id = $2", device_id, user_id)
-            events = [cls.from_row(row) for row in rows]
-            return Result(data=events)
+            rows = await conn.fetch(
+                "SELECT " + ", ".join(f"e.{column}" for column in EVENT_COPY_COLUMNS) + " "
+                "FROM geo_cells_in_box($1, $2, $3, $4) c "
+                "INNER JOIN Events e ON e.geo_cell BETWEEN c.cell_from AND c.cell_to "
+                "INNER JOIN Devices d ON d.id = e.device_id "
+                "WHERE d.user_id = $5 AND e.id > $6 AND e.id < $7 "
+                "AND e.latitude BETWEEN $1 AND $3 AND e.longitude BETWEEN $2 AND $4 "
+                "AND ($8::SMALLINT IS NULL OR e.category = $8) "
+                "AND ($11::DOUBLE PRECISION IS NULL OR geo_distance_meters($9, $10, e.latitude, e.longitude) <= $11) "
+                "ORDER BY e.id DESC LIMIT $12",
+                min_latitude,
+                min_longitude,
+                max_latitude,
+                max_longitude,
+                user_id,
+                lower,
+                upper,
+                category,
+                latitude,
+                longitude,
+                radius_meters,
+                limit,
+            )
+
+        # Usually a handful of devices, served by the entity cache
+        devices: Dict[int, Device] = {}
+        events: List[Self] = []
+        for row in rows:
+            device_id = row["device_id"]
+            device = devices.get(device_id)
+            if device is None:
+                result = await Device.get(id=device_id)
+                if result.data is None:
+                    continue
+
+                device = devices[device_id] = result.data
+
+            events.append(cls.model_construct(**{column: row[column] for column in EVENT_COLUMNS}, device=device))
+
+        return Result(data=events)
+
+    @staticmethod
+    async def export_for_device(
+        *,
+        device_id: int,
+        user_id: int,
+        format: Literal["ndjson", "csv"],
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Result[Optional[AsyncIterator[bytes]]]:
+        """Prepare a stream of the events of a device, oldest first, as NDJSON or CSV chunks
+
+        The device and the database are checked before anything is streamed. Archived months are
+        read chunk by chunk from their memory-mapped files first, then the rest from a server-side
+        cursor, so memory usage does not depend on the number of exported events.
+        """
+        device = await Device.get(id=device_id)
+        if device.data is None or device.data.user.id != user_id:
+            return Result(code=DATABASE_FAILURE if device.code == DATABASE_FAILURE else DEVICE_NOT_FOUND, data=None)
+
+        pool = await STATE.database.get_pool(readonly=True)
+        if pool is None:
+            return Result(code=DATABASE_FAILURE, data=None)
+
+        return Result(data=Event._export(pool=pool, device_id=device_id, format=format, since=since, until=until))
+
+    @staticmethod
+    async def _export(
+        *,
+        pool: InstrumentedPool,
+        device_id: int,
+        format: Literal["ndjson", "csv"],
+        since: Optional[datetime],
+        until: Optional[datetime],
+    ) -> AsyncIterator[bytes]:
+        lower = -1 if since is None else Snowflake.id_at(since) - 1
+        upper = _MAX_ID if until is None else Snowflake.id_at(until)
+        query = _SELECT_EVENTS + "ORDER BY id ASC"
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        if format == "csv":
+            writer.writerow(EVENT_COLUMNS)
+
+        def write(row: Mapping[str, Any]) -> None:
+            if format == "csv":
+                writer.writerow(row.values())
+            else:
+                buffer.write(json.dumps(dict(row.items())))
+                buffer.write("\n")
+
+        chunks = STATE.archive.iterate(device_id, lower=lower, upper=upper, chunk_rows=_EXPORT_CHUNK_ROWS)
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            for row in chunk:
+                write(row)
+
+            # Rows of a month being archived are still in Events as well
+            lower = max(lower, chunk[-1]["id"])
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+        rows = 0
+        async with pool.acquire() as conn, conn.transaction():
+            async for record in conn.cursor(query, device_id, lower, upper, prefetch=_EXPORT_CHUNK_ROWS):
+                write(record)
+                rows += 1
+                if rows % _EXPORT_CHUNK_ROWS == 0:
+                    yield buffer.getvalue().encode("utf-8")
+                    buffer.seek(0)
+                    buffer.truncate()
+
+        if buffer.tell() > 0:
+            yield buffer.getvalue().encode("utf-8")
 
     @classmethod
     async def create(
@@ -88,38 +423,77 @@ class Event(Snowflake):
         device_id: int,
         device_token: str
     ) -> Result[Optional[Self]]:
-        pool = await STATE.database.get_pool()
-        if pool is None:
-            return Result(code=DATABASE_FAILURE, data=None)
+        device = await cls._authenticate(device_id=device_id, device_token=device_token)
+        if device.data is None:
+            return Result(code=device.code, data=None)
 
-        async with pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM view_devices WHERE device_id = $1", device_id)
-            if row is None:
-                return Result(code=DEVICE_NOT_FOUND, data=None)
+        id = await STATE.ids.next()
+        if id is None:
+            return Result(code=DATABASE_FAILURE, data=None)
 
-            device = Device.from_row(row)
+        if STATE.ingest is not None:
             try:
-                STATE.hasher.verify(device.hashed_token, device_token)
+                await STATE.ingest.submit(
+                    (
+                        id,
+                        category,
+                        accel_x,
+                        accel_y,
+                        accel_z,
+                        gyro_x,
+                        gyro_y,
+                        gyro_z,
+                        heart_rate_bpm,
+                        spo2,
+                        latitude,
+                        longitude,
+                        neo6m_altitude_meter,
+                        pressure_pa,
+                        bmp280_altitude_meter,
+                        device_id,
+                    ),
+                    # Alerts flush the pending batch instead of waiting for it to fill up
+                    urgent=category == FALL_DETECTED,
+                )
+
+            except ForeignKeyViolationError:
+                return Result(code=DEVICE_NOT_FOUND, data=None)
 
             except Exception:
-                return Result(code=INCORRECT_CREDENTIALS, data=None)
-
-            async def _rehash_task() -> None:
-                if STATE.hasher.check_needs_rehash(device.hashed_token):
-                    new_hashed = STATE.hasher.hash(device_token)
-                    async with pool.acquire() as conn:
-                        await conn.execute(
-                            "UPDATE Devices SET hashed_token = $1 WHERE id = $2",
-                            new_hashed,
-                            device.id,
-                        )
-
-            asyncio.create_task(_rehash_task())
+                return Result(code=DATABASE_FAILURE, data=None)
+
+            return Result(
+                data=cls(
+                    id=id,
+                    category=category,
+                    accel_x=accel_x,
+                    accel_y=accel_y,
+                    accel_z=accel_z,
+                    gyro_x=gyro_x,
+                    gyro_y=gyro_y,
+                    gyro_z=gyro_z,
+                    heart_rate_bpm=heart_rate_bpm,
+                    spo2=spo2,
+                    latitude=latitude,
+                    longitude=longitude,
+                    neo6m_altitude_meter=neo6m_altitude_meter,
+                    pressure_pa=pressure_pa,
+                    bmp280_altitude_meter=bmp280_altitude_meter,
+                    device=device.data,
+                ),
+            )
+
+        pool = await STATE.database.get_pool()
+        if pool is None:
+            return Result(code=DATABASE_FAILURE, data=None)
+
+        async with pool.acquire() as conn:
             row = await conn.fetchrow(
                 "SELECT * FROM create_event("
                 "    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10,"
-                "    $11, $12, $13, $14, $15"
+                "    $11, $12, $13, $14, $15, $16"
                 ")",
+                id,
                 category,
                 accel_x,
                 accel_y,
@@ -137,3 +511,77 @@ class Event(Snowflake):
                 device_id,
             )
             return Result(data=cls.from_row(row))
+
+    @classmethod
+    async def create_detected(cls, *, reading: EventReading, device_id: int) -> Result[Optional[Self]]:
+        """Insert an event synthesized by the server on behalf of a device, without its token"""
+        pool = await STATE.database.get_pool()
+        if pool is None:
+            return Result(code=DATABASE_FAILURE, data=None)
+
+        id = await STATE.ids.next()
+        if id is None:
+            return Result(code=DATABASE_FAILURE, data=None)
+
+        async with pool.acquire() as conn:
+            try:
+                row = await conn.fetchrow(
+                    "SELECT * FROM create_event("
+                    "    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10,"
+                    "    $11, $12, $13, $14, $15, $16"
+                    ")",
+                    id,
+                    *reading.model_dump().values(),
+                    device_id,
+                )
+
+            except ForeignKeyViolationError:
+                return Result(code=DEVICE_NOT_FOUND, data=None)
+
+            return Result(data=cls.from_row(row))
+
+    @classmethod
+    async def create_batch(
+        cls,
+        *,
+        readings: Sequence[EventReading],
+        device_id: int,
+        device_token: str,
+    ) -> Result[List[Self]]:
+        """Insert many events of a single device with one authentication and one statement"""
+        device = await cls._authenticate(device_id=device_id, device_token=device_token)
+        if device.data is None:
+            return Result(code=device.code, data=[])
+
+        if len(readings) == 0:
+            return Result(data=[])
+
+        pool = await STATE.database.get_pool()
+        if pool is None:
+            return Result(code=DATABASE_FAILURE, data=[])
+
+        # Keys are generated client-side so that the rows can be streamed with COPY
+        ids = await STATE.ids.reserve(len(readings))
+        if ids is None:
+            return Result(code=DATABASE_FAILURE, data=[])
+
+        records = [
+            (id, *(getattr(reading, field) for field in EventReading.model_fields), device_id)
+            for id, reading in zip(ids, readings)
+        ]
+        async with pool.acquire() as conn:
+            await conn.copy_records_to_table("events", records=records, columns=EVENT_COPY_COLUMNS)
+
+            events = [
+                cls(id=id, device=device.data, **reading.model_dump())
+                for id, reading in zip(ids, readings)
+            ]
+            return Result(data=events)
+
+
+class EventPage(pydantic.BaseModel):
+    """A page of events of a single device, with the device sent once and the events as flat rows"""
+
+    device: Annotated[Device, pydantic.Field(description="The device that generated the events")]
+    columns: Annotated[List[str], pydantic.Field(description="The event field of each position in a row")]
+    rows: Annotated[List[List[Union[int, float, None]]], pydantic.Field(description="The event values, newest first")]
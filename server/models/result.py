@@ -3,6 +3,7 @@ from __future__ import annotations
 from typing import Annotated, Generic, TypeVar
 
 import pydantic
+from fastapi.responses import Response
 
 from ..codes import SUCCESS
 
@@ -16,3 +17,11 @@ class Result(pydantic.BaseModel, Generic[_SerializableT]):
 
     code: Annotated[int, pydantic.Field("The result code of the operation")] = SUCCESS
     data: Annotated[_SerializableT, pydantic.Field(description="The result data of the operation")]
+
+    def to_response(self) -> Response:
+        """Serialize this result to JSON in a single pass, without the response model validation of FastAPI
+
+        Meant for results built from trusted database rows. The route must still declare the result type
+        as its `response_model` so that the OpenAPI schema does not change.
+        """
+        return Response(self.model_dump_json(), media_type="application/json")
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Annotated, Dict, List, Literal, Optional, Self
+
+import asyncpg  # type: ignore
+import pydantic
+
+from .result import Result
+from ..codes import DATABASE_FAILURE
+from ..state import STATE
+
+
+__all__ = ("MetricRollup", "EventRollup")
+_BUCKET_SECONDS: Dict[str, int] = {
+    "1m": 60,
+    "1h": 3600,
+    "1d": 86400,
+}
+
+
+class MetricRollup(pydantic.BaseModel):
+    """Represents the aggregates of a sensor metric over a time bucket"""
+
+    count: Annotated[int, pydantic.Field(description="The number of events with a value for this metric")]
+    min: Annotated[Optional[float], pydantic.Field(description="The minimum value")]
+    max: Annotated[Optional[float], pydantic.Field(description="The maximum value")]
+    avg: Annotated[Optional[float], pydantic.Field(description="The average value")]
+
+    @classmethod
+    def from_row(cls, row: asyncpg.Record, metric: str) -> Self:
+        count = row[f"{metric}_count"]
+        return cls(
+            count=count,
+            min=row[f"{metric}_min"],
+            max=row[f"{metric}_max"],
+            avg=row[f"{metric}_sum"] / count if count > 0 else None,
+        )
+
+
+class EventRollup(pydantic.BaseModel):
+    """Represents the aggregated events of a device over a time bucket"""
+
+    start: Annotated[datetime, pydantic.Field(description="The start time of the bucket")]
+    event_count: Annotated[int, pydantic.Field(description="The number of events in the bucket")]
+    heart_rate_bpm: Annotated[MetricRollup, pydantic.Field(description="The heart rate in BPM")]
+    spo2: Annotated[MetricRollup, pydantic.Field(description="The blood oxygen level (SpO2) percentage")]
+    pressure_pa: Annotated[MetricRollup, pydantic.Field(description="The pressure in pascals")]
+    accel_magnitude: Annotated[MetricRollup, pydantic.Field(description="The magnitude of the acceleration vector")]
+
+    @classmethod
+    def from_row(cls, row: asyncpg.Record) -> Self:
+        return cls(
+            start=row["bucket_start"],
+            event_count=row["event_count"],
+            heart_rate_bpm=MetricRollup.from_row(row, "heart_rate_bpm"),
+            spo2=MetricRollup.from_row(row, "spo2"),
+            pressure_pa=MetricRollup.from_row(row, "pressure_pa"),
+            accel_magnitude=MetricRollup.from_row(row, "accel_magnitude"),
+        )
+
+    @classmethod
+    async def get_for_device(
+        cls,
+        *,
+        device_id: int,
+        user_id: int,
+        bucket: Literal["1m", "1h", "1d"],
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> Result[List[Self]]:
+        """Get the rollups of a device, newest bucket first"""
+        pool = await STATE.database.get_pool(readonly=True)
+        if pool is None:
+            return Result(code=DATABASE_FAILURE, data=[])
+
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT * FROM view_event_rollups "
+                "WHERE device_id = $1 AND user_id = $2 AND bucket_seconds = $3 "
+                "AND ($4::TIMESTAMPTZ IS NULL OR bucket_start >= $4) AND ($5::TIMESTAMPTZ IS NULL OR bucket_start < $5) "
+                "ORDER BY bucket_start DESC LIMIT $6",
+                device_id,
+                user_id,
+                _BUCKET_SECONDS[bucket],
+                since,
+                until,
+                limit,
+            )
+            rollups = [cls.from_row(row) for row in rows]
+            return Result(data=rollups)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Annotated
 
 import pydantic
@@ -21,3 +21,12 @@ class Snowflake(pydantic.BaseModel):
         """The creation time of the snowflake ID"""
         milliseconds = self.id >> 12
         return SNOWFLAKE_EPOCH + timedelta(milliseconds=milliseconds)
+
+    @staticmethod
+    def id_at(time: datetime) -> int:
+        """The smallest snowflake ID that can be generated at the given time (naive times are treated as UTC)"""
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=timezone.utc)
+
+        milliseconds = (time - SNOWFLAKE_EPOCH) // timedelta(milliseconds=1)
+        return max(0, milliseconds) << 12
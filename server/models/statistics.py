@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from typing import Annotated, Any, Self
+
+import pydantic
+
+from ..cache import LRUCache
+from ..database import DatabaseConnector
+
+
+__all__ = ("CacheStatistics", "PoolStatistics", "Statistics")
+
+
+class CacheStatistics(pydantic.BaseModel):
+    """Represents the counters of an in-process cache"""
+
+    size: Annotated[int, pydantic.Field(description="The number of cached entries")]
+    capacity: Annotated[int, pydantic.Field(description="The maximum number of cached entries")]
+    hits: Annotated[int, pydantic.Field(description="The number of cache hits")]
+    misses: Annotated[int, pydantic.Field(description="The number of cache misses")]
+    hit_ratio: Annotated[float, pydantic.Field(description="The fraction of lookups served from the cache")]
+
+    @classmethod
+    def from_cache(cls, cache: LRUCache[Any, Any]) -> Self:
+        total = cache.hits + cache.misses
+        return cls(
+            size=len(cache),
+            capacity=cache.capacity,
+            hits=cache.hits,
+            misses=cache.misses,
+            hit_ratio=cache.hits / total if total > 0 else 0.0,
+        )
+
+
+class PoolStatistics(pydantic.BaseModel):
+    """Represents the state of the database connection pool"""
+
+    min_size: Annotated[int, pydantic.Field(description="The minimum number of connections")]
+    max_size: Annotated[int, pydantic.Field(description="The maximum number of connections")]
+    in_use: Annotated[int, pydantic.Field(description="The number of connections currently acquired")]
+    idle: Annotated[int, pydantic.Field(description="The number of open connections waiting to be acquired")]
+    acquires: Annotated[int, pydantic.Field(description="The number of connections acquired")]
+    acquire_wait_seconds: Annotated[float, pydantic.Field(description="The total time spent waiting for a connection")]
+    mean_acquire_wait_seconds: Annotated[float, pydantic.Field(description="The mean time spent waiting for a connection")]
+    max_acquire_wait_seconds: Annotated[float, pydantic.Field(description="The longest time spent waiting for a connection")]
+    queries: Annotated[int, pydantic.Field(description="The number of queries executed through the pool")]
+
+    @classmethod
+    def from_connector(cls, connector: DatabaseConnector) -> Self:
+        pool = connector.pool
+        if pool is None:
+            return cls(
+                min_size=connector.min_size,
+                max_size=connector.max_size,
+                in_use=0,
+                idle=0,
+                acquires=0,
+                acquire_wait_seconds=0.0,
+                mean_acquire_wait_seconds=0.0,
+                max_acquire_wait_seconds=0.0,
+                queries=0,
+            )
+
+        size = pool.get_size()
+        idle = pool.get_idle_size()
+        return cls(
+            min_size=pool.get_min_size(),
+            max_size=pool.get_max_size(),
+            in_use=size - idle,
+            idle=idle,
+            acquires=pool.acquires,
+            acquire_wait_seconds=pool.acquire_wait_seconds,
+            mean_acquire_wait_seconds=pool.acquire_wait_seconds / pool.acquires if pool.acquires > 0 else 0.0,
+            max_acquire_wait_seconds=pool.max_acquire_wait_seconds,
+            queries=pool.queries,
+        )
+
+
+class Statistics(pydantic.BaseModel):
+    """Represents the runtime statistics of the server"""
+
+    device_tokens: Annotated[CacheStatistics, pydantic.Field(description="The verified device token cache")]
+    sessions: Annotated[CacheStatistics, pydantic.Field(description="The authenticated JWT cache")]
+    users: Annotated[CacheStatistics, pydantic.Field(description="The user entity cache")]
+    devices: Annotated[CacheStatistics, pydantic.Field(description="The device entity cache")]
+    database: Annotated[PoolStatistics, pydantic.Field(description="The database connection pool")]
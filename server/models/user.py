@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import time
 from typing import Annotated, List, Optional, Self
 
 import asyncpg  # type: ignore
@@ -19,6 +20,7 @@ from ..codes import (
     USER_NOT_FOUND,
 )
 from ..config import DISCORD_API_URL
+from ..metrics import DISCORD_REQUEST_SECONDS
 from ..state import STATE
 
 
@@ -41,23 +43,35 @@ class User(Snowflake):
             "content": content,
             "embeds": [embed.model_dump() for embed in embeds] if embeds is not None else None,
         }
+        started = time.perf_counter()
         async with STATE.http.post(
             DISCORD_API_URL.joinpath(f"channels/{self.discord_channel_id}/messages"),
             json=payload,
             headers=STATE.discord_auth_header,
         ) as response:
+            DISCORD_REQUEST_SECONDS.observe(time.perf_counter() - started, "messages", str(response.status))
             if response.status == 200:
                 return Result(data=None)
             else:
                 return Result(code=DISCORD_API_ERROR, data=None)
 
+    def notify(
+        self,
+        content: Optional[str] = None,
+        embeds: Optional[List[Embed]] = None,
+    ) -> None:
+        """Queue a message to this user's DM channel without waiting for its delivery"""
+        STATE.notifier.enqueue(self.discord_channel_id, content=content, embeds=embeds)
+
     @staticmethod
     async def _create_dm_channel(discord_user_id: int) -> Result[Optional[int]]:
+        started = time.perf_counter()
         async with STATE.http.post(
             DISCORD_API_URL.joinpath(f"users/@me/channels"),
             json={"recipient_id": str(discord_user_id)},
             headers=STATE.discord_auth_header,
         ) as response:
+            DISCORD_REQUEST_SECONDS.observe(time.perf_counter() - started, "dm_channels", str(response.status))
             if response.status == 200:
                 data = await response.json(encoding="utf-8")
                 discord_channel_id = int(data["id"])
@@ -76,7 +90,11 @@ class User(Snowflake):
 
     @classmethod
     async def get(cls, *, id: int) -> Result[Optional[Self]]:
-        pool = await STATE.database.get_pool()
+        cached = STATE.users.get(id)
+        if isinstance(cached, cls):
+            return Result(data=cached)
+
+        pool = await STATE.database.get_pool(readonly=True)
         if pool is None:
             return Result(code=DATABASE_FAILURE, data=None)
 
@@ -85,7 +103,9 @@ class User(Snowflake):
             if row is None:
                 return Result(code=USER_NOT_FOUND, data=None)
 
-            return Result(data=cls.from_row(row))
+            user = cls.from_row(row)
+            STATE.users.set(id, user)
+            return Result(data=user)
 
     @classmethod
     async def login(cls, *, username: str, password: str) -> Result[Optional[Self]]:
@@ -98,32 +118,37 @@ class User(Snowflake):
                 "SELECT * FROM view_users WHERE user_username = $1",
                 username,
             )
-            if row is None:
-                return Result(code=INCORRECT_CREDENTIALS, data=None)
 
-            user = cls.from_row(row)
-            try:
-                STATE.hasher.verify(user.hashed_password, password)
-
-            except Exception:
-                return Result(code=INCORRECT_CREDENTIALS, data=None)
-
-            async def _rehash_task() -> None:
-                if STATE.hasher.check_needs_rehash(user.hashed_password):
-                    new_hashed = STATE.hasher.hash(password)
-                    async with pool.acquire() as conn:
-                        await conn.execute(
-                            "UPDATE Users SET hashed_password = $1 WHERE id = $2",
-                            new_hashed,
-                            user.id,
-                        )
-
-            asyncio.create_task(_rehash_task())
-            return Result(data=user)
+        if row is None:
+            return Result(code=INCORRECT_CREDENTIALS, data=None)
+
+        # Verify after releasing the connection, the hash may wait for a free executor slot
+        user = cls.from_row(row)
+        try:
+            await STATE.hasher.verify(user.hashed_password, password)
+
+        except Exception:
+            return Result(code=INCORRECT_CREDENTIALS, data=None)
+
+        async def _rehash_task() -> None:
+            if STATE.hasher.check_needs_rehash(user.hashed_password):
+                new_hashed = await STATE.hasher.hash(password)
+                async with pool.acquire() as conn:
+                    await conn.execute(
+                        "UPDATE Users SET hashed_password = $1 WHERE id = $2",
+                        new_hashed,
+                        user.id,
+                    )
+
+                # Other processes are notified by the invalidation trigger on Users
+                STATE.invalidate_user(user.id)
+
+        asyncio.create_task(_rehash_task())
+        return Result(data=user)
 
     @classmethod
     async def create(cls, *, username: str, discord_user_id: int, password: str) -> Result[Optional[Self]]:
-        hashed = STATE.hasher.hash(password)
+        hashed = await STATE.hasher.hash(password)
         pool = await STATE.database.get_pool()
         if pool is None:
             return Result(code=DATABASE_FAILURE, data=None)
@@ -132,10 +157,15 @@ class User(Snowflake):
         if discord_channel_id.data is None:
             return Result(code=discord_channel_id.code, data=None)
 
+        id = await STATE.ids.next()
+        if id is None:
+            return Result(code=DATABASE_FAILURE, data=None)
+
         async with pool.acquire() as conn:
             try:
                 row = await conn.fetchrow(
-                    "SELECT * FROM create_user($1, $2, $3)",
+                    "SELECT * FROM create_user($1, $2, $3, $4)",
+                    id,
                     username,
                     discord_channel_id.data,
                     hashed,
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+import traceback
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+import aiohttp
+
+from .config import DISCORD_API_URL
+from .metrics import DISCORD_RATE_LIMITED, DISCORD_REQUEST_SECONDS
+
+if TYPE_CHECKING:
+    from .models import Embed
+
+
+__all__ = ("DiscordNotifier",)
+# Discord rejects messages with more embeds than this
+_MAX_EMBEDS_PER_MESSAGE = 10
+
+
+class _Pending:
+
+    __slots__ = ("content", "embeds")
+    if TYPE_CHECKING:
+        content: Optional[str]
+        embeds: List[Dict[str, Any]]
+
+    def __init__(self, content: Optional[str]) -> None:
+        self.content = content
+        self.embeds = []
+
+
+class _Bucket:
+    """Rate limit state of a single channel route, taken from the `X-RateLimit-*` headers"""
+
+    __slots__ = ("lock", "remaining", "reset_at")
+    if TYPE_CHECKING:
+        lock: asyncio.Lock
+        remaining: Optional[int]
+        reset_at: float
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.remaining = None
+        self.reset_at = 0.0
+
+    def update(self, headers: Any) -> None:
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset_after is not None:
+            self.reset_at = time.monotonic() + float(reset_after)
+
+    def delay(self) -> float:
+        if self.remaining == 0:
+            return max(0.0, self.reset_at - time.monotonic())
+
+        return 0.0
+
+
+class DiscordNotifier:
+    """Background queue that delivers Discord channel messages with a pool of workers
+
+    Messages queued for the same channel while an earlier one is waiting are coalesced into a
+    single message with all of their embeds. Workers honor the per-channel rate limit buckets
+    and the global rate limit reported by Discord, and retry failed deliveries with exponential
+    backoff.
+    """
+
+    __slots__ = (
+        "_http",
+        "_queue",
+        "_pending",
+        "_buckets",
+        "_global_reset_at",
+        "_workers",
+        "headers",
+        "worker_count",
+        "max_retries",
+    )
+    if TYPE_CHECKING:
+        _http: Optional[aiohttp.ClientSession]
+        _queue: asyncio.Queue[int]
+        _pending: Dict[int, _Pending]
+        _buckets: Dict[int, _Bucket]
+        _global_reset_at: float
+        _workers: List[asyncio.Task[None]]
+        headers: Dict[str, str]
+        worker_count: int
+        max_retries: int
+
+    def __init__(self, *, headers: Dict[str, str], worker_count: int, max_retries: int) -> None:
+        self._http = None
+        self._queue = asyncio.Queue()
+        self._pending = {}
+        self._buckets = {}
+        self._global_reset_at = 0.0
+        self._workers = []
+        self.headers = headers
+        self.worker_count = worker_count
+        self.max_retries = max_retries
+
+    def enqueue(self, channel_id: int, *, content: Optional[str] = None, embeds: Optional[List[Embed]] = None) -> None:
+        pending = self._pending.get(channel_id)
+        if pending is None:
+            pending = self._pending[channel_id] = _Pending(content)
+            self._queue.put_nowait(channel_id)
+
+        if embeds is not None:
+            pending.embeds.extend(embed.model_dump() for embed in embeds)
+
+    def start(self, http: aiohttp.ClientSession) -> None:
+        self._http = http
+        for _ in range(self.worker_count - len(self._workers)):
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def stop(self, *, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        for worker in self._workers:
+            worker.cancel()
+
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def _worker(self) -> None:
+        while True:
+            channel_id = await self._queue.get()
+            try:
+                await self._process(channel_id)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, channel_id: int) -> None:
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            bucket = self._buckets[channel_id] = _Bucket()
+
+        async with bucket.lock:
+            await asyncio.sleep(max(bucket.delay(), self._global_reset_at - time.monotonic()))
+
+            # Take the pending message as late as possible so that bursts are coalesced
+            pending = self._pending.pop(channel_id, None)
+            if pending is None:
+                return
+
+            if len(pending.embeds) > _MAX_EMBEDS_PER_MESSAGE:
+                rest = self._pending.get(channel_id)
+                if rest is None:
+                    rest = self._pending[channel_id] = _Pending(pending.content)
+                    self._queue.put_nowait(channel_id)
+
+                rest.embeds[:0] = pending.embeds[_MAX_EMBEDS_PER_MESSAGE:]
+                del pending.embeds[_MAX_EMBEDS_PER_MESSAGE:]
+
+            await self._deliver(channel_id, bucket, pending)
+
+    async def _deliver(self, channel_id: int, bucket: _Bucket, pending: _Pending) -> bool:
+        if self._http is None:
+            return False
+
+        payload = {
+            "content": pending.content,
+            "embeds": pending.embeds if len(pending.embeds) > 0 else None,
+        }
+        for attempt in range(self.max_retries + 1):
+            retry_after: Optional[float] = None
+            try:
+                started = time.perf_counter()
+                async with self._http.post(
+                    DISCORD_API_URL.joinpath(f"channels/{channel_id}/messages"),
+                    json=payload,
+                    headers=self.headers,
+                ) as response:
+                    DISCORD_REQUEST_SECONDS.observe(time.perf_counter() - started, "messages", str(response.status))
+                    bucket.update(response.headers)
+                    if response.status < 300:
+                        return True
+
+                    if response.status == 429:
+                        retry_after = float(response.headers.get("Retry-After", 1))
+                        if response.headers.get("X-RateLimit-Global") == "true":
+                            DISCORD_RATE_LIMITED.inc("global")
+                            self._global_reset_at = time.monotonic() + retry_after
+                        else:
+                            DISCORD_RATE_LIMITED.inc("route")
+
+                    elif response.status < 500:
+                        # Client errors (missing access, unknown channel, ...) will not succeed on retry
+                        return False
+
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                traceback.print_exc()
+
+            if attempt < self.max_retries:
+                if retry_after is None:
+                    retry_after = min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+                await asyncio.sleep(retry_after)
+
+        return False
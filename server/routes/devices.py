@@ -1,23 +1,40 @@
 from __future__ import annotations
 
-from typing import Annotated, List, Optional
+from datetime import datetime
+from typing import Annotated, List, Literal, Optional
 
 import pydantic
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import Response, StreamingResponse
 
 from .root import get_current_user
-from ..models import Device, Event, Result, User
+from ..codes import ANALYTICS_INVALID_WINDOW, ANALYTICS_TOO_MANY_EVENTS, ANALYTICS_WINDOW_TOO_LARGE, DATABASE_FAILURE
+from ..config import ANALYTICS_MAX_EVENTS, ANALYTICS_MAX_WINDOW_DAYS
+from ..models import Device, DeviceAnalytics, Event, EventPage, EventRollup, Result, User
 
 
 __all__ = ("devices_router",)
 devices_router = APIRouter(prefix="/api/devices", tags=["devices"])
+DEVICE_NOT_FOUND = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="Device not found",
+)
+DATABASE_UNAVAILABLE = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Database unavailable",
+)
+_EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
 
 
-@devices_router.get("/", summary="List all devices of the current user")
+@devices_router.get("/", summary="List all devices of the current user", response_model=Result[List[Device]])
 async def get(
     user: Annotated[User, Depends(get_current_user)],
-) -> Result[List[Device]]:
-    return await Device.get_all(user_id=user.id)
+) -> Response:
+    result = await Device.get_all(user_id=user.id)
+    return result.to_response()
 
 
 @devices_router.get("/{id}", summary="Query a device by ID")
@@ -38,9 +55,128 @@ async def post(
     return await Device.create(name=body.name, token=body.token, user_id=user.id)
 
 
-@devices_router.get("/{id}/events", summary="List all events for a device", tags=["events"])
+@devices_router.get("/{id}/events", summary="List all events for a device", tags=["events"], response_model=Result[List[Event]])
 async def get_device_events(
     user: Annotated[User, Depends(get_current_user)],
     id: int,
-) -> Result[List[Event]]:
-    return await Event.get_for_device(device_id=id, user_id=user.id)
+    before: Annotated[Optional[int], Query(description="Only return events with an ID lower than this")] = None,
+    after: Annotated[Optional[int], Query(description="Only return events with an ID higher than this")] = None,
+    since: Annotated[Optional[datetime], Query(description="Only return events created at or after this time")] = None,
+    until: Annotated[Optional[datetime], Query(description="Only return events created before this time")] = None,
+    limit: Annotated[int, Query(ge=1, le=1000, description="The maximum number of events to return")] = 100,
+) -> Response:
+    result = await Event.get_for_device(
+        device_id=id,
+        user_id=user.id,
+        before=before,
+        after=after,
+        since=since,
+        until=until,
+        limit=limit,
+    )
+    return result.to_response()
+
+
+@devices_router.get(
+    "/{id}/events/normalized",
+    summary="List events for a device in a compact layout",
+    description="Accepts the same parameters as `GET /api/devices/{id}/events`, but returns the device once and each event as a row of values.",
+    tags=["events"],
+    response_model=Result[Optional[EventPage]],
+)
+async def get_device_events_normalized(
+    user: Annotated[User, Depends(get_current_user)],
+    id: int,
+    before: Annotated[Optional[int], Query(description="Only return events with an ID lower than this")] = None,
+    after: Annotated[Optional[int], Query(description="Only return events with an ID higher than this")] = None,
+    since: Annotated[Optional[datetime], Query(description="Only return events created at or after this time")] = None,
+    until: Annotated[Optional[datetime], Query(description="Only return events created before this time")] = None,
+    limit: Annotated[int, Query(ge=1, le=1000, description="The maximum number of events to return")] = 100,
+) -> Response:
+    result = await Event.get_page_for_device(
+        device_id=id,
+        user_id=user.id,
+        before=before,
+        after=after,
+        since=since,
+        until=until,
+        limit=limit,
+    )
+    return result.to_response()
+
+
+@devices_router.get(
+    "/{id}/events/export",
+    summary="Export the event history of a device",
+    tags=["events"],
+    response_class=StreamingResponse,
+)
+async def get_device_events_export(
+    user: Annotated[User, Depends(get_current_user)],
+    id: int,
+    format: Annotated[Literal["ndjson", "csv"], Query(description="The export format")] = "ndjson",
+    since: Annotated[Optional[datetime], Query(description="Only export events created at or after this time")] = None,
+    until: Annotated[Optional[datetime], Query(description="Only export events created before this time")] = None,
+) -> StreamingResponse:
+    export = await Event.export_for_device(device_id=id, user_id=user.id, format=format, since=since, until=until)
+    if export.data is None:
+        raise DATABASE_UNAVAILABLE if export.code == DATABASE_FAILURE else DEVICE_NOT_FOUND
+
+    return StreamingResponse(
+        export.data,
+        media_type=_EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="device-{id}-events.{format}"'},
+    )
+
+
+@devices_router.get("/{id}/stats", summary="Get aggregated sensor statistics of a device", tags=["events"])
+async def get_device_stats(
+    user: Annotated[User, Depends(get_current_user)],
+    id: int,
+    bucket: Annotated[Literal["1m", "1h", "1d"], Query(description="The bucket width")] = "1h",
+    since: Annotated[Optional[datetime], Query(description="Only return buckets starting at or after this time")] = None,
+    until: Annotated[Optional[datetime], Query(description="Only return buckets starting before this time")] = None,
+    limit: Annotated[int, Query(ge=1, le=1000, description="The maximum number of buckets to return")] = 100,
+) -> Result[List[EventRollup]]:
+    return await EventRollup.get_for_device(
+        device_id=id,
+        user_id=user.id,
+        bucket=bucket,
+        since=since,
+        until=until,
+        limit=limit,
+    )
+
+
+@devices_router.get(
+    "/{id}/analytics",
+    summary="Get statistics of the events of a device",
+    description="Daily event and fall counts, vital sign and acceleration distributions and the drift of the barometric altitude, over the last 30 days unless `since` is given. Windows that are too long or hold too many events are rejected with 400.",
+    tags=["events"],
+)
+async def get_device_analytics(
+    user: Annotated[User, Depends(get_current_user)],
+    id: int,
+    since: Annotated[Optional[datetime], Query(description="Only analyze events created at or after this time")] = None,
+    until: Annotated[Optional[datetime], Query(description="Only analyze events created before this time")] = None,
+) -> Result[Optional[DeviceAnalytics]]:
+    result = await DeviceAnalytics.get_for_device(device_id=id, user_id=user.id, since=since, until=until)
+    if result.code == ANALYTICS_INVALID_WINDOW:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="`since` must not be later than `until`",
+        )
+
+    if result.code == ANALYTICS_WINDOW_TOO_LARGE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The analyzed window may span at most {ANALYTICS_MAX_WINDOW_DAYS:g} days",
+        )
+
+    if result.code == ANALYTICS_TOO_MANY_EVENTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The analyzed window holds more than {ANALYTICS_MAX_EVENTS} events, narrow it with `since` and `until`",
+        )
+
+    return result
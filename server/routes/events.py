@@ -1,17 +1,30 @@
 from __future__ import annotations
 
-from typing import Optional
+import asyncio
+import math
+import struct
+from datetime import datetime
+from typing import Annotated, AsyncIterator, List, Optional
 
+import numpy as np
+import numpy.typing as npt
 import pydantic
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
 
-from ..category import FALL_DETECTED
-from ..models import Embed, EmbedField, EmbedFooter, EmbedThumbnail, Event, Result
+from .root import get_current_user
+from ..category import FALL_DETECTED, REGULAR_UPDATE
+from ..config import LIVE_EVENTS_HEARTBEAT_SECONDS
+from ..models import Embed, EmbedField, EmbedFooter, EmbedThumbnail, Event, EventReading, Result, User
 from ..state import STATE
 
 
 __all__ = ("events_router",)
 events_router = APIRouter(prefix="/api/events", tags=["events"])
+# Largest bounding box side accepted by GET /nearby, about 100 rows of the 0.01 degree geo grid
+MAX_NEARBY_SPAN_DEGREES = 1.0
+_METERS_PER_DEGREE = 111320.0
 
 
 class _PostBody(pydantic.BaseModel):
@@ -33,9 +46,153 @@ class _PostBody(pydantic.BaseModel):
     device_token: str
 
 
-@events_router.post("/", summary="Upload a new event from a device")
-async def post(body: _PostBody) -> Result[Optional[Event]]:
-    event = await Event.create(
+# Compact upload format for devices, selected with `Content-Type: application/octet-stream`.
+# Little-endian: i64 device_id, u8 category, u16 presence mask (bit i set when the i-th optional
+# field below is present), 6 x f32 accel_x..gyro_z, i16 heart_rate_bpm, i16 spo2, 5 x f32
+# latitude..bmp280_altitude_meter, u8 token length, followed by the UTF-8 device token.
+BINARY_CONTENT_TYPE = "application/octet-stream"
+BINARY_EVENT_LAYOUT = struct.Struct("<qBH6f2h5fB")
+
+
+def _malformed(message: str) -> RequestValidationError:
+    return RequestValidationError([{"type": "value_error", "loc": ("body",), "msg": message, "input": None}])
+
+
+async def _create_from_binary(body: bytes) -> Result[Optional[Event]]:
+    size = BINARY_EVENT_LAYOUT.size
+    if len(body) < size:
+        raise _malformed(f"Binary event payload must be at least {size} bytes")
+
+    (
+        device_id,
+        category,
+        present,
+        accel_x,
+        accel_y,
+        accel_z,
+        gyro_x,
+        gyro_y,
+        gyro_z,
+        heart_rate_bpm,
+        spo2,
+        latitude,
+        longitude,
+        neo6m_altitude_meter,
+        pressure_pa,
+        bmp280_altitude_meter,
+        token_length,
+    ) = BINARY_EVENT_LAYOUT.unpack_from(body)
+    if len(body) != size + token_length:
+        raise _malformed("Binary event payload length does not match its token length")
+
+    try:
+        device_token = body[size:].decode("utf-8")
+    except UnicodeDecodeError:
+        raise _malformed("Device token is not valid UTF-8")
+
+    return await Event.create(
+        category=category,
+        accel_x=accel_x if present & 0x0001 else None,
+        accel_y=accel_y if present & 0x0002 else None,
+        accel_z=accel_z if present & 0x0004 else None,
+        gyro_x=gyro_x if present & 0x0008 else None,
+        gyro_y=gyro_y if present & 0x0010 else None,
+        gyro_z=gyro_z if present & 0x0020 else None,
+        heart_rate_bpm=heart_rate_bpm if present & 0x0040 else None,
+        spo2=spo2 if present & 0x0080 else None,
+        latitude=latitude if present & 0x0100 else None,
+        longitude=longitude if present & 0x0200 else None,
+        neo6m_altitude_meter=neo6m_altitude_meter if present & 0x0400 else None,
+        pressure_pa=pressure_pa if present & 0x0800 else None,
+        bmp280_altitude_meter=bmp280_altitude_meter if present & 0x1000 else None,
+        device_id=device_id,
+        device_token=device_token,
+    )
+
+
+def _notify(e: Event) -> None:
+    fields = [
+        EmbedField(name="Category", value=str(e.category)),
+    ]
+    if e.accel_x is not None and e.accel_y is not None and e.accel_z is not None:
+        fields.append(EmbedField(name="Acceleration (g)", value=f"{e.accel_x:.2f}, {e.accel_y:.2f}, {e.accel_z:.2f}", inline=True))
+    if e.gyro_x is not None and e.gyro_y is not None and e.gyro_z is not None:
+        fields.append(EmbedField(name="Gyroscope (rad/s)", value=f"{e.gyro_x:.2f}, {e.gyro_y:.2f}, {e.gyro_z:.2f}", inline=True))
+    if e.heart_rate_bpm is not None:
+        fields.append(EmbedField(name="Heart rate", value=f"{e.heart_rate_bpm} BPM", inline=True))
+    if e.spo2 is not None:
+        fields.append(EmbedField(name="SpO2", value=f"{e.spo2}%", inline=True))
+    if e.latitude is not None and e.longitude is not None:
+        url = f"https://www.google.com/maps?q={e.latitude},{e.longitude}"
+        fields.append(EmbedField(name="Location", value=f"[Google Maps]({url})", inline=True))
+    if e.neo6m_altitude_meter is not None:
+        fields.append(EmbedField(name="NEO-6M altitude", value=f"{e.neo6m_altitude_meter:.2f} m", inline=True))
+    if e.pressure_pa is not None:
+        fields.append(EmbedField(name="Pressure", value=f"{e.pressure_pa:.2f} Pa", inline=True))
+    if e.bmp280_altitude_meter is not None:
+        fields.append(EmbedField(name="BMP280 altitude", value=f"{e.bmp280_altitude_meter:.2f} m", inline=True))
+
+    embeds = [
+        Embed(
+            title=e.device.name,
+            timestamp=e.created_at,
+            color=0x2ecc71,
+            footer=EmbedFooter(
+                text=f"Event ID: {e.id}",
+            ),
+            thumbnail=None if STATE.discord_avatar_url is None else EmbedThumbnail(
+                url=STATE.discord_avatar_url,
+            ),
+            fields=fields,
+        ),
+    ]
+    e.device.user.notify(
+        content="A new sensor event has been detected.",
+        embeds=embeds,
+    )
+
+
+def _observe(e: Event) -> None:
+    """Feed the IMU readings of a regular update to the server-side fall detection engine"""
+    if STATE.detection is None or e.category not in (REGULAR_UPDATE,) or e.accel_z is None:
+        return
+
+    STATE.detection.push(
+        e.device.id,
+        e.id / 4096000,  # seconds since the snowflake epoch, keeping the tail for ordering
+        tuple(math.nan if value is None else value for value in (e.accel_x, e.accel_y, e.accel_z, e.gyro_x, e.gyro_y, e.gyro_z)),
+    )
+
+
+async def _on_fall_detected(device_id: int, detector: str, sample: npt.NDArray[np.float32]) -> None:
+    accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z = (None if math.isnan(value) else value for value in sample.tolist())
+    event = await Event.create_detected(
+        reading=EventReading(
+            category=FALL_DETECTED,
+            accel_x=accel_x,
+            accel_y=accel_y,
+            accel_z=accel_z,
+            gyro_x=gyro_x,
+            gyro_y=gyro_y,
+            gyro_z=gyro_z,
+        ),
+        device_id=device_id,
+    )
+    if event.data is not None:
+        _notify(event.data)
+
+
+if STATE.detection is not None:
+    STATE.detection.on_detection = _on_fall_detected
+
+
+async def _create_from_json(data: bytes) -> Result[Optional[Event]]:
+    try:
+        body = _PostBody.model_validate_json(data)
+    except pydantic.ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)])
+
+    return await Event.create(
         category=body.category,
         accel_x=body.accel_x,
         accel_y=body.accel_y,
@@ -54,46 +211,143 @@ async def post(body: _PostBody) -> Result[Optional[Event]]:
         device_token=body.device_token,
     )
 
-    if event.data is not None and event.data.category in (FALL_DETECTED,):
-        e = event.data
-        fields = [
-            EmbedField(name="Category", value=str(e.category)),
-        ]
-        if e.accel_x is not None and e.accel_y is not None and e.accel_z is not None:
-            fields.append(EmbedField(name="Acceleration (g)", value=f"{e.accel_x:.2f}, {e.accel_y:.2f}, {e.accel_z:.2f}", inline=True))
-        if e.gyro_x is not None and e.gyro_y is not None and e.gyro_z is not None:
-            fields.append(EmbedField(name="Gyroscope (rad/s)", value=f"{e.gyro_x:.2f}, {e.gyro_y:.2f}, {e.gyro_z:.2f}", inline=True))
-        if e.heart_rate_bpm is not None:
-            fields.append(EmbedField(name="Heart rate", value=f"{e.heart_rate_bpm} BPM", inline=True))
-        if e.spo2 is not None:
-            fields.append(EmbedField(name="SpO2", value=f"{e.spo2}%", inline=True))
-        if e.latitude is not None and e.longitude is not None:
-            url = f"https://www.google.com/maps?q={e.latitude},{e.longitude}"
-            fields.append(EmbedField(name="Location", value=f"[Google Maps]({url})", inline=True))
-        if e.neo6m_altitude_meter is not None:
-            fields.append(EmbedField(name="NEO-6M altitude", value=f"{e.neo6m_altitude_meter:.2f} m", inline=True))
-        if e.pressure_pa is not None:
-            fields.append(EmbedField(name="Pressure", value=f"{e.pressure_pa:.2f} Pa", inline=True))
-        if e.bmp280_altitude_meter is not None:
-            fields.append(EmbedField(name="BMP280 altitude", value=f"{e.bmp280_altitude_meter:.2f} m", inline=True))
-
-        embeds = [
-            Embed(
-                title=e.device.name,
-                timestamp=e.created_at,
-                color=0x2ecc71,
-                footer=EmbedFooter(
-                    text=f"Event ID: {e.id}",
-                ),
-                thumbnail=None if STATE.discord_avatar_url is None else EmbedThumbnail(
-                    url=STATE.discord_avatar_url,
-                ),
-                fields=fields,
-            ),
-        ]
-        await e.device.user.send(
-            content="A new sensor event has been detected.",
-            embeds=embeds,
-        )
+
+@events_router.post(
+    "/",
+    summary="Upload a new event from a device",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": _PostBody.model_json_schema()},
+                BINARY_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}},
+            },
+        },
+    },
+)
+async def post(request: Request) -> Result[Optional[Event]]:
+    if request.headers.get("content-type", "").startswith(BINARY_CONTENT_TYPE):
+        event = await _create_from_binary(await request.body())
+    else:
+        event = await _create_from_json(await request.body())
+
+    if event.data is not None:
+        if event.data.category in (FALL_DETECTED,):
+            _notify(event.data)
+
+        _observe(event.data)
 
     return event
+
+
+class _BatchPostBody(pydantic.BaseModel):
+    events: Annotated[List[EventReading], pydantic.Field(min_length=1, max_length=1000)]
+    device_id: int
+    device_token: str
+
+
+@events_router.post("/batch", summary="Upload many events from a device at once")
+async def post_batch(body: _BatchPostBody) -> Result[List[int]]:
+    events = await Event.create_batch(
+        readings=body.events,
+        device_id=body.device_id,
+        device_token=body.device_token,
+    )
+
+    for e in events.data:
+        if e.category in (FALL_DETECTED,):
+            _notify(e)
+
+        _observe(e)
+
+    return Result(code=events.code, data=[e.id for e in events.data])
+
+
+@events_router.get(
+    "/live",
+    summary="Stream the events of the current user's devices as they are created",
+    response_class=StreamingResponse,
+)
+async def get_live(user: Annotated[User, Depends(get_current_user)]) -> StreamingResponse:
+    """Server-sent events stream, each `data` line is the JSON row of a new event plus its `user_id`"""
+
+    async def _stream() -> AsyncIterator[bytes]:
+        async with STATE.broadcaster.subscribe(user.id) as queue:
+            yield b": connected\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=LIVE_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                else:
+                    yield f"data: {payload}\n\n".encode("utf-8")
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@events_router.get(
+    "/nearby",
+    summary="Find the events of the current user's devices around a location",
+    response_model=Result[List[Event]],
+)
+async def get_nearby(
+    user: Annotated[User, Depends(get_current_user)],
+    min_latitude: Annotated[Optional[float], Query(ge=-90, le=90, description="The south edge of the bounding box")] = None,
+    min_longitude: Annotated[Optional[float], Query(ge=-180, le=180, description="The west edge of the bounding box")] = None,
+    max_latitude: Annotated[Optional[float], Query(ge=-90, le=90, description="The north edge of the bounding box")] = None,
+    max_longitude: Annotated[Optional[float], Query(ge=-180, le=180, description="The east edge of the bounding box")] = None,
+    latitude: Annotated[Optional[float], Query(ge=-90, le=90, description="The latitude of the center of the search circle")] = None,
+    longitude: Annotated[Optional[float], Query(ge=-180, le=180, description="The longitude of the center of the search circle")] = None,
+    radius_meters: Annotated[Optional[float], Query(gt=0, description="The radius of the search circle")] = None,
+    category: Annotated[Optional[int], Query(description="Only return events of this category")] = None,
+    since: Annotated[Optional[datetime], Query(description="Only return events created at or after this time")] = None,
+    until: Annotated[Optional[datetime], Query(description="Only return events created before this time")] = None,
+    limit: Annotated[int, Query(ge=1, le=1000, description="The maximum number of events to return")] = 100,
+) -> Response:
+    """Search either a bounding box (`min_latitude`, `min_longitude`, `max_latitude`, `max_longitude`) or a
+    circle (`latitude`, `longitude`, `radius_meters`). Each side of the box may span at most 1 degree."""
+    box_given = (min_latitude, min_longitude, max_latitude, max_longitude) != (None, None, None, None)
+    if min_latitude is not None and min_longitude is not None and max_latitude is not None and max_longitude is not None:
+        south, west, north, east = min_latitude, min_longitude, max_latitude, max_longitude
+        ambiguous = (latitude, longitude, radius_meters) != (None, None, None)
+
+    elif latitude is not None and longitude is not None and radius_meters is not None and not box_given:
+        latitude_span = radius_meters / _METERS_PER_DEGREE
+        longitude_span = radius_meters / (_METERS_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+        south, north = max(-90.0, latitude - latitude_span), min(90.0, latitude + latitude_span)
+        west, east = max(-180.0, longitude - longitude_span), min(180.0, longitude + longitude_span)
+        ambiguous = False
+
+    else:
+        ambiguous = True
+
+    if ambiguous:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Specify either all of min_latitude, min_longitude, max_latitude and max_longitude, or all of latitude, longitude and radius_meters",
+        )
+
+    if not (0 <= north - south <= MAX_NEARBY_SPAN_DEGREES and 0 <= east - west <= MAX_NEARBY_SPAN_DEGREES):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The search area must be a box of at most {MAX_NEARBY_SPAN_DEGREES} degree per side",
+        )
+
+    result = await Event.get_nearby(
+        user_id=user.id,
+        min_latitude=south,
+        min_longitude=west,
+        max_latitude=north,
+        max_longitude=east,
+        center=None if latitude is None or longitude is None else (latitude, longitude),
+        radius_meters=radius_meters,
+        category=category,
+        since=since,
+        until=until,
+        limit=limit,
+    )
+    return result.to_response()
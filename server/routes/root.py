@@ -1,22 +1,33 @@
 from __future__ import annotations
 
-from typing import Annotated, Literal
+import secrets
+import time
+from typing import Annotated, Literal, Optional
 
 import pydantic
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.responses import PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
-from ..crypt import decode_jwt, encode_jwt
-from ..models import Result, User
+from ..config import INTERNAL_API_TOKEN
+from ..crypt import decode_jwt_claims, encode_jwt
+from ..metrics import REGISTRY
+from ..models import CacheStatistics, PoolStatistics, Result, Statistics, User
+from ..state import STATE
 
 
 __all__ = ("root_router",)
 root_router = APIRouter(prefix="/api")
 OAUTH2_SCHEME = OAuth2PasswordBearer(tokenUrl="login")
+INTERNAL_SCHEME = HTTPBearer(auto_error=False)
 INVALID_CREDENTIALS = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Invalid credentials",
 )
+NOT_FOUND = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="Not Found",
+)
 
 
 @root_router.get("/", summary="Root endpoint for health checking")
@@ -24,6 +35,42 @@ async def get_root() -> Result[None]:
     return Result(data=None)
 
 
+async def require_internal_token(credentials: Annotated[Optional[HTTPAuthorizationCredentials], Depends(INTERNAL_SCHEME)]) -> None:
+    """Restrict an endpoint exposing server internals to holders of `INTERNAL_API_TOKEN`"""
+    if INTERNAL_API_TOKEN is None:
+        raise NOT_FOUND
+
+    if credentials is None or not secrets.compare_digest(credentials.credentials.encode(), INTERNAL_API_TOKEN.encode()):
+        raise INVALID_CREDENTIALS
+
+
+@root_router.get(
+    "/statistics",
+    summary="Get the runtime statistics of the server",
+    dependencies=[Depends(require_internal_token)],
+)
+async def get_statistics() -> Result[Statistics]:
+    return Result(
+        data=Statistics(
+            device_tokens=CacheStatistics.from_cache(STATE.device_tokens),
+            sessions=CacheStatistics.from_cache(STATE.sessions),
+            users=CacheStatistics.from_cache(STATE.users),
+            devices=CacheStatistics.from_cache(STATE.devices),
+            database=PoolStatistics.from_connector(STATE.database),
+        ),
+    )
+
+
+@root_router.get(
+    "/metrics",
+    summary="Get latency histograms and counters in the Prometheus text format",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(require_internal_token)],
+)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 class _Token(pydantic.BaseModel):
     access_token: str
     token_type: Literal["bearer"]
@@ -44,15 +91,24 @@ async def post_login(body: Annotated[OAuth2PasswordRequestForm, Depends()]) -> _
 
 
 async def get_current_user(token: Annotated[str, Depends(OAUTH2_SCHEME)]) -> User:
-    user_id = decode_jwt(token)
-    if user_id is None or not user_id.isdecimal():
+    cached = STATE.sessions.get(token)
+    if cached is not None:
+        return cached
+
+    claims = decode_jwt_claims(token)
+    if claims is None or not claims[0].isdecimal():
         raise INVALID_CREDENTIALS
 
-    user = await User.get(id=int(user_id))
+    user_id, expiration = claims
+    # The token may have been issued right after the account was created, before replicas have it
+    with STATE.database.read_your_writes():
+        user = await User.get(id=int(user_id))
+
     inner = user.data
     if inner is None:
         raise INVALID_CREDENTIALS
 
+    STATE.sessions.set(token, inner, ttl=expiration - time.time())
     return inner
 
 
@@ -1,20 +1,71 @@
 from __future__ import annotations
 
+import asyncio
 import traceback
-from typing import Dict, Optional, TYPE_CHECKING
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
 
 import aiohttp
-from argon2 import PasswordHasher
 
+from .archive import EventArchive, EventArchiver
+from .cache import LRUCache
 from .config import (
+    DATABASE_LISTENER_RECONNECT_DELAY,
+    DEVICE_TOKEN_CACHE_SIZE,
+    DEVICE_TOKEN_CACHE_TTL,
     DISCORD_API_URL,
     DISCORD_BOT_TOKEN,
+    DISCORD_NOTIFIER_MAX_RETRIES,
+    DISCORD_NOTIFIER_WORKERS,
+    ENTITY_CACHE_SIZE,
+    ENTITY_CACHE_TTL,
+    EVENTS_ARCHIVE_AFTER_DAYS,
+    EVENTS_ARCHIVE_DIRECTORY,
+    EVENTS_ARCHIVE_INTERVAL,
+    EVENTS_PARTITION_MAINTENANCE_INTERVAL,
+    EVENTS_PARTITION_MONTHS_AHEAD,
+    EVENTS_RETENTION_DAYS,
+    EVENTS_RETENTION_MODE,
+    FALL_DETECTION_BUFFER_SIZE,
+    FALL_DETECTION_ENABLED,
+    FALL_DETECTION_FREE_FALL_G,
+    FALL_DETECTION_IMPACT_G,
+    FALL_DETECTION_INTERVAL,
+    FALL_DETECTION_WINDOW_SECONDS,
+    HASHER_EXECUTOR,
+    HASHER_MAX_PENDING,
+    HASHER_WORKERS,
+    INGEST_BUFFER_ENABLED,
+    INGEST_BUFFER_MAX_DELAY,
+    INGEST_BUFFER_MAX_ROWS,
+    JWT_EXPIRATION_SECONDS,
+    LIVE_EVENTS_QUEUE_SIZE,
+    POSTGRES_CONNECTION_IDLE_TIMEOUT,
     POSTGRES_DB,
     POSTGRES_HOST,
+    POSTGRES_MIGRATE_ON_STARTUP,
     POSTGRES_PASSWORD,
+    POSTGRES_POOL_MAX_SIZE,
+    POSTGRES_POOL_MIN_SIZE,
+    POSTGRES_REPLICA_HEALTH_CHECK_INTERVAL,
+    POSTGRES_REPLICA_HOSTS,
+    POSTGRES_REPLICA_MAX_LAG_SECONDS,
+    POSTGRES_STATEMENT_CACHE_SIZE,
     POSTGRES_USER,
+    SESSION_CACHE_SIZE,
+    SNOWFLAKE_WORKER_ID,
 )
 from .database import DatabaseConnector
+from .detection import FallDetectionEngine, TwoPhaseFallDetector
+from .hashing import AsyncPasswordHasher
+from .ids import SnowflakeGenerator, SnowflakeWorkerLease
+from .ingest import EventWriteBuffer
+from .listener import DatabaseListener
+from .live import EventBroadcaster
+from .maintenance import PartitionMaintainer
+from .notifier import DiscordNotifier
+
+if TYPE_CHECKING:
+    from .models import Device, User
 
 
 __all__ = ("ApplicationState", "STATE")
@@ -24,26 +75,113 @@ class ApplicationState:
 
     __slots__ = (
         "_http",
+        "archive",
+        "archiver",
+        "broadcaster",
         "database",
+        "detection",
+        "devices",
         "hasher",
+        "id_lease",
+        "ids",
+        "ingest",
+        "listener",
+        "device_tokens",
         "discord_auth_header",
         "discord_avatar_url",
+        "notifier",
+        "partitions",
+        "sessions",
+        "users",
     )
     if TYPE_CHECKING:
         _http: Optional[aiohttp.ClientSession]
+        archive: EventArchive
+        archiver: Optional[EventArchiver]
+        broadcaster: EventBroadcaster
         database: DatabaseConnector
-        hasher: PasswordHasher
+        detection: Optional[FallDetectionEngine]
+        devices: LRUCache[int, Device]
+        hasher: AsyncPasswordHasher
+        id_lease: SnowflakeWorkerLease
+        ids: SnowflakeGenerator
+        ingest: Optional[EventWriteBuffer]
+        listener: DatabaseListener
+        device_tokens: LRUCache[int, Tuple[bytes, str]]
         discord_auth_header: Dict[str, str]
         discord_avatar_url: Optional[str]
+        notifier: DiscordNotifier
+        partitions: PartitionMaintainer
+        sessions: LRUCache[str, User]
+        users: LRUCache[int, User]
 
     def __init__(self, *, database: DatabaseConnector) -> None:
         self._http = None
         self.database = database
-        self.hasher = PasswordHasher()
+        self.hasher = AsyncPasswordHasher(
+            kind=HASHER_EXECUTOR,
+            workers=HASHER_WORKERS,
+            max_pending=HASHER_MAX_PENDING,
+        )
+        self.ids = SnowflakeGenerator()
+        self.id_lease = SnowflakeWorkerLease(
+            database=database,
+            generator=self.ids,
+            worker_id=SNOWFLAKE_WORKER_ID,
+            reconnect_delay=DATABASE_LISTENER_RECONNECT_DELAY,
+        )
+        self.listener = DatabaseListener(database=database, reconnect_delay=DATABASE_LISTENER_RECONNECT_DELAY)
+        self.broadcaster = EventBroadcaster(queue_size=LIVE_EVENTS_QUEUE_SIZE)
+
+        # device ID -> (SHA-256 digest of the verified token, hashed token it was verified against)
+        self.device_tokens = LRUCache(capacity=DEVICE_TOKEN_CACHE_SIZE, ttl=DEVICE_TOKEN_CACHE_TTL)
+
+        # Read-through caches of User.get and Device.get, kept coherent across processes by the
+        # `invalidate` notifications of the triggers on Users and Devices
+        self.users = LRUCache(capacity=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL)
+        self.devices = LRUCache(capacity=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL)
+
+        # JWT -> authenticated user, each entry expires together with its token
+        self.sessions = LRUCache(capacity=SESSION_CACHE_SIZE, ttl=JWT_EXPIRATION_SECONDS)
         self.discord_auth_header = {
             "Authorization": f"Bot {DISCORD_BOT_TOKEN}",
         }
         self.discord_avatar_url = None
+        self.notifier = DiscordNotifier(
+            headers=self.discord_auth_header,
+            worker_count=DISCORD_NOTIFIER_WORKERS,
+            max_retries=DISCORD_NOTIFIER_MAX_RETRIES,
+        )
+        self.partitions = PartitionMaintainer(
+            database=database,
+            interval=EVENTS_PARTITION_MAINTENANCE_INTERVAL,
+            months_ahead=EVENTS_PARTITION_MONTHS_AHEAD,
+            retention_days=EVENTS_RETENTION_DAYS,
+            retention_mode=EVENTS_RETENTION_MODE,
+        )
+        self.detection = FallDetectionEngine(
+            detectors=[
+                TwoPhaseFallDetector(
+                    free_fall=FALL_DETECTION_FREE_FALL_G,
+                    impact=FALL_DETECTION_IMPACT_G,
+                    window=FALL_DETECTION_WINDOW_SECONDS,
+                ),
+            ],
+            window_size=FALL_DETECTION_BUFFER_SIZE,
+            interval=FALL_DETECTION_INTERVAL,
+        ) if FALL_DETECTION_ENABLED else None
+        self.ingest = EventWriteBuffer(
+            database=database,
+            max_delay=INGEST_BUFFER_MAX_DELAY,
+            max_rows=INGEST_BUFFER_MAX_ROWS,
+        ) if INGEST_BUFFER_ENABLED else None
+        self.archive = EventArchive(directory=EVENTS_ARCHIVE_DIRECTORY)
+        self.archiver = EventArchiver(
+            archive=self.archive,
+            database=database,
+            interval=EVENTS_ARCHIVE_INTERVAL,
+            after_days=EVENTS_ARCHIVE_AFTER_DAYS,
+        ) if EVENTS_ARCHIVE_AFTER_DAYS > 0 else None
 
     @property
     def http(self) -> aiohttp.ClientSession:
@@ -52,6 +190,31 @@ class ApplicationState:
 
         return self._http
 
+    def invalidate_user(self, user_id: int) -> None:
+        self.users.pop(user_id)
+        self.devices.discard_if(lambda _, device: device.user.id == user_id)
+        self.sessions.discard_if(lambda _, user: user.id == user_id)
+
+    def invalidate_device(self, device_id: int) -> None:
+        self.devices.pop(device_id)
+        self.device_tokens.pop(device_id)
+
+    def _on_invalidation(self, payload: str) -> None:
+        table, id, *operation = payload.split(":")
+        if table == "users":
+            self.invalidate_user(int(id))
+        elif table == "devices":
+            self.invalidate_device(int(id))
+            # Deleting a user deletes its devices, which are notified one by one
+            if operation == ["delete"]:
+                asyncio.create_task(asyncio.to_thread(self.archive.remove, int(id)))
+
+    def _clear_entity_caches(self) -> None:
+        self.users.clear()
+        self.devices.clear()
+        self.sessions.clear()
+        self.device_tokens.clear()
+
     async def initialize(self) -> None:
         self._http = aiohttp.ClientSession()
 
@@ -70,12 +233,39 @@ class ApplicationState:
             traceback.print_exc()
             self.discord_avatar_url = None
 
+        self.notifier.start(self._http)
         await self.database.get_pool()
+        await self.id_lease.start()
+        self.database.start()
+        self.partitions.start()
+        if self.archiver is not None:
+            self.archiver.start()
+
+        await self.broadcaster.attach(self.listener)
+        await self.listener.listen("invalidate", self._on_invalidation)
+        self.listener.on_connect(self._clear_entity_caches)
+        self.listener.start()
+        if self.detection is not None:
+            self.detection.start()
 
     async def finalize(self) -> None:
+        if self.detection is not None:
+            await self.detection.stop()
+
+        if self.ingest is not None:
+            await self.ingest.stop()
+
+        await self.listener.stop()
+        await self.partitions.stop()
+        if self.archiver is not None:
+            await self.archiver.stop()
+
+        await self.notifier.stop(timeout=5)
         if self._http is not None:
             await self._http.close()
 
+        await self.id_lease.stop()
+        self.hasher.shutdown()
         await self.database.close()
 
 
@@ -85,5 +275,13 @@ STATE = ApplicationState(
         host=POSTGRES_HOST,
         user=POSTGRES_USER,
         password=POSTGRES_PASSWORD,
+        min_size=POSTGRES_POOL_MIN_SIZE,
+        max_size=POSTGRES_POOL_MAX_SIZE,
+        statement_cache_size=POSTGRES_STATEMENT_CACHE_SIZE,
+        max_inactive_connection_lifetime=POSTGRES_CONNECTION_IDLE_TIMEOUT,
+        migrate=POSTGRES_MIGRATE_ON_STARTUP,
+        replica_hosts=POSTGRES_REPLICA_HOSTS,
+        replica_health_check_interval=POSTGRES_REPLICA_HEALTH_CHECK_INTERVAL,
+        replica_max_lag_seconds=POSTGRES_REPLICA_MAX_LAG_SECONDS,
     ),
 )
@@ -8,6 +8,7 @@ import type {
     LoginResponse,
     RegisterRequest,
     CreateDeviceRequest,
+    EventPageRequest,
 } from './types';
 
 class ApiClient {
@@ -104,8 +105,8 @@ class ApiClient {
         return response.data;
     }
 
-    async getDeviceEvents(deviceId: number): Promise<Result<Event[]>> {
-        const response = await this.client.get<Result<Event[]>>(`/devices/${deviceId}/events`);
+    async getDeviceEvents(deviceId: number, params?: EventPageRequest): Promise<Result<Event[]>> {
+        const response = await this.client.get<Result<Event[]>>(`/devices/${deviceId}/events`, { params });
         return response.data;
     }
 
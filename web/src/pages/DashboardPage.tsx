@@ -4,6 +4,8 @@ import { apiClient } from '../api';
 import type { Device, Event } from '../types';
 import { useAuth } from '../auth';
 
+const RECENT_EVENTS = 10;
+
 export function DashboardPage() {
     const { user } = useAuth();
     const [devices, setDevices] = useState<Device[]>([]);
@@ -21,17 +23,17 @@ export function DashboardPage() {
             if (devicesResult.code === 0) {
                 setDevices(devicesResult.data);
 
-                // Load recent events from all devices
+                // Load the most recent events of every device, only the newest RECENT_EVENTS are shown
                 const allEvents: Event[] = [];
                 for (const device of devicesResult.data) {
-                    const eventsResult = await apiClient.getDeviceEvents(device.id);
+                    const eventsResult = await apiClient.getDeviceEvents(device.id, { limit: RECENT_EVENTS });
                     if (eventsResult.code === 0) {
                         allEvents.push(...eventsResult.data);
                     }
                 }
-                // Sort by ID (descending) and take the 10 most recent
+                // Sort by ID (descending) and take the most recent ones across devices
                 allEvents.sort((a, b) => b.id - a.id);
-                setRecentEvents(allEvents.slice(0, 10));
+                setRecentEvents(allEvents.slice(0, RECENT_EVENTS));
             }
         } catch (error) {
             console.error('Failed to load data:', error);
@@ -1,21 +1,29 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { DashboardLayout } from '../components/DashboardLayout';
 import { apiClient } from '../api';
 import type { Device, Event } from '../types';
 import { SUCCESS } from '../types';
 
+// Events requested per page, older pages are fetched with the ID of the last loaded event as cursor
+const PAGE_SIZE = 100;
+
 export function EventsPage() {
     const [devices, setDevices] = useState<Device[]>([]);
     const [selectedDeviceId, setSelectedDeviceId] = useState<number | null>(null);
     const [events, setEvents] = useState<Event[]>([]);
     const [loading, setLoading] = useState(true);
     const [eventsLoading, setEventsLoading] = useState(false);
+    const [hasMore, setHasMore] = useState(false);
+    const [loadingMore, setLoadingMore] = useState(false);
+    // The current selection, read by requests that resolve after the user picked another device
+    const selectedDeviceRef = useRef<number | null>(null);
 
     useEffect(() => {
         loadDevices();
     }, []);
 
     useEffect(() => {
+        selectedDeviceRef.current = selectedDeviceId;
         if (selectedDeviceId !== null) {
             loadEvents(selectedDeviceId);
         }
@@ -40,11 +48,14 @@ export function EventsPage() {
 
     const loadEvents = async (deviceId: number) => {
         setEventsLoading(true);
+        setEvents([]);
+        setHasMore(false);
         try {
-            const result = await apiClient.getDeviceEvents(deviceId);
-            if (result.code === SUCCESS) {
-                // Sort events by ID (descending - most recent first)
-                setEvents(result.data.sort((a, b) => b.id - a.id));
+            // Pages are returned newest first
+            const result = await apiClient.getDeviceEvents(deviceId, { limit: PAGE_SIZE });
+            if (result.code === SUCCESS && deviceId === selectedDeviceRef.current) {
+                setEvents(result.data);
+                setHasMore(result.data.length === PAGE_SIZE);
             }
         } catch (error) {
             console.error('Failed to load events:', error);
@@ -53,6 +64,30 @@ export function EventsPage() {
         }
     };
 
+    const loadMoreEvents = async () => {
+        if (selectedDeviceId === null || events.length === 0) {
+            return;
+        }
+
+        const deviceId = selectedDeviceId;
+        setLoadingMore(true);
+        try {
+            const result = await apiClient.getDeviceEvents(deviceId, {
+                before: events[events.length - 1].id,
+                limit: PAGE_SIZE,
+            });
+            // Ignore the page if another device was selected in the meantime
+            if (result.code === SUCCESS && deviceId === selectedDeviceRef.current) {
+                setEvents((loaded) => [...loaded, ...result.data]);
+                setHasMore(result.data.length === PAGE_SIZE);
+            }
+        } catch (error) {
+            console.error('Failed to load more events:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const getCategoryLabel = (category: number): string => {
         const categories: Record<number, string> = {
             0: 'Normal',
@@ -168,6 +203,17 @@ export function EventsPage() {
                                     ))}
                                 </tbody>
                             </table>
+                            {hasMore && (
+                                <div className="load-more">
+                                    <button
+                                        className="btn btn-secondary"
+                                        onClick={loadMoreEvents}
+                                        disabled={loadingMore}
+                                    >
+                                        {loadingMore ? 'Loading...' : 'Load older events'}
+                                    </button>
+                                </div>
+                            )}
                         </div>
                     )}
                 </>
@@ -57,6 +57,14 @@ export interface CreateDeviceRequest {
     token: string;
 }
 
+export interface EventPageRequest {
+    before?: number;
+    after?: number;
+    since?: string;
+    until?: string;
+    limit?: number;
+}
+
 export const SUCCESS = 0;
 export const DATABASE_FAILURE = 1;
 export const USER_NOT_FOUND = 2;